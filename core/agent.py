@@ -5,61 +5,158 @@ Bot automatique qui filtre et répond aux opportunités freelance
 """
 
 import os
+import sys
 import time
 import json
-import smtplib
-import imaplib
-import email
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import copy
+import signal
+import argparse
+import threading
+from contextlib import contextmanager
 from datetime import datetime
-import openai
-from mistralai.client import MistralClient
-import schedule
+from email.message import Message
 from typing import Dict, List, Optional
 
+# Ajouter le répertoire racine au path (exécution directe du script)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.supervisor import ControlServer, SOCKET_ENV
+from utils.config import ConfigStore, DEFAULT_CONFIG, validate_config, mailbox_accounts
+from data.storage.timeseries import load_or_rebuild
+from data.storage.search_index import open_index
+from core.sketches import open_sketches
+from data.storage.segments import open_segments
+from utils.metrics import REGISTRY, span
+from data.storage.usage_ledger import UsageLedger
+from core.budget import BudgetGuard, DeferredQueue, prefilter, NORMAL, PREFILTER, DEFER, EXHAUSTED
+from utils.profiling import Profiler, CPROFILE, MODES
+from utils.lazy import lazy_import, lazy_property, is_initialized
+from core.providers import create_client, configure_rate_limits, throttle
+from core.mailboxes import FairWorkPool
+from data.storage.cursors import SyncCursors
+from data.storage.work_queue import WorkQueue
+from data.storage.senders import open_senders, REPUTATION_ACTION
+from data.storage.journal import PipelineJournal, ANALYZED, DRAFTED, SENDING, SENT, LOGGED
+from core.mime import fetch_message, iter_parts
+from core.attachments import open_extractor, render_attachments
+from core.scheduler import Scheduler, AdaptiveInterval
+from core.triage import ServerTriage
+
+# Modules chargés au premier usage : une exécution --once sans nouvel email n'importe aucun SDK
+imaplib = lazy_import("imaplib")
+smtplib = lazy_import("smtplib")
+mime_text = lazy_import("email.mime.text")
+mime_multipart = lazy_import("email.mime.multipart")
+futures = lazy_import("concurrent.futures")
+
+# Métriques Prometheus exposées via le socket de contrôle (/metrics côté web)
+CYCLE_DURATION = REGISTRY.histogram("agent_cycle_duration_seconds", "Durée d'un cycle run_once")
+EMAILS_PER_CYCLE = REGISTRY.histogram("agent_emails_per_cycle", "Emails trouvés par cycle",
+                                      buckets=(0, 1, 2, 5, 10, 20, 50, 100))
+EMAILS_PROCESSED = REGISTRY.counter("agent_emails_processed_total", "Emails traités")
+LLM_LATENCY = REGISTRY.histogram("agent_llm_request_duration_seconds", "Latence des appels IA",
+                                 ["provider", "operation"])
+LLM_ERRORS = REGISTRY.counter("agent_llm_errors_total", "Erreurs des appels IA", ["provider", "operation"])
+LLM_TOKENS = REGISTRY.counter("agent_llm_tokens_total", "Tokens consommés par les appels IA",
+                              ["provider", "kind"])
+CACHE_REQUESTS = REGISTRY.counter("agent_cache_requests_total", "Accès aux caches de l'agent",
+                                  ["cache", "result"])
+
+# Rôles d'une instance quand plusieurs agents partagent la file de travail
+ROLE_ALL, ROLE_FETCHER, ROLE_WORKER = "all", "fetcher", "worker"
+ROLES = (ROLE_ALL, ROLE_FETCHER, ROLE_WORKER)
+
 # Import du module Telegram
 try:
-    from telegram_notifications import TelegramNotifier
+    from services.telegram_service import TelegramNotifier
     TELEGRAM_AVAILABLE = True
 except ImportError:
     TELEGRAM_AVAILABLE = False
     print("⚠️ Module Telegram non disponible")
 
 class AgentIANocturne:
-    def __init__(self, config: Dict):
+    def __init__(self, config: Dict, config_store: Optional[ConfigStore] = None, role: str = ROLE_ALL):
         """Initialiser l'Agent IA Nocturne"""
         self.config = config
+        self.config_store = config_store
+        self.role = role
         
         # Initialiser les clients IA
-        self.openai_client = None
-        self.mistral_client = None
-        
-        # Essayer OpenAI d'abord
-        if config.get('openai_api_key') and config['openai_api_key'] != "your_openai_api_key_here":
-            try:
-                self.openai_client = openai.OpenAI(api_key=config['openai_api_key'])
-                print("✅ OpenAI configuré")
-            except Exception as e:
-                print(f"⚠️  Erreur OpenAI : {e}")
-        
-        # Fallback sur Mistral
-        if config.get('mistral_api_key'):
-            try:
-                self.mistral_client = MistralClient(api_key=config['mistral_api_key'])
-                print("✅ Mistral configuré")
-            except Exception as e:
-                print(f"⚠️  Erreur Mistral : {e}")
+        self.openai_client, self.mistral_client = self._init_ai_clients(config)
         
         if not self.openai_client and not self.mistral_client:
             raise Exception("❌ Aucun client IA configuré (OpenAI ou Mistral)")
         
         self.processed_emails = set()
         
-        # Configuration email
-        self.email_config = config['email']
-        self.gmail_user = self.email_config['username']
-        self.gmail_password = self.email_config['password']
+        # Métriques exposées au superviseur via le socket de contrôle
+        self.metrics = {
+            "queue_depth": 0,
+            "inflight_llm_calls": 0,
+            "last_cycle_duration": None,
+            "last_cycle_at": None,
+            "cycles": 0,
+            "emails_processed": 0,
+            "budget_mode": NORMAL,
+            "deferred_emails": 0,
+            "poll_interval_seconds": None
+        }
+        self._metrics_lock = threading.Lock()
+        REGISTRY.gauge("agent_queue_depth", "Emails en attente dans le cycle courant").set_function(
+            lambda: self.metrics["queue_depth"])
+        REGISTRY.gauge("agent_inflight_llm_calls", "Appels IA en cours").set_function(
+            lambda: self.metrics["inflight_llm_calls"])
+        REGISTRY.gauge("agent_telegram_queue_depth", "Messages Telegram en attente").set_function(
+            lambda: self.telegram_notifier.queue.pending()
+            if self.telegram_notifier and self.telegram_notifier.queue else 0)
+        self.stop_event = threading.Event()
+        self.drain_on_stop = True
+        
+        # Relève adaptative : intervalle calé sur le débit d'arrivée des emails et sur le profil de nuit
+        self.scheduler = Scheduler()
+        self.poll_interval = AdaptiveInterval(config.get("scheduler"),
+                                              config.get("notifications", {}).get("notifications_nuit", False))
+        self._last_poll = None
+        
+        # Profilage des cycles (--profile), désactivé par défaut
+        self.profiler: Optional[Profiler] = None
+        
+        # Consommation IA et budgets (mode dégradé à l'approche des limites)
+        self.usage_ledger = UsageLedger("llm_usage.json", "llm_calls.jsonl")
+        self.budget = BudgetGuard(self.usage_ledger, config.get("llm"))
+        self.deferred = DeferredQueue("deferred_emails.json")
+        configure_rate_limits(config.get("llm", {}).get("rate_limits", {}))
+        
+        # État de l'email en cours (mode budgétaire, consommation IA), propre à chaque worker
+        self._local = threading.local()
+        
+        # Agrégats, index, sketches, réputation, segments, journal et extracteur de pièces jointes :
+        # ouverts au premier usage (propriétés différées ci-dessous), pas au démarrage
+        
+        # Rechargement à chaud : la config est appliquée entre deux emails
+        self._processing_lock = threading.Lock()
+        self._pending_config = None
+        self._log_lock = threading.Lock()
+        
+        # Boîtes mail surveillées, chacune avec son curseur de synchronisation
+        self.accounts = mailbox_accounts(config)
+        self.cursors = SyncCursors("mailbox_cursors.json")
+        
+        # Emails traités marqués sur le serveur (libellés Gmail ou mots-clés) et exclus des recherches
+        self.triage = ServerTriage(config)
+        
+        # Workers partagés par tous les comptes (analyse et réponse)
+        workers = config.get("workers", {})
+        self.pool = FairWorkPool(workers.get("count", 4), workers.get("per_account", 2))
+        
+        # File partagée entre instances (fetcher : relève IMAP et écriture du log, workers : analyse et réponse)
+        queue_config = config.get("queue", {})
+        self.work_queue = None
+        if queue_config.get("enabled") or role != ROLE_ALL:
+            self.work_queue = WorkQueue(queue_config.get("path", "work_queue.db"),
+                                        queue_config.get("visibility_timeout", 300),
+                                        queue_config.get("max_attempts", 3))
+            print(f"🗂️ File de travail partagée : {self.work_queue.path} (rôle {role})")
         
         # Configuration IA
         self.criteria = config['criteria']
@@ -67,53 +164,271 @@ class AgentIANocturne:
         # Initialiser Telegram
         self.telegram_notifier = None
         if TELEGRAM_AVAILABLE:
-            self.telegram_notifier = TelegramNotifier(config)
+            self.telegram_notifier = TelegramNotifier(config, lambda: self.segments, "telegram_queue.json")
             if self.telegram_notifier.enabled:
                 print("📱 Telegram configuré")
             else:
                 print("📱 Telegram désactivé")
         
         print("🤖 Agent IA Nocturne initialisé")
-        print(f"📧 Email surveillé : {self.gmail_user}")
+        print(f"📧 Comptes surveillés : {', '.join(account['username'] for account in self.accounts)}")
         print(f"🎯 Critères : {self.criteria}")
     
+    @lazy_property
+    def rollups(self):
+        """Agrégats temporels pour les graphiques d'activité"""
+        return load_or_rebuild("timeseries_rollups.json", "opportunities_log.json")
+    
+    @lazy_property
+    def search_index(self):
+        """Index de recherche plein texte"""
+        return open_index("opportunities_index.db", "opportunities_log.json")
+    
+    @lazy_property
+    def sketches(self):
+        """Sketches quotidiens pour les statistiques approximatives (historique du log reporté une fois)"""
+        return open_sketches("sketches", "opportunities_log.json")
+    
+    @lazy_property
+    def senders(self):
+        """Réputation des expéditeurs et domaines (décisions rapides et ordre de traitement)"""
+        return open_senders("sender_reputation.db", "opportunities_log.json")
+    
+    @lazy_property
+    def segments(self):
+        """Log découpé en segments quotidiens (rapports du jour sans relire tout l'historique)"""
+        return open_segments("opportunity_segments", "opportunities_log.json")
+    
+    @lazy_property
+    def attachments(self):
+        """Texte des pièces jointes (cahiers des charges), extrait hors du processus principal"""
+        return open_extractor(self.config)
+    
+    @lazy_property
+    def journal(self):
+        """Étapes franchies par chaque email : une reprise ne refait ni appel IA ni envoi"""
+        return PipelineJournal("pipeline_journal.db")
+    
+    def _close_attachments(self):
+        """Arrêter le pool d'extraction s'il a été créé"""
+        if is_initialized(self, "attachments") and self.attachments:
+            self.attachments.close()
+    
+    def _init_ai_clients(self, config: Dict):
+        """Créer les clients OpenAI et Mistral à partir de la configuration"""
+        openai_client = None
+        mistral_client = None
+        
+        # Essayer OpenAI d'abord (SDK importé au premier appel)
+        if config.get('openai_api_key') and config['openai_api_key'] != "your_openai_api_key_here":
+            try:
+                openai_client = create_client("openai", config['openai_api_key'])
+                print("✅ OpenAI configuré")
+            except Exception as e:
+                print(f"⚠️  Erreur OpenAI : {e}")
+        
+        # Fallback sur Mistral
+        if config.get('mistral_api_key'):
+            try:
+                mistral_client = create_client("mistral", config['mistral_api_key'])
+                print("✅ Mistral configuré")
+            except Exception as e:
+                print(f"⚠️  Erreur Mistral : {e}")
+        
+        return openai_client, mistral_client
+    
+    def apply_config(self, config: Dict):
+        """Remplacer critères, identifiants et fournisseurs IA sans redémarrer"""
+        old_config = self.config
+        
+        if (config.get('openai_api_key') != old_config.get('openai_api_key')
+                or config.get('mistral_api_key') != old_config.get('mistral_api_key')):
+            openai_client, mistral_client = self._init_ai_clients(config)
+            if openai_client or mistral_client:
+                self.openai_client, self.mistral_client = openai_client, mistral_client
+            else:
+                print("⚠️ Nouvelles clés IA inutilisables, clients actuels conservés")
+        
+        self.config = config
+        self.budget.configure(config.get("llm", {}))
+        self.criteria = config['criteria']
+        self.accounts = mailbox_accounts(config)
+        self.triage.configure(config)
+        configure_rate_limits(config.get("llm", {}).get("rate_limits", {}))
+        self.poll_interval.configure(config.get("scheduler", {}),
+                                     config.get("notifications", {}).get("notifications_nuit", False))
+        
+        if TELEGRAM_AVAILABLE and config.get('telegram') != old_config.get('telegram'):
+            if self.telegram_notifier:
+                self.telegram_notifier.close()
+            self.telegram_notifier = TelegramNotifier(config, lambda: self.segments, "telegram_queue.json")
+        
+        print(f"🔁 Configuration rechargée - Critères : {self.criteria}")
+    
+    def reload_config(self) -> Dict:
+        """Relire la configuration et l'appliquer dès que possible"""
+        if not self.config_store:
+            return {"success": False, "errors": ["Aucun fichier de configuration associé"]}
+        
+        try:
+            config = self.config_store.load()
+        except (OSError, ValueError) as e:
+            return {"success": False, "errors": [str(e)]}
+        
+        errors = validate_config(config)
+        if errors:
+            print(f"⚠️ Configuration invalide ignorée : {errors}")
+            return {"success": False, "errors": errors}
+        
+        self._pending_config = config
+        
+        # Application immédiate si aucun email n'est en cours de traitement
+        applied = self._processing_lock.acquire(blocking=False)
+        if applied:
+            try:
+                self._apply_pending_config()
+            finally:
+                self._processing_lock.release()
+        return {"success": True, "applied": applied}
+    
+    def _apply_pending_config(self):
+        config, self._pending_config = self._pending_config, None
+        if config is not None:
+            self.apply_config(config)
+    
+    def _resize_pool(self):
+        """Redimensionner le pool entre deux cycles si la config des workers a changé"""
+        workers = self.config.get("workers", {})
+        size = (max(1, workers.get("count", 4)), max(1, workers.get("per_account", 2)))
+        if size != (self.pool.workers, self.pool.per_account):
+            old_pool, self.pool = self.pool, FairWorkPool(*size)
+            old_pool.shutdown()
+            print(f"🔁 Pool de traitement : {size[0]} worker(s), {size[1]} par compte")
+    
+    def _model(self, provider: str) -> str:
+        """Modèle du fournisseur pour le mode budgétaire de l'email traité par ce worker"""
+        return self.budget.model(provider, getattr(self._local, "budget_mode", NORMAL))
+    
+    def _account(self, email_info: Dict) -> Dict:
+        """Compte d'origine d'un email (le premier compte pour les emails antérieurs au multi-comptes)"""
+        for account in self.accounts:
+            if account["name"] == email_info.get("account"):
+                return account
+        return self.accounts[0]
+    
     def check_new_emails(self, force_all: bool = False) -> List[Dict]:
-        """Vérifier les nouveaux emails"""
+        """Vérifier les nouveaux emails de tous les comptes"""
+        if len(self.accounts) == 1:
+            return self.check_account(self.accounts[0], force_all)
+        
+        # Connexions IMAP en parallèle : un serveur lent ne retarde pas les autres comptes
+        with futures.ThreadPoolExecutor(len(self.accounts), thread_name_prefix="imap") as executor:
+            results = executor.map(lambda account: self.check_account(account, force_all), self.accounts)
+            return [email_info for emails in results for email_info in emails]
+    
+    def _imap_connect(self, account: Dict):
+        """Connexion et sélection du dossier : (connexion, UIDVALIDITY, méthode de tri côté serveur)"""
+        with span("imap_login"):
+            mail = imaplib.IMAP4_SSL(account["host"], account["port"])
+            mail.login(account["username"], account["password"])
+            mail.select(account["folder"])
+        _, data = mail.response("UIDVALIDITY")
+        uidvalidity = int(data[0]) if data and data[0] else None
+        return mail, uidvalidity, self.triage.method(mail, account["name"])
+    
+    def _flush_triage_marks(self, mail, account: Dict, uidvalidity: Optional[int], method: Optional[str]):
+        if not self.triage.pending(account["name"]):
+            return
+        try:
+            with span("imap_store"):
+                marked = self.triage.flush(mail, account["name"], uidvalidity, method)
+            if marked:
+                print(f"🏷️ [{account['name']}] {marked} email(s) marqué(s) comme traité(s) sur le serveur")
+        except Exception as e:
+            print(f"⚠️ [{account['name']}] Marquage des emails traités : {e}")
+    
+    def flush_triage(self):
+        """Poser en fin de cycle les marques des emails consignés (une connexion par compte concerné)"""
+        for account in self.accounts:
+            if not self.triage.pending(account["name"]):
+                continue
+            try:
+                mail, uidvalidity, method = self._imap_connect(account)
+            except Exception as e:
+                print(f"⚠️ [{account['name']}] Marquage des emails traités : {e}")
+                continue
+            self._flush_triage_marks(mail, account, uidvalidity, method)
+            mail.logout()
+    
+    def check_account(self, account: Dict, force_all: bool = False) -> List[Dict]:
+        """Vérifier les nouveaux emails d'un compte depuis son curseur"""
+        new_emails = []
+        extracting = []
         try:
-            # Connexion IMAP
-            mail = imaplib.IMAP4_SSL("imap.gmail.com")
-            mail.login(self.gmail_user, self.gmail_password)
-            mail.select("INBOX")
+            mail, uidvalidity, method = self._imap_connect(account)
+            last_uid = self.cursors.get(account["name"], uidvalidity)
+            
+            # Marques restées en attente (cycle interrompu) posées avant la recherche qui les exclut
+            self._flush_triage_marks(mail, account, uidvalidity, method)
+            exclude = self.triage.exclude(method)
             
             # Vérifier si c'est la première exécution ou si on force
-            first_run = not os.path.exists("processed_emails.txt")
+            first_run = last_uid is None and not os.path.exists("processed_emails.txt")
             
             if first_run or force_all:
-                print("🚀 Analyse des 50 derniers emails...")
-                # Rechercher les 50 derniers emails (lus et non lus)
-                _, messages = mail.search(None, "ALL")
-                email_list = messages[0].split()[-50:]  # 50 derniers
+                print(f"🚀 [{account['name']}] Analyse des 50 derniers emails...")
+                # Rechercher les 50 derniers emails (lus et non lus) pas encore traités
+                with span("imap_search"):
+                    _, messages = mail.uid("search", None, exclude or "ALL")
+                uid_list = messages[0].split()[-50:]  # 50 derniers
+            elif last_uid is None:
+                # Curseur perdu ou boîte renumérotée : emails non lus
+                with span("imap_search"):
+                    _, messages = mail.uid("search", None, f"UNSEEN {exclude}".strip())
+                uid_list = messages[0].split()
             else:
-                # Rechercher seulement les nouveaux emails non lus
-                _, messages = mail.search(None, "UNSEEN")
-                email_list = messages[0].split()
+                # Seulement les messages arrivés depuis le dernier cycle
+                with span("imap_search"):
+                    _, messages = mail.uid("search", None, f"UID {last_uid + 1}:* {exclude}".strip())
+                # « n:* » renvoie toujours le dernier message, même déjà traité
+                uid_list = [uid for uid in messages[0].split() if int(uid) > last_uid]
             
-            new_emails = []
-            for email_id in email_list:
-                _, msg_data = mail.fetch(email_id, "(RFC822)")
-                email_body = msg_data[0][1]
-                email_message = email.message_from_bytes(email_body)
+            # Emails commencés avant un arrêt (déjà marqués lus par la relève) : repris au point enregistré
+            if not self.work_queue:
+                uid_list += [uid for uid in self._unfinished_uids(account["name"], uidvalidity)
+                             if uid not in uid_list]
+            
+            # Mémoire bornée : message relevé par blocs, seules les parties texte sont conservées
+            mime = self.config.get("mime", {})
+            batch_bytes = 0
+            for uid in uid_list:
+                if batch_bytes >= mime.get("max_batch_bytes", 16 << 20):
+                    print(f"⚠️ [{account['name']}] Limite mémoire du lot atteinte - "
+                          f"{len(uid_list) - len(new_emails)} email(s) reporté(s) au prochain cycle")
+                    break
                 
-                # Extraire les informations
-                subject = email_message["subject"] or "Sans objet"
-                sender = email_message["from"]
-                date = email_message["date"]
+                with span("imap_fetch"):
+                    parsed = fetch_message(mail, uid, mime.get("chunk_size", 1 << 20),
+                                           max_text_bytes=mime.get("max_text_bytes", 1 << 20),
+                                           spool=self.attachments.wants if self.attachments else None)
                 
-                # Extraire le contenu
-                body = self.extract_email_body(email_message)
+                with span("body_extract"):
+                    email_message = parsed.message
+                    
+                    # Extraire les informations
+                    subject = email_message["subject"] or "Sans objet"
+                    sender = email_message["from"]
+                    date = email_message["date"]
+                    
+                    # Extraire le contenu
+                    body = self.extract_email_body(email_message)
+                batch_bytes += len(body)
                 
                 email_info = {
-                    "id": email_id.decode(),
+                    "id": f"{account['name']}:{uid.decode()}",
+                    "account": account["name"],
+                    "uid": int(uid),
+                    "uidvalidity": uidvalidity,
                     "subject": subject,
                     "from": sender,
                     "date": date,
@@ -122,34 +437,129 @@ class AgentIANocturne:
                 }
                 
                 new_emails.append(email_info)
-                print(f"📧 Nouvel email reçu : {subject}")
+                print(f"📧 [{account['name']}] Nouvel email reçu : {subject}")
+                
+                # Pièces jointes analysées en parallèle pendant la relève des messages suivants
+                extracts = []
+                extracting.append((email_info, parsed, extracts))
+                if self.attachments:
+                    extracts.extend(self.attachments.submit(part) for part in parsed.attachments)
             
             mail.close()
             mail.logout()
             return new_emails
             
         except Exception as e:
-            print(f"❌ Erreur lors de la vérification des emails : {e}")
-            return []
+            # Les emails déjà lus sont traités, les suivants seront relus au prochain cycle
+            print(f"❌ Erreur lors de la vérification des emails ({account['name']}) : {e}")
+            return new_emails
+        
+        finally:
+            self._finish_attachments(extracting)
+    
+    def _unfinished_uids(self, account_name: str, uidvalidity: Optional[int]) -> List[bytes]:
+        """UID des emails du compte présents dans le journal mais jamais consignés"""
+        prefix = f"{account_name}:"
+        deferred = {item["id"] for item in self.deferred.items}
+        return [email_id[len(prefix):].encode() for email_id, validity in self.journal.unfinished()
+                if email_id.startswith(prefix) and email_id[len(prefix):].isdigit() and validity == uidvalidity
+                and email_id not in deferred and email_id not in self.processed_emails]
+    
+    def _attach_extracts(self, email_info: Dict, extracts: List):
+        """Attendre les extractions d'un email et joindre leur texte (tronqué au budget de tokens)"""
+        if not extracts:
+            return
+        with span("attachment_extract"):
+            results = [extract.result() for extract in extracts]
+        email_info["attachments"] = [{key: value for key, value in result.items() if key != "text"}
+                                     for result in results]
+        email_info["attachments_text"] = render_attachments(
+            results, self.config.get("attachments", {}).get("max_tokens", 1500))
+    
+    def _finish_attachments(self, extracting: List):
+        """Attendre les extractions, joindre le texte aux emails et supprimer les fichiers temporaires"""
+        for email_info, parsed, extracts in extracting:
+            try:
+                self._attach_extracts(email_info, extracts)
+            except Exception as e:
+                print(f"⚠️ Erreur d'extraction des pièces jointes : {e}")
+            finally:
+                parsed.close()
+    
+    def _prompt_content(self, email_info: Dict) -> str:
+        """Corps de l'email suivi du texte des pièces jointes (déjà tronqué au budget de tokens)"""
+        if email_info.get("attachments_text"):
+            return f"{email_info['body']}\n\n{email_info['attachments_text']}"
+        return email_info["body"]
     
     def extract_email_body(self, email_message) -> str:
-        """Extraire le contenu du corps de l'email"""
+        """Extraire le contenu du corps de l'email, suivi de celui des messages transférés en pièce jointe"""
         body = ""
+        forwarded = []
         if email_message.is_multipart():
-            for part in email_message.walk():
-                if part.get_content_type() == "text/plain":
+            found = False
+            for part in iter_parts(email_message):
+                if part.get_content_type() == "message/rfc822":
+                    forwarded += [self.extract_email_body(inner) for inner in part.get_payload()
+                                  if isinstance(inner, Message)]
+                elif part.get_content_type() == "text/plain" and not found:
                     try:
                         body = part.get_payload(decode=True).decode('utf-8', errors='ignore')
                     except:
                         body = part.get_payload(decode=True).decode('latin-1', errors='ignore')
-                    break
+                    found = True
         else:
             try:
                 body = email_message.get_payload(decode=True).decode('utf-8', errors='ignore')
             except:
                 body = email_message.get_payload(decode=True).decode('latin-1', errors='ignore')
+        
+        # Texte de la mission souvent dans le message transféré, la note d'accompagnement en tête
+        for text in forwarded:
+            if text.strip():
+                body += f"\n\n---------- Message transféré ----------\n{text}"
         return body
     
+    @contextmanager
+    def _llm_call(self, provider: str, operation: str, model: str):
+        """Compter les appels IA en cours, mesurer latence et erreurs, et consigner les tokens
+        
+        L'appelant range la réponse dans call["response"] pour que son usage soit enregistré."""
+        # Limite de débit du fournisseur, commune à tous les comptes
+        throttle(provider)
+        with self._metrics_lock:
+            self.metrics["inflight_llm_calls"] += 1
+        call = {"response": None}
+        start = time.perf_counter()
+        error = False
+        try:
+            yield call
+        except Exception:
+            error = True
+            LLM_ERRORS.inc(provider=provider, operation=operation)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            LLM_LATENCY.observe(elapsed, provider=provider, operation=operation)
+            with self._metrics_lock:
+                self.metrics["inflight_llm_calls"] -= 1
+            
+            usage = getattr(call["response"], "usage", None)
+            prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+            completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+            LLM_TOKENS.inc(prompt_tokens, provider=provider, kind="prompt")
+            LLM_TOKENS.inc(completion_tokens, provider=provider, kind="completion")
+            try:
+                recorded = self.usage_ledger.record(provider, model, operation, prompt_tokens,
+                                                    completion_tokens, elapsed * 1000, error,
+                                                    getattr(self._local, "email_id", None))
+                usage_total = getattr(self._local, "usage", None)
+                if usage_total is not None:
+                    usage_total["tokens"] += prompt_tokens + completion_tokens
+                    usage_total["cost"] += recorded["cost"]
+            except OSError as e:
+                print(f"⚠️ Erreur enregistrement consommation IA : {e}")
+    
     def analyze_opportunity(self, email_content: str) -> Dict:
         """Analyser l'opportunité avec IA (OpenAI ou Mistral)"""
         prompt = f"""Tu es un assistant IA spécialisé en tri de missions pour un freelance développeur backend Python/API/IA.
@@ -185,12 +595,14 @@ Réponds au format JSON :
         # Essayer OpenAI d'abord
         if self.openai_client:
             try:
-                response = self.openai_client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[{"role": "user", "content": prompt}],
-                    max_tokens=500,
-                    temperature=0.3
-                )
+                with self._llm_call("openai", "analysis", self._model("openai")) as call:
+                    response = self.openai_client.chat.completions.create(
+                        model=self._model("openai"),
+                        messages=[{"role": "user", "content": prompt}],
+                        max_tokens=500,
+                        temperature=0.3
+                    )
+                    call["response"] = response
                 
                 result = json.loads(response.choices[0].message.content)
                 print(f"🧠 Analyse OpenAI terminée : {result['decision']} (pertinence: {result['pertinence']}/10)")
@@ -203,12 +615,14 @@ Réponds au format JSON :
         if self.mistral_client:
             try:
                 messages = [{"role": "user", "content": prompt}]
-                response = self.mistral_client.chat(
-                    model="mistral-medium",
-                    messages=messages,
-                    max_tokens=500,
-                    temperature=0.3
-                )
+                with self._llm_call("mistral", "analysis", self._model("mistral")) as call:
+                    response = self.mistral_client.chat(
+                        model=self._model("mistral"),
+                        messages=messages,
+                        max_tokens=500,
+                        temperature=0.3
+                    )
+                    call["response"] = response
                 
                 result = json.loads(response.choices[0].message.content)
                 print(f"🧠 Analyse Mistral terminée : {result['decision']} (pertinence: {result['pertinence']}/10)")
@@ -255,12 +669,14 @@ Le message doit être en français, ton professionnel mais accessible, et inclur
         # Essayer OpenAI d'abord
         if self.openai_client:
             try:
-                response = self.openai_client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[{"role": "user", "content": prompt}],
-                    max_tokens=800,
-                    temperature=0.7
-                )
+                with self._llm_call("openai", "generation", self._model("openai")) as call:
+                    response = self.openai_client.chat.completions.create(
+                        model=self._model("openai"),
+                        messages=[{"role": "user", "content": prompt}],
+                        max_tokens=800,
+                        temperature=0.7
+                    )
+                    call["response"] = response
                 
                 result = json.loads(response.choices[0].message.content)
                 print(f"✍️ Réponse OpenAI générée : {result['objet']}")
@@ -273,12 +689,14 @@ Le message doit être en français, ton professionnel mais accessible, et inclur
         if self.mistral_client:
             try:
                 messages = [{"role": "user", "content": prompt}]
-                response = self.mistral_client.chat(
-                    model="mistral-medium",
-                    messages=messages,
-                    max_tokens=800,
-                    temperature=0.7
-                )
+                with self._llm_call("mistral", "generation", self._model("mistral")) as call:
+                    response = self.mistral_client.chat(
+                        model=self._model("mistral"),
+                        messages=messages,
+                        max_tokens=800,
+                        temperature=0.7
+                    )
+                    call["response"] = response
                 
                 result = json.loads(response.choices[0].message.content)
                 print(f"✍️ Réponse Mistral générée : {result['objet']}")
@@ -295,12 +713,14 @@ Le message doit être en français, ton professionnel mais accessible, et inclur
             "signature": self.config['signature']
         }
     
-    def send_email(self, to_email: str, subject: str, body: str, reply_to_id: str = None):
-        """Envoyer un email de réponse"""
+    def send_email(self, to_email: str, subject: str, body: str, reply_to_id: str = None,
+                   account: Optional[Dict] = None):
+        """Envoyer un email de réponse depuis le compte qui l'a reçu"""
+        account = account or self.accounts[0]
         try:
-            msg = MIMEMultipart()
-            # Utiliser l'email Hotmail comme expéditeur si configuré
-            from_email = self.config.get('email', {}).get('reply_to', self.gmail_user)
+            msg = mime_multipart.MIMEMultipart()
+            # Utiliser l'adresse de réponse du compte (ex. Hotmail) comme expéditeur si configurée
+            from_email = account.get('reply_to') or account['username']
             msg['From'] = from_email
             msg['To'] = to_email
             msg['Subject'] = subject
@@ -309,16 +729,17 @@ Le message doit être en français, ton professionnel mais accessible, et inclur
                 msg['In-Reply-To'] = reply_to_id
                 msg['References'] = reply_to_id
             
-            msg.attach(MIMEText(body, 'plain', 'utf-8'))
-            
-            # Connexion SMTP
-            server = smtplib.SMTP_SSL('smtp.gmail.com', 465)
-            server.login(self.gmail_user, self.gmail_password)
+            msg.attach(mime_text.MIMEText(body, 'plain', 'utf-8'))
             
-            # Envoi
-            text = msg.as_string()
-            server.sendmail(self.gmail_user, to_email, text)
-            server.quit()
+            with span("smtp_send"):
+                # Connexion SMTP
+                server = smtplib.SMTP_SSL(account['smtp_host'], account['smtp_port'])
+                server.login(account['username'], account['password'])
+                
+                # Envoi
+                text = msg.as_string()
+                server.sendmail(account['username'], to_email, text)
+                server.quit()
             
             print(f"📧 Email envoyé à : {to_email}")
             return True
@@ -327,37 +748,88 @@ Le message doit être en français, ton professionnel mais accessible, et inclur
             print(f"❌ Erreur lors de l'envoi : {e}")
             return False
     
-    def log_opportunity(self, email_info: Dict, analysis: Dict, action: str):
+    def log_opportunity(self, email_info: Dict, analysis: Dict, action: str,
+                        llm_latency_ms: Optional[float] = None):
         """Logger l'opportunité"""
+        usage_total = getattr(self._local, "usage", None) or {"tokens": 0, "cost": 0.0}
         log_entry = {
             "timestamp": datetime.now().isoformat(),
             "email_id": email_info["id"],
+            "account": email_info.get("account"),
             "subject": email_info["subject"],
             "sender": email_info["from"],
             "pertinence": analysis.get("pertinence", 0),
             "decision": analysis.get("decision", "❌ Erreur"),
             "action": action,
-            "raisons": analysis.get("raisons", [])
+            "raisons": analysis.get("raisons", []),
+            "llm_latency_ms": llm_latency_ms,
+            "llm_tokens": usage_total["tokens"],
+            "llm_cost": round(usage_total["cost"], 6)
         }
         
-        # Sauvegarder dans un fichier JSON
-        log_file = "opportunities_log.json"
-        try:
-            if os.path.exists(log_file):
-                with open(log_file, 'r', encoding='utf-8') as f:
-                    logs = json.load(f)
-            else:
-                logs = []
+        mark = {"account": email_info.get("account"), "uidvalidity": email_info.get("uidvalidity"),
+                "uid": email_info.get("uid"), "action": action}
+        
+        # Email pris dans la file partagée : l'entrée part avec l'acquittement, le fetcher l'écrit
+        if getattr(self._local, "job", None):
+            self._local.result["entry"] = log_entry
+            self._local.result["body"] = email_info.get("body", "")
+            self._local.result["triage"] = mark
+            print(f"📊 Opportunité traitée : {action}")
+            return
+        
+        self._write_log(log_entry, email_info.get("body", ""))
+        self.journal.advance(email_info["id"], LOGGED)
+        self.triage.mark(**mark)
+    
+    def _write_log(self, log_entry: Dict, body: str = ""):
+        # Un seul worker à la fois réécrit le log et les index dérivés
+        with span("log_write"), self._log_lock:
+            # Sauvegarder dans un fichier JSON
+            log_file = "opportunities_log.json"
+            try:
+                if os.path.exists(log_file):
+                    with open(log_file, 'r', encoding='utf-8') as f:
+                        logs = json.load(f)
+                else:
+                    logs = []
             
-            logs.append(log_entry)
+                logs.append(log_entry)
             
-            with open(log_file, 'w', encoding='utf-8') as f:
-                json.dump(logs, f, indent=2, ensure_ascii=False)
-                
-            print(f"📊 Opportunité loggée : {action}")
+                with open(log_file, 'w', encoding='utf-8') as f:
+                    json.dump(logs, f, indent=2, ensure_ascii=False)
             
-        except Exception as e:
-            print(f"❌ Erreur lors du logging : {e}")
+                print(f"📊 Opportunité loggée : {log_entry['action']}")
+            
+            except Exception as e:
+                print(f"❌ Erreur lors du logging : {e}")
+            
+            try:
+                self.segments.append(log_entry)
+            except Exception as e:
+                print(f"⚠️ Erreur écriture du segment : {e}")
+            
+            try:
+                self.rollups.add(log_entry)
+                self.rollups.save()
+            except Exception as e:
+                print(f"⚠️ Erreur mise à jour des agrégats : {e}")
+            
+            if self.search_index:
+                try:
+                    self.search_index.add(log_entry, body)
+                except Exception as e:
+                    print(f"⚠️ Erreur indexation : {e}")
+            
+            try:
+                self.sketches.add(log_entry)
+            except Exception as e:
+                print(f"⚠️ Erreur mise à jour des sketches : {e}")
+            
+            try:
+                self.senders.add(log_entry)
+            except Exception as e:
+                print(f"⚠️ Erreur mise à jour de la réputation : {e}")
     
     def process_email(self, email_info: Dict):
         """Traiter un email"""
@@ -365,151 +837,470 @@ Le message doit être en français, ton professionnel mais accessible, et inclur
         
         # Éviter les doublons
         if email_id in self.processed_emails:
+            CACHE_REQUESTS.inc(cache="processed_emails", result="hit")
+            return
+        CACHE_REQUESTS.inc(cache="processed_emails", result="miss")
+        
+        with span("process_email"):
+            self._process_email(email_info)
+    
+    def _process_email(self, email_info: Dict):
+        email_id = email_info["id"]
+        
+        # Reprise après un arrêt : les étapes déjà franchies ne sont pas refaites
+        checkpoint = self.journal.start(email_id, email_info.get("uidvalidity"))
+        stage, saved = checkpoint["stage"], checkpoint["data"]
+        if stage == LOGGED:
+            print(f"⏭️ Email déjà traité avant l'arrêt : {email_info['subject']}")
+            self.processed_emails.add(email_id)
+            self.triage.mark(email_info.get("account"), email_info.get("uidvalidity"), email_info.get("uid"))
             return
         
         print(f"\n🔍 Traitement de l'email : {email_info['subject']}")
+        if saved:
+            print(f"⏯️ Reprise à l'étape : {stage}")
+        
+        self._local.email_id = email_id
+        self._local.usage = saved.get("usage") or {"tokens": 0, "cost": 0.0}
+        
+        # Expéditeur jamais retenu : décision depuis son profil, sans appel IA
+        reputation = self.config.get("reputation", {})
+        if reputation.get("enabled", True) and "analysis" not in saved:
+            verdict = self.senders.fast_reject(email_info["from"], reputation.get("fast_reject_after", 5),
+                                               reputation.get("fast_reject_below", 3))
+            if verdict:
+                print("❌ Expéditeur toujours rejeté - Logging sans analyse IA...")
+                self.log_opportunity(email_info, verdict, REPUTATION_ACTION, 0.0)
+                self.processed_emails.add(email_id)
+                return
+        
+        # Budget IA : report ou pré-filtre local à l'approche des limites (seulement si l'analyse reste à faire)
+        budget_mode = self._local.budget_mode = self.budget.mode()
+        if budget_mode != NORMAL and "analysis" not in saved:
+            local = prefilter(f"{email_info['subject']}\n{self._prompt_content(email_info)}", self.criteria)
+            low_priority = local["pertinence"] < self.budget.budget.get("defer_below", 4)
+            if budget_mode == EXHAUSTED or (budget_mode == DEFER and low_priority):
+                print(f"⏸️ Budget IA ({budget_mode}) - email reporté")
+                if getattr(self._local, "job", None):
+                    self._local.result["deferred"] = True
+                else:
+                    self.deferred.push(email_info)
+                return
+            if budget_mode == PREFILTER and local["decision"].startswith("❌"):
+                print("❌ Mission rejetée par le pré-filtre local - Logging...")
+                self.log_opportunity(email_info, local, "Rejetée (pré-filtre)", 0.0)
+                self.processed_emails.add(email_id)
+                return
         
         # Analyser l'opportunité
-        analysis = self.analyze_opportunity(email_info["body"])
+        analysis = saved.get("analysis")
+        llm_latency_ms = saved.get("llm_latency_ms", 0.0)
+        if analysis is None:
+            llm_start = time.monotonic()
+            with span("llm_analysis"):
+                analysis = self.analyze_opportunity(self._prompt_content(email_info))
+            llm_latency_ms = round((time.monotonic() - llm_start) * 1000, 1)
+            self.journal.advance(email_id, ANALYZED, {"analysis": analysis, "llm_latency_ms": llm_latency_ms,
+                                                      "usage": dict(self._local.usage)})
         
         # Prendre une décision
         if analysis["decision"] == "✅ Mission retenue":
-            print("✅ Mission retenue - Génération de réponse...")
-            
             # Générer la réponse
-            response = self.generate_response(email_info["body"])
+            response = saved.get("response")
+            if response is None:
+                print("✅ Mission retenue - Génération de réponse...")
+                llm_start = time.monotonic()
+                with span("llm_generation"):
+                    response = self.generate_response(self._prompt_content(email_info))
+                llm_latency_ms = round(llm_latency_ms + (time.monotonic() - llm_start) * 1000, 1)
+                self.journal.advance(email_id, DRAFTED, {"response": response, "llm_latency_ms": llm_latency_ms,
+                                                         "usage": dict(self._local.usage)})
             
-            # Envoyer l'email
-            full_body = f"{response['message']}\n\n{response['signature']}"
-            success = self.send_email(
-                to_email=email_info["from"],
-                subject=response["objet"],
-                body=full_body,
-                reply_to_id=email_id
-            )
+            action = saved.get("action")
+            if stage == SENDING:
+                # Arrêt pendant l'envoi : impossible de savoir s'il est parti, on ne risque pas un doublon
+                print("⚠️ Envoi interrompu par un arrêt - réponse non renvoyée")
+                action = "Envoi incertain"
+                self.journal.advance(email_id, SENT, {"action": action})
+            elif action is None:
+                # Bail expiré pendant l'analyse : un autre worker a repris l'email et répondra
+                if getattr(self._local, "job", None) and not self.work_queue.extend(email_id):
+                    print("⚠️ Bail perdu - réponse non envoyée")
+                    self._local.result["lost"] = True
+                    return
+                
+                # Un seul envoi par email, même si deux workers en arrivent là
+                if not self.journal.advance(email_id, SENDING):
+                    print("⚠️ Réponse déjà en cours d'envoi ailleurs - ignorée")
+                    if getattr(self._local, "job", None):
+                        self._local.result["lost"] = True
+                    return
+                
+                # Envoyer l'email
+                full_body = f"{response['message']}\n\n{response['signature']}"
+                success = self.send_email(
+                    to_email=email_info["from"],
+                    subject=response["objet"],
+                    body=full_body,
+                    reply_to_id=email_id,
+                    account=self._account(email_info)
+                )
+                action = "Réponse envoyée" if success else "Erreur envoi"
+                self.journal.advance(email_id, SENT, {"action": action})
             
-            if success:
-                self.log_opportunity(email_info, analysis, "Réponse envoyée")
-            else:
-                self.log_opportunity(email_info, analysis, "Erreur envoi")
+            self.log_opportunity(email_info, analysis, action, llm_latency_ms)
         else:
             print("❌ Mission rejetée - Logging...")
-            self.log_opportunity(email_info, analysis, "Rejetée")
+            self.log_opportunity(email_info, analysis, "Rejetée", llm_latency_ms)
         
         # Marquer comme traité
         self.processed_emails.add(email_id)
         
-        # Notification Telegram pour les opportunités importantes
-        if self.telegram_notifier and self.telegram_notifier.enabled:
+        # Notification Telegram pour les opportunités importantes (envoyée par le fetcher en mode file)
+        if getattr(self._local, "job", None):
+            self._local.result["alert"] = analysis
+        elif self.telegram_notifier and self.telegram_notifier.enabled:
             self.telegram_notifier.send_opportunity_alert(email_info, analysis)
     
-    def run_once(self, force_all: bool = False):
-        """Exécuter une fois"""
+    def run_once(self, force_all: bool = False) -> int:
+        """Exécuter une fois, retourne le nombre d'emails trouvés"""
+        if self.profiler:
+            with self.profiler.profile("cycle") as session:
+                found = self._run_once(force_all)
+            if session["report"]:
+                print(f"🔬 Profil du cycle : {os.path.join(self.profiler.directory, session['report'])}.txt")
+            return found
+        return self._run_once(force_all)
+    
+    def _poll(self):
+        """Cycle planifié : met à jour le débit d'arrivée observé, donc l'intervalle avant le suivant"""
+        started = time.time()
+        found = self.run_once()
+        if self._last_poll is not None:
+            self.poll_interval.observe(found, started - self._last_poll)
+        self._last_poll = started
+        self.metrics["poll_interval_seconds"] = round(self.poll_interval.next())
+    
+    def _run_once(self, force_all: bool = False) -> int:
         print(f"\n🔄 Vérification des emails - {datetime.now().strftime('%H:%M:%S')}")
-        new_emails = self.check_new_emails(force_all)
+        cycle_start = time.monotonic()
+        
+        # Configuration modifiée sur disque depuis le dernier cycle
+        if self.config_store and self.config_store.changed():
+            self.reload_config()
         
-        if new_emails:
+        # Profils d'expéditeurs mis à jour par un autre processus (fetcher de la file partagée)
+        self.senders.refresh()
+        
+        new_emails = []
+        if self.role != ROLE_WORKER:
+            new_emails = self.check_new_emails(force_all)
+            
+            # Emails reportés par manque de budget, repris dès que le budget le permet
+            if len(self.deferred) and self.budget.mode() != EXHAUSTED:
+                new_emails = self.deferred.take_all() + new_emails
+        
+        if self.work_queue:
+            self._run_queue(new_emails)
+        elif new_emails:
             print(f"📧 {len(new_emails)} email(s) trouvé(s)")
-            for email_info in new_emails:
-                self.process_email(email_info)
+            self.metrics["queue_depth"] = len(new_emails)
+            self._resize_pool()
+            
+            # Une file par compte, servies tour à tour par le pool partagé
+            queues = self._account_queues(new_emails)
+            
+            # Config rechargée pendant le cycle : appliquée quand aucun email n'est en cours
+            with self._processing_lock:
+                done = self.pool.run(queues, self.process_email, stop=self._stop_requested,
+                                     on_done=self._email_done, on_idle=self._apply_pending_config)
+                self._apply_pending_config()
+            self._advance_cursors(new_emails, done)
         else:
             print("📭 Aucun email trouvé")
+        
+        # Emails consignés marqués sur le serveur : exclus des prochaines recherches
+        if self.role != ROLE_WORKER:
+            self.flush_triage()
+        
+        cycle_duration = time.monotonic() - cycle_start
+        CYCLE_DURATION.observe(cycle_duration)
+        EMAILS_PER_CYCLE.observe(len(new_emails))
+        self.metrics["queue_depth"] = 0
+        self.metrics["cycles"] += 1
+        self.metrics["last_cycle_duration"] = round(cycle_duration, 3)
+        self.metrics["budget_mode"] = self.budget.mode()
+        self.metrics["deferred_emails"] = len(self.deferred)
+        self.metrics["last_cycle_at"] = datetime.now().isoformat()
+        return len(new_emails)
+    
+    def _run_queue(self, new_emails: List[Dict]):
+        """Cycle en mode file partagée : publier, traiter ce qui est disponible, consigner les résultats"""
+        if self.role != ROLE_WORKER and new_emails:
+            added = self.work_queue.enqueue(new_emails)
+            print(f"📧 {len(new_emails)} email(s) trouvé(s), {added} nouveau(x) dans la file")
+            # Emails persistés dans la file : les curseurs peuvent avancer
+            fetched = {}
+            for email_info in new_emails:
+                fetched.setdefault(email_info.get("account"), []).append(email_info)
+            self._advance_cursors(new_emails, fetched)
+        
+        if self.role != ROLE_FETCHER:
+            self._resize_pool()
+            while not self._stop_requested():
+                jobs = self.work_queue.claim(self.pool.workers * 2)
+                if not jobs:
+                    break
+                self.metrics["queue_depth"] = len(jobs)
+                queues = self._account_queues(jobs)
+                with self._processing_lock:
+                    self.pool.run(queues, self._process_job, stop=self._stop_requested,
+                                  on_done=self._email_done, on_idle=self._apply_pending_config)
+                    self._apply_pending_config()
+        
+        if self.role != ROLE_WORKER:
+            self._collect_results()
+        
+        stats = self.work_queue.stats()
+        self.metrics["work_queue"] = stats
+        if stats["pending"] or stats["leased"]:
+            print(f"🗂️ File : {stats['pending']} en attente, {stats['leased']} en cours")
+    
+    def _account_queues(self, emails: List[Dict]) -> Dict[str, List[Dict]]:
+        """Une file par compte, les expéditeurs au meilleur historique en tête"""
+        queues = {}
+        for email_info in emails:
+            queues.setdefault(email_info.get("account") or self.accounts[0]["name"], []).append(email_info)
+        if self.config.get("reputation", {}).get("prioritize", True):
+            for queue in queues.values():
+                queue.sort(key=lambda email_info: -self.senders.priority(email_info.get("from") or ""))
+        return queues
+    
+    def _process_job(self, email_info: Dict):
+        """Traiter un email pris à bail puis l'acquitter (ou le rendre à la file)"""
+        email_id = email_info["id"]
+        self._local.job = email_id
+        self._local.result = {}
+        try:
+            self.process_email(email_info)
+        except Exception as e:
+            self.work_queue.nack(email_id, str(e), delay=60)
+            raise
+        finally:
+            self._local.job = None
+        
+        result = self._local.result
+        if result.get("deferred"):
+            # Budget IA insuffisant : nouvel essai dans 5 minutes, sans compter d'échec
+            self.work_queue.release(email_id, delay=300)
+        elif not result.get("lost"):
+            if "alert" in result:
+                result["email"] = {key: value for key, value in email_info.items() if key != "body"}
+            if self.work_queue.ack(email_id, result):
+                # L'entrée du log est confiée à la file : le fetcher l'écrira
+                self.journal.advance(email_id, LOGGED)
+            else:
+                print(f"⚠️ Acquittement ignoré (bail perdu) : {email_id}")
+    
+    def _collect_results(self):
+        """Écrire dans le log les emails terminés par les workers (écrivain unique)"""
+        while True:
+            results = self.work_queue.collect()
+            if not results:
+                return
+            for job in results:
+                result = job["result"] or {}
+                if result.get("entry"):
+                    self._write_log(result["entry"], result.get("body", ""))
+                if result.get("triage"):
+                    self.triage.mark(**result["triage"])
+                if result.get("alert") and self.telegram_notifier and self.telegram_notifier.enabled:
+                    self.telegram_notifier.send_opportunity_alert(result["email"], result["alert"])
+            self.work_queue.mark_collected([job["id"] for job in results])
+    
+    def _stop_requested(self) -> bool:
+        # Arrêt sans drain : on abandonne le reste de la file
+        if self.stop_event.is_set() and not self.drain_on_stop:
+            if self.metrics["queue_depth"]:
+                print("🛑 Arrêt demandé - emails restants ignorés")
+            return True
+        return False
+    
+    def _email_done(self, account: str, email_info: Dict):
+        with self._metrics_lock:
+            self.metrics["queue_depth"] -= 1
+            self.metrics["emails_processed"] += 1
+        EMAILS_PROCESSED.inc()
+    
+    def _advance_cursors(self, emails: List[Dict], done: Dict[str, List[Dict]]):
+        """Avancer chaque curseur jusqu'au dernier UID précédé uniquement d'emails terminés"""
+        for account, items in done.items():
+            finished = {email_info["uid"] for email_info in items if "uid" in email_info}
+            fetched = sorted((email_info["uid"], email_info.get("uidvalidity")) for email_info in emails
+                             if email_info.get("account") == account and "uid" in email_info)
+            last = None
+            for uid, uidvalidity in fetched:
+                if uid not in finished:
+                    break
+                last = (uid, uidvalidity)
+            if last:
+                self.cursors.advance(account, last[1], last[0])
+    
+    def _purge_journal(self):
+        purged = self.journal.purge(30)
+        if purged:
+            print(f"🗂️ Journal : {purged} point(s) de reprise supprimé(s)")
+    
+    def request_stop(self, drain: bool = True):
+        """Demander un arrêt gracieux (drain = finir les emails du cycle en cours)"""
+        self.drain_on_stop = drain
+        self.stop_event.set()
+        self.scheduler.stop()
+    
+    def _control_handlers(self) -> Dict:
+        """Commandes acceptées sur le socket de contrôle"""
+        def status(request):
+            return {"pid": os.getpid(), "role": self.role, "stopping": self.stop_event.is_set(),
+                    "metrics": dict(self.metrics), "cursors": self.cursors.status(),
+                    "scheduler": self.scheduler.status(), "journal": self.journal.stats()}
+        
+        def stop(request):
+            self.request_stop(drain=request.get("drain", True))
+            return {"success": True}
+        
+        def reload(request):
+            return self.reload_config()
+        
+        def prometheus(request):
+            return {"text": REGISTRY.render()}
+        
+        return {"status": status, "metrics": status, "stop": stop, "reload": reload,
+                "prometheus": prometheus}
     
-    def start_monitoring(self, interval_minutes: int = 5):
+    def start_monitoring(self, interval_minutes: Optional[int] = None):
         """Démarrer la surveillance continue"""
-        print(f"🚀 Démarrage de la surveillance - Vérification toutes les {interval_minutes} minutes")
+        if interval_minutes:
+            self.poll_interval.base = interval_minutes * 60
+        low, high = self.poll_interval.bounds()
+        print(f"🚀 Démarrage de la surveillance - Vérification toutes les {low / 60:g} à {high / 60:g} minutes")
         print("🌙 Agent IA Nocturne actif - Tu dors, il bosse !")
         print("💡 Appuie sur Ctrl+C pour arrêter")
         
-        # Planifier les vérifications
-        schedule.every(interval_minutes).minutes.do(self.run_once)
+        # Planifier les vérifications (un worker de la file interroge la file à intervalle fixe)
+        if self.role == ROLE_WORKER:
+            poll_seconds = self.config.get("queue", {}).get("poll_seconds", 10)
+            self.scheduler.every("cycle", poll_seconds, self.run_once, run_now=True)
+        else:
+            self.scheduler.every("cycle", self.poll_interval.next, self._poll, run_now=True)
         
-        # Planifier le rapport quotidien Telegram
+        # Planifier le rapport quotidien Telegram (sur son propre thread, sans retarder les cycles)
         if self.telegram_notifier and self.telegram_notifier.enabled:
             daily_config = self.telegram_notifier.daily_report
             if daily_config.get("enabled", False):
                 report_time = daily_config.get("time", "07:00")
                 print(f"📱 Rapport quotidien programmé à {report_time}")
-                schedule.every().day.at(report_time).do(self.telegram_notifier.send_daily_report)
+                self.scheduler.daily("daily_report", report_time,
+                                     lambda: self.telegram_notifier.send_daily_report())
+        
+        # Points de reprise des emails consignés depuis plus de 30 jours
+        self.scheduler.daily("journal_purge", "04:00", self._purge_journal)
         
-        # Première vérification immédiate
-        self.run_once()
+        # Socket de contrôle quand l'agent est lancé par le superviseur
+        control_server = None
+        if os.environ.get(SOCKET_ENV):
+            control_server = ControlServer(os.environ[SOCKET_ENV], self._control_handlers())
+            control_server.start()
+        signal.signal(signal.SIGTERM, lambda *_: self.request_stop())
         
-        # Boucle principale
+        # Boucle principale : attente jusqu'à la prochaine échéance (première vérification immédiate)
         try:
-            while True:
-                schedule.run_pending()
-                time.sleep(30)  # Vérifier toutes les 30 secondes
+            if not self.stop_event.is_set():
+                self.scheduler.run()
         except KeyboardInterrupt:
-            print("\n🛑 Arrêt de l'Agent IA Nocturne")
-            print("📊 Statistiques sauvegardées dans opportunities_log.json")
+            self.request_stop()
+        finally:
+            # Laisser le cycle en cours se terminer (drain ou arrêt entre deux emails)
+            self.scheduler.shutdown()
+            if control_server:
+                control_server.stop()
+            if self.telegram_notifier:
+                self.telegram_notifier.close()
+            self.pool.shutdown()
+            self._close_attachments()
+        
+        print("\n🛑 Arrêt de l'Agent IA Nocturne")
+        print("📊 Statistiques sauvegardées dans opportunities_log.json")
 
-def load_config() -> Dict:
+def load_config(config_store: Optional[ConfigStore] = None) -> Dict:
     """Charger la configuration"""
-    config_file = "agent_config.json"
+    config_store = config_store or ConfigStore("agent_config.json")
     
-    if os.path.exists(config_file):
-        with open(config_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
+    if config_store.exists():
+        return config_store.load()
     else:
         # Configuration par défaut
-        config = {
-            "openai_api_key": "your_openai_api_key_here",
-            "email": {
-                "username": "your_email@gmail.com",
-                "password": "your_app_password"
-            },
-            "criteria": {
-                "budget_min": 500,
-                "duration_max": 30,
-                "language": "français",
-                "work_mode": "full remote",
-                "keywords_to_avoid": ["gratuit", "exposition", "urgent sans budget", "bénévolat"],
-                "relevance_threshold": 7
-            },
-            "signature": "David - Développeur Backend Python/IA\nwww.davidfreelance.fr\n+33 6 XX XX XX XX"
-        }
+        config = copy.deepcopy(DEFAULT_CONFIG)
         
         # Sauvegarder la configuration par défaut
-        with open(config_file, 'w', encoding='utf-8') as f:
-            json.dump(config, f, indent=2, ensure_ascii=False)
+        config_store.save(config, validate=False)
         
-        print(f"📝 Configuration par défaut créée dans {config_file}")
+        print(f"📝 Configuration par défaut créée dans {config_store.path}")
         print("⚠️  Modifiez la configuration avant de lancer l'agent")
         return config
 
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Agent IA Nocturne")
+    run_mode = parser.add_mutually_exclusive_group()
+    run_mode.add_argument("--once", action="store_true", help="Exécuter un seul cycle puis quitter")
+    run_mode.add_argument("--force", action="store_true",
+                          help="Un seul cycle en analysant tous les emails récents")
+    parser.add_argument("--role", choices=ROLES, default=ROLE_ALL,
+                        help="Rôle avec la file partagée : fetcher (IMAP et log), worker (analyse et réponse)")
+    parser.add_argument("--profile", nargs="?", const=CPROFILE, choices=MODES,
+                        help="Profiler chaque cycle (cprofile par défaut, ou sample)")
+    parser.add_argument("--profile-memory", action="store_true",
+                        help="Ajouter un instantané tracemalloc des allocations au profil")
+    parser.add_argument("--profile-dir", default="profiles", help="Répertoire des rapports de profilage")
+    return parser.parse_args(argv)
+
 def main():
     """Fonction principale"""
+    args = parse_args()
     print("🤖 Agent IA Nocturne - Version Python")
     print("=" * 50)
     
     # Charger la configuration
-    config = load_config()
+    config_store = ConfigStore("agent_config.json")
+    config = load_config(config_store)
     
     # Vérifier la configuration
     if config["openai_api_key"] == "your_openai_api_key_here":
         print("❌ Veuillez configurer votre clé API OpenAI dans agent_config.json")
         return
     
-    if config["email"]["username"] == "your_email@gmail.com":
+    if (args.role != ROLE_WORKER and not config.get("accounts")
+            and config["email"]["username"] == "your_email@gmail.com"):
         print("❌ Veuillez configurer vos identifiants email dans agent_config.json")
         return
     
     # Créer et démarrer l'agent
-    agent = AgentIANocturne(config)
+    agent = AgentIANocturne(config, config_store, role=args.role)
+    
+    if args.profile or args.profile_memory:
+        agent.profiler = Profiler(args.profile_dir, mode=args.profile or CPROFILE, memory=args.profile_memory)
+        print(f"🔬 Profilage des cycles activé ({agent.profiler.mode}) → {args.profile_dir}/")
     
     # Mode de fonctionnement
-    import sys
-    if len(sys.argv) > 1:
-        if sys.argv[1] == "--once":
-            print("🔄 Mode exécution unique")
-            agent.run_once()
-        elif sys.argv[1] == "--force":
+    if args.once or args.force:
+        if args.force:
             print("🔄 Mode exécution unique - analyse forcée de tous les emails récents")
-            agent.run_once(force_all=True)
         else:
-            print("🔄 Mode surveillance continue")
-            agent.start_monitoring()
+            print("🔄 Mode exécution unique")
+        agent.run_once(force_all=args.force)
+        agent._close_attachments()
+        if agent.telegram_notifier:
+            # Vider la file Telegram avant de quitter (le reste est repris au prochain lancement)
+            agent.telegram_notifier.close(flush_timeout=30)
     else:
         print("🔄 Mode surveillance continue")
         agent.start_monitoring()
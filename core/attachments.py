@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Extraction du texte des pièces jointes (cahiers des charges PDF, DOCX, TXT)
+Analyse dans un pool de processus avec limites de taille et de durée, cache par empreinte du contenu
+"""
+
+import os
+import re
+import hashlib
+import tempfile
+import threading
+import importlib.util
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.mime import SpooledPart
+from utils.lazy import lazy_import
+from utils.metrics import REGISTRY
+
+# Pool créé au premier cahier des charges à analyser
+multiprocessing = lazy_import("multiprocessing")
+
+ATTACHMENTS_EXTRACTED = REGISTRY.counter("agent_attachments_total", "Pièces jointes traitées", ["status"])
+
+# Version des extracteurs : l'incrémenter invalide le cache
+EXTRACTOR_VERSION = 1
+
+# Texte conservé par fichier (le budget de tokens du prompt s'applique ensuite)
+MAX_EXTRACTED_CHARS = 100_000
+
+DOCX_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+_WORD_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_BLANK_RE = re.compile(r"\n{3,}")
+
+
+def attachment_kind(content_type: str, filename: Optional[str]) -> Optional[str]:
+    """pdf, docx, text ou None si le format n'est pas pris en charge"""
+    extension = os.path.splitext(filename or "")[1].lower()
+    if content_type == "application/pdf" or extension == ".pdf":
+        return "pdf"
+    if content_type == DOCX_TYPE or extension == ".docx":
+        return "docx"
+    if content_type in ("text/plain", "text/markdown", "text/csv") or extension in (".txt", ".md", ".csv"):
+        return "text"
+    return None
+
+
+def _docx_text(path: str) -> str:
+    """Paragraphes de word/document.xml lus en flux (sans dépendance externe)"""
+    import zipfile
+    from xml.etree import ElementTree
+    paragraphs, current = [], []
+    with zipfile.ZipFile(path) as archive, archive.open("word/document.xml") as document:
+        for event, element in ElementTree.iterparse(document, events=("end",)):
+            if element.tag == _WORD_NS + "t":
+                current.append(element.text or "")
+            elif element.tag == _WORD_NS + "tab":
+                current.append("\t")
+            elif element.tag == _WORD_NS + "p":
+                paragraphs.append("".join(current))
+                current = []
+                element.clear()
+    return "\n".join(paragraphs)
+
+
+def _pdf_text(path: str, max_pages: int) -> str:
+    import pypdf
+    reader = pypdf.PdfReader(path)
+    return "\n".join(page.extract_text() or "" for page in reader.pages[:max_pages])
+
+
+def extract_file(path: str, kind: str, max_pages: int = 30) -> Tuple[str, str]:
+    """Exécuté dans un processus du pool : (statut, texte)"""
+    try:
+        if kind == "text":
+            with open(path, "rb") as f:
+                raw = f.read(MAX_EXTRACTED_CHARS * 4)
+            try:
+                text = raw.decode("utf-8")
+            except UnicodeDecodeError:
+                text = raw.decode("latin-1")
+        elif kind == "docx":
+            text = _docx_text(path)
+        else:
+            text = _pdf_text(path, max_pages)
+    except ImportError:
+        return "unsupported", ""
+    except Exception as e:
+        return "error", str(e)[:200]
+    return "extracted", _BLANK_RE.sub("\n\n", text.replace("\r\n", "\n")).strip()[:MAX_EXTRACTED_CHARS]
+
+
+def content_hash(part: SpooledPart) -> str:
+    digest = hashlib.sha256()
+    with part.map() as view:
+        digest.update(view)
+    return digest.hexdigest()
+
+
+class PendingExtract:
+    """Extraction soumise au pool (ou déjà résolue depuis le cache)"""
+
+    def __init__(self, extractor: "AttachmentExtractor", part: SpooledPart, kind: Optional[str],
+                 digest: Optional[str] = None, result: Optional[Dict[str, Any]] = None,
+                 leader: Optional["PendingExtract"] = None):
+        self.extractor = extractor
+        self.part = part
+        self.kind = kind
+        self.digest = digest
+        self.leader = leader
+        self._result = result
+        self._async = None
+        self._generation = None
+
+    def _submit(self):
+        self._async, self._generation = self.extractor._apply(self.part.path, self.kind)
+
+    def result(self) -> Dict[str, Any]:
+        if self._result is None and self.leader:
+            # Même contenu déjà en cours d'extraction dans ce lot
+            shared = self.leader.result()
+            status = "cached" if shared["status"] == "extracted" else shared["status"]
+            self._result = self.extractor._describe(self.part, status, shared["text"])
+        if self._result is None:
+            status, text = self.extractor._wait(self)
+            self.extractor._inflight.pop(self.digest, None)
+            if status == "extracted":
+                self.extractor._cache_put(self.digest, text)
+            self._result = self.extractor._describe(self.part, status, text)
+            ATTACHMENTS_EXTRACTED.inc(status=status)
+        return self._result
+
+
+class AttachmentExtractor:
+    """Pool de processus créé au premier fichier à analyser, cache disque par SHA-256 du contenu"""
+
+    def __init__(self, cache_dir: str = "attachment_cache", workers: int = 2,
+                 max_file_bytes: int = 10 << 20, timeout: float = 20.0, max_pages: int = 30):
+        self.cache_dir = cache_dir
+        self.workers = max(1, workers)
+        self.max_file_bytes = max_file_bytes
+        self.timeout = timeout
+        self.max_pages = max_pages
+        self._pool = None
+        self._generation = 0
+        self._inflight: Dict[str, PendingExtract] = {}
+        self._lock = threading.RLock()
+        # pypdf est optionnel : sans lui, les PDF ne sont même pas écrits sur disque
+        self.pdf_available = importlib.util.find_spec("pypdf") is not None
+
+    def wants(self, content_type: str, filename: Optional[str]) -> bool:
+        """Prédicat de spool pour core.mime : seuls les formats extractibles sont écrits sur disque"""
+        kind = attachment_kind(content_type, filename)
+        return kind is not None and (kind != "pdf" or self.pdf_available)
+
+    def _describe(self, part: SpooledPart, status: str, text: str = "") -> Dict[str, Any]:
+        return {"filename": part.filename, "content_type": part.content_type, "size": part.size,
+                "status": status, "text": text if status in ("extracted", "cached") else ""}
+
+    def _cache_path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}.v{EXTRACTOR_VERSION}.txt")
+
+    def _cache_get(self, digest: str) -> Optional[str]:
+        try:
+            with open(self._cache_path(digest), "r", encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _cache_put(self, digest: str, text: str):
+        path = self._cache_path(digest)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(prefix=".extract.", suffix=".tmp", dir=os.path.dirname(path))
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️ Cache des pièces jointes : {e}")
+
+    def submit(self, part: SpooledPart) -> PendingExtract:
+        """Lancer l'extraction d'une pièce jointe écrite sur disque par core.mime"""
+        kind = attachment_kind(part.content_type, part.filename)
+        if kind is None or (kind == "pdf" and not self.pdf_available):
+            return PendingExtract(self, part, kind, result=self._describe(part, "unsupported"))
+        if part.truncated or part.size > self.max_file_bytes:
+            ATTACHMENTS_EXTRACTED.inc(status="too_large")
+            return PendingExtract(self, part, kind, result=self._describe(part, "too_large"))
+
+        digest = content_hash(part)
+        cached = self._cache_get(digest)
+        if cached is not None:
+            ATTACHMENTS_EXTRACTED.inc(status="cached")
+            return PendingExtract(self, part, kind, digest, self._describe(part, "cached", cached))
+
+        with self._lock:
+            if digest in self._inflight:
+                return PendingExtract(self, part, kind, digest, leader=self._inflight[digest])
+            pending = PendingExtract(self, part, kind, digest)
+            pending._submit()
+            self._inflight[digest] = pending
+        return pending
+
+    def _apply(self, path: str, kind: str):
+        with self._lock:
+            if self._pool is None:
+                # spawn : pas de fork d'un processus qui a déjà des threads (workers, IMAP, Telegram)
+                self._pool = multiprocessing.get_context("spawn").Pool(self.workers)
+            return self._pool.apply_async(extract_file, (path, kind, self.max_pages)), self._generation
+
+    def _wait(self, pending: PendingExtract) -> Tuple[str, str]:
+        # Pool redémarré après un dépassement de délai : la tâche est soumise à nouveau
+        if pending._generation != self._generation:
+            pending._submit()
+        try:
+            return pending._async.get(self.timeout)
+        except multiprocessing.TimeoutError:
+            print(f"⚠️ Extraction trop longue, abandonnée : {pending.part.filename}")
+            with self._lock:
+                if pending._generation == self._generation:
+                    self._restart()
+            return "timeout", ""
+
+    def _restart(self):
+        """Tuer le pool (seul moyen d'interrompre un analyseur bloqué)"""
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+        self._generation += 1
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool.join()
+                self._pool = None
+
+
+def open_extractor(config: Dict[str, Any]) -> Optional[AttachmentExtractor]:
+    """Extracteur configuré par config["attachments"], None si l'analyse des pièces jointes est désactivée"""
+    attachments_config = config.get("attachments", {})
+    if not attachments_config.get("enabled", True):
+        return None
+    return AttachmentExtractor("attachment_cache", attachments_config.get("workers", 2),
+                               attachments_config.get("max_file_bytes", 10 << 20),
+                               attachments_config.get("timeout", 20),
+                               attachments_config.get("max_pages", 30))
+
+
+def render_attachments(extracts: List[Dict[str, Any]], max_tokens: int) -> str:
+    """Texte des pièces jointes pour le prompt, tronqué au budget (≈ 4 caractères par token)"""
+    budget = max_tokens * 4
+    blocks = []
+    for extract in extracts:
+        text = extract.get("text") or ""
+        if not text or budget <= 0:
+            continue
+        header = f"[Pièce jointe : {extract.get('filename') or 'sans nom'}]\n"
+        room = budget - len(header)
+        if room <= 0:
+            break
+        if len(text) > room:
+            text = text[:room].rsplit(" ", 1)[0] + " […]"
+        blocks.append(header + text)
+        budget -= len(header) + len(text)
+    return "\n\n".join(blocks)
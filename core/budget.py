@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Budget des appels IA et mode dégradé de l'Agent IA Nocturne
+Modèle moins cher, pré-filtre local ou report des emails peu prioritaires à l'approche des limites
+"""
+
+import re
+import os
+import json
+import tempfile
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from data.storage.usage_ledger import UsageLedger
+
+NORMAL = "normal"
+CHEAPER_MODEL = "cheaper_model"
+PREFILTER = "prefilter"
+DEFER = "defer"
+EXHAUSTED = "exhausted"
+
+# Mots-clés du profil (backend Python/API/IA) utilisés par le pré-filtre local
+PROFILE_KEYWORDS = ("python", "api", "backend", "django", "flask", "fastapi", "ia",
+                    "intelligence artificielle", "machine learning", "llm", "data", "freelance",
+                    "mission", "développeur", "developpeur", "développement", "developpement")
+
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def prefilter(text: str, criteria: Dict[str, Any]) -> Dict[str, Any]:
+    """Analyse locale sans appel IA : rejet sur mot-clé à éviter, score sur les mots du profil"""
+    lowered = (text or "").lower()
+    avoided = [keyword for keyword in criteria.get("keywords_to_avoid", []) if keyword.lower() in lowered]
+    if avoided:
+        return {
+            "pertinence": 0,
+            "decision": "❌ Mission rejetée – hors cible",
+            "raisons": [f"Mot-clé à éviter : {keyword}" for keyword in avoided[:3]],
+            "points_attention": [],
+            "prefilter": True
+        }
+
+    words = set(WORD_RE.findall(lowered))
+    matched = [keyword for keyword in PROFILE_KEYWORDS
+               if (keyword in words if " " not in keyword else keyword in lowered)]
+    score = min(10, len(matched) * 2)
+    return {
+        "pertinence": score,
+        "decision": "❌ Mission rejetée – hors cible" if not matched else "🔎 À analyser",
+        "raisons": [f"Mot-clé du profil : {keyword}" for keyword in matched[:3]] or ["Aucun mot-clé du profil"],
+        "points_attention": [],
+        "prefilter": True
+    }
+
+
+class BudgetGuard:
+    """Choisir le mode de traitement selon la consommation du jour et du mois"""
+
+    def __init__(self, ledger: UsageLedger, llm_config: Optional[Dict[str, Any]] = None):
+        self.ledger = ledger
+        self.configure(llm_config or {})
+
+    def configure(self, llm_config: Dict[str, Any]):
+        self.models = llm_config.get("models", {})
+        self.budget = llm_config.get("budget", {})
+        self.ledger.prices = llm_config.get("prices", {})
+
+    def usage_ratio(self) -> float:
+        """Part la plus élevée consommée parmi les budgets configurés (0 si aucun)"""
+        now = datetime.now()
+        today = self.ledger.totals(now.strftime("%Y-%m-%d"))
+        month = self.ledger.totals(now.strftime("%Y-%m"))
+        ratios = []
+        for key, totals, field in (("daily_tokens", today, "tokens"), ("monthly_tokens", month, "tokens"),
+                                   ("daily_cost", today, "cost"), ("monthly_cost", month, "cost")):
+            limit = self.budget.get(key)
+            if limit:
+                ratios.append(totals[field] / limit)
+        return max(ratios, default=0.0)
+
+    def mode(self) -> str:
+        """normal, mode dégradé configuré au-delà de degrade_at, ou exhausted au-delà de 100 %"""
+        ratio = self.usage_ratio()
+        if ratio >= 1.0:
+            return EXHAUSTED
+        if ratio >= self.budget.get("degrade_at", 0.8):
+            return self.budget.get("degraded_mode", CHEAPER_MODEL)
+        return NORMAL
+
+    def model(self, provider: str, mode: str) -> str:
+        """Modèle à utiliser pour un fournisseur dans le mode courant"""
+        models = self.models.get(provider, {})
+        default = models.get("default", "gpt-3.5-turbo" if provider == "openai" else "mistral-medium")
+        if mode == CHEAPER_MODEL:
+            return models.get("cheap", default)
+        return default
+
+    def status(self) -> Dict[str, Any]:
+        return {"mode": self.mode(), "usage_ratio": round(self.usage_ratio(), 3), "budget": self.budget}
+
+
+class DeferredQueue:
+    """Emails reportés faute de budget, conservés sur disque jusqu'au prochain cycle"""
+
+    def __init__(self, path: str = "deferred_emails.json"):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self.items = json.load(f)
+        except (OSError, ValueError):
+            self.items = []
+
+    def _save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".deferred.", suffix=".tmp", dir=directory)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(self.items, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def push(self, email_info: Dict[str, Any]):
+        with self._lock:
+            if any(item["id"] == email_info["id"] for item in self.items):
+                return
+            self.items.append(email_info)
+            self._save()
+
+    def take_all(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            items, self.items = self.items, []
+            if items:
+                self._save()
+        return items
+
+    def __len__(self) -> int:
+        return len(self.items)
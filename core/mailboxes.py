@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Pool de traitement partagé entre les boîtes mail surveillées
+Répartition tour à tour entre comptes, nombre d'emails en cours plafonné par compte
+"""
+
+from collections import Counter, deque
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.lazy import lazy_import
+
+# Threads créés au premier email à traiter (une exécution --once sans email n'en démarre aucun)
+futures = lazy_import("concurrent.futures")
+
+
+class FairWorkPool:
+    """Workers partagés : aucun compte ne monopolise le pool, même avec une boîte très chargée"""
+
+    def __init__(self, workers: int = 4, per_account: int = 2):
+        self.workers = max(1, workers)
+        self.per_account = max(1, per_account)
+        self._executor = None
+
+    def run(self, queues: Dict[str, List[Any]], handler: Callable[[Any], Any],
+            stop: Optional[Callable[[], bool]] = None,
+            on_done: Optional[Callable[[str, Any], None]] = None,
+            on_idle: Optional[Callable[[], None]] = None) -> Dict[str, List[Any]]:
+        """Traiter toutes les files ; retourne les éléments terminés par compte
+
+        stop() vrai : plus aucun nouvel élément n'est lancé (ceux en cours se terminent).
+        on_idle() est appelé quand plus rien n'est en cours (application d'une config en attente)."""
+        if self._executor is None:
+            self._executor = futures.ThreadPoolExecutor(self.workers, thread_name_prefix="email-worker")
+        pending = {name: deque(items) for name, items in queues.items() if items}
+        order = deque(pending)
+        inflight = Counter()
+        running = {}
+        done_items = {name: [] for name in queues}
+
+        while pending or running:
+            if pending and stop and stop():
+                pending.clear()
+            if not running and on_idle:
+                on_idle()
+
+            # Tour à tour entre comptes jusqu'à remplir le pool
+            progressed = True
+            while pending and len(running) < self.workers and progressed:
+                progressed = False
+                for _ in range(len(order)):
+                    name = order[0]
+                    order.rotate(-1)
+                    if name in pending and inflight[name] < self.per_account:
+                        item = pending[name].popleft()
+                        if not pending[name]:
+                            del pending[name]
+                            order.remove(name)
+                        running[self._executor.submit(handler, item)] = (name, item)
+                        inflight[name] += 1
+                        progressed = True
+                        break
+
+            if not running:
+                break
+            finished, _ = futures.wait(running, return_when=futures.FIRST_COMPLETED)
+            for future in finished:
+                name, item = running.pop(future)
+                inflight[name] -= 1
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"❌ Erreur de traitement ({name}) : {e}")
+                done_items[name].append(item)
+                if on_done:
+                    on_done(name, item)
+        return done_items
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
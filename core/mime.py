@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Analyse MIME en flux à mémoire bornée
+Les parties texte alimentent email.parser.BytesFeedParser, les pièces jointes sont écrites sur disque ou ignorées
+"""
+
+import os
+import mmap
+import shutil
+import binascii
+import tempfile
+from contextlib import contextmanager
+from email.message import Message
+from email.parser import BytesFeedParser, BytesHeaderParser
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from utils.metrics import REGISTRY
+
+MIME_BYTES = REGISTRY.counter("agent_mime_bytes_total",
+                              "Octets de corps MIME décodés, ignorés ou écrits sur disque", ["kind"])
+
+DEFAULT_CHUNK_SIZE = 1 << 20
+DEFAULT_MAX_TEXT_BYTES = 1 << 20
+DEFAULT_MAX_ATTACHMENT_BYTES = 25 << 20
+
+# Destination du corps de la partie en cours
+_PASS, _TEXT, _SPOOL, _SKIP = "pass", "text", "spool", "skip"
+
+
+class SpooledPart:
+    """Pièce jointe décodée dans un fichier temporaire, lue par mmap à la demande"""
+
+    def __init__(self, path: str, content_type: str, filename: Optional[str]):
+        self.path = path
+        self.content_type = content_type
+        self.filename = filename
+        self.size = 0
+        self.truncated = False
+
+    @contextmanager
+    def map(self) -> Iterator[Any]:
+        """Contenu en lecture seule sans le charger en mémoire (bytes vide si fichier vide)"""
+        if not self.size:
+            yield b""
+            return
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            yield view
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"path": self.path, "content_type": self.content_type, "filename": self.filename,
+                "size": self.size, "truncated": self.truncated}
+
+
+class ParsedMessage:
+    """Message dont seules les parties texte sont en mémoire"""
+
+    def __init__(self, message: Message, attachments: List[SpooledPart], stats: Dict[str, int],
+                 spool_dir: Optional[str]):
+        self.message = message
+        self.attachments = attachments
+        self.stats = stats
+        self.spool_dir = spool_dir
+
+    def close(self):
+        """Supprimer les pièces jointes écrites sur disque"""
+        if self.spool_dir:
+            shutil.rmtree(self.spool_dir, ignore_errors=True)
+            self.spool_dir = None
+
+    def __enter__(self) -> "ParsedMessage":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _Decoder:
+    """Décodage incrémental du Content-Transfer-Encoding, ligne par ligne"""
+
+    def __init__(self, encoding: str):
+        self.encoding = (encoding or "7bit").lower()
+        self._rest = b""
+        self._eol = b""
+
+    def feed(self, line: bytes) -> bytes:
+        if self.encoding == "base64":
+            data = self._rest + b"".join(line.split())
+            cut = len(data) - len(data) % 4
+            self._rest = data[cut:]
+            try:
+                return binascii.a2b_base64(data[:cut]) if cut else b""
+            except binascii.Error:
+                return b""
+        if self.encoding == "quoted-printable":
+            return binascii.a2b_qp(line)
+        # 7bit/8bit/binary : la fin de ligne précédant une frontière n'appartient pas au contenu
+        content = line.rstrip(b"\r\n")
+        out, self._eol = self._eol + content, line[len(content):]
+        return out
+
+    def flush(self) -> bytes:
+        rest, self._rest = self._rest, b""
+        if self.encoding == "base64" and rest:
+            try:
+                return binascii.a2b_base64(rest + b"=" * (-len(rest) % 4))
+            except binascii.Error:
+                return b""
+        return b""
+
+
+class StreamingParser:
+    """Filtre ligne à ligne devant BytesFeedParser
+
+    Les en-têtes et les parties texte (jusqu'à max_text_bytes) sont transmis au parser ;
+    le corps des autres parties est écrit dans spool_dir si spool(type, nom) l'accepte, sinon ignoré."""
+
+    def __init__(self, max_text_bytes: int = DEFAULT_MAX_TEXT_BYTES,
+                 max_attachment_bytes: int = DEFAULT_MAX_ATTACHMENT_BYTES,
+                 spool: Optional[Callable[[str, Optional[str]], bool]] = None,
+                 spool_dir: Optional[str] = None):
+        self.max_text_bytes = max_text_bytes
+        self.max_attachment_bytes = max_attachment_bytes
+        self.spool = spool
+        self.spool_root = spool_dir
+        self.spool_dir = None
+        self.attachments: List[SpooledPart] = []
+        self.stats = {"decoded": 0, "skipped": 0, "spooled": 0}
+        self._parser = BytesFeedParser()
+        self._partial = b""
+        self._headers: Optional[List[bytes]] = []
+        self._boundaries: List[bytes] = []
+        self._sink = _PASS
+        self._text_bytes = 0
+        self._file = None
+        self._decoder = None
+        self._current: Optional[SpooledPart] = None
+
+    def feed(self, data: bytes):
+        lines = (self._partial + data).splitlines(keepends=True)
+        # Ligne incomplète (y compris un \r dont le \n arrive au bloc suivant) : gardée pour le prochain bloc
+        self._partial = lines.pop() if lines and not lines[-1].endswith(b"\n") else b""
+        for line in lines:
+            self._line(line)
+
+    def close(self) -> ParsedMessage:
+        if self._partial:
+            self._line(self._partial)
+            self._partial = b""
+        if self._headers is not None:
+            self._end_headers()
+        self._end_part()
+        for kind, amount in self.stats.items():
+            if amount:
+                MIME_BYTES.inc(amount, kind=kind)
+        return ParsedMessage(self._parser.close(), self.attachments, self.stats, self.spool_dir)
+
+    def _line(self, line: bytes):
+        if self._headers is not None:
+            self._parser.feed(line)
+            if line.strip():
+                self._headers.append(line)
+            else:
+                self._end_headers()
+            return
+
+        if self._boundaries and line.startswith(b"--"):
+            marker = line.rstrip()
+            for depth in range(len(self._boundaries) - 1, -1, -1):
+                boundary = self._boundaries[depth]
+                if marker == boundary or marker == boundary + b"--":
+                    self._end_part()
+                    self._parser.feed(line)
+                    if marker == boundary:
+                        del self._boundaries[depth + 1:]
+                        self._headers = []
+                    else:
+                        # Fin du multipart : l'épilogue appartient au parent
+                        del self._boundaries[depth:]
+                        self._sink = _PASS
+                    return
+
+        if self._sink == _PASS:
+            self._parser.feed(line)
+            self.stats["decoded"] += len(line)
+        elif self._sink == _TEXT:
+            if self._text_bytes + len(line) <= self.max_text_bytes:
+                self._parser.feed(line)
+                self._text_bytes += len(line)
+                self.stats["decoded"] += len(line)
+            else:
+                self.stats["skipped"] += len(line)
+        elif self._sink == _SPOOL:
+            self._write(self._decoder.feed(line), len(line))
+        else:
+            self.stats["skipped"] += len(line)
+
+    def _end_headers(self):
+        headers = BytesHeaderParser().parsebytes(b"".join(self._headers) + b"\n")
+        self._headers = None
+        content_type = headers.get_content_type()
+        filename = headers.get_filename()
+        attachment = (headers.get_content_disposition() == "attachment") or bool(filename)
+        encoding = (headers.get("content-transfer-encoding") or "7bit").strip().lower()
+
+        if headers.get_content_maintype() == "multipart" and headers.get_boundary():
+            self._boundaries.append(b"--" + headers.get_boundary().encode("ascii", "replace"))
+            self._sink = _PASS
+        elif content_type == "message/rfc822" and encoding in ("7bit", "8bit", "binary"):
+            # Message transféré : conteneur dont les en-têtes et les parties sont analysés comme ceux du message
+            self._headers = []
+            self._sink = _PASS
+        elif headers.get_content_maintype() == "text" and not attachment:
+            self._sink = _TEXT
+            self._text_bytes = 0
+        elif self.spool and self.spool(content_type, filename):
+            if self.spool_dir is None:
+                self.spool_dir = tempfile.mkdtemp(prefix="agent-mime-", dir=self.spool_root)
+            path = os.path.join(self.spool_dir, f"part-{len(self.attachments)}")
+            self._current = SpooledPart(path, content_type, filename)
+            self._file = open(path, "wb")
+            self._decoder = _Decoder(encoding)
+            self.attachments.append(self._current)
+            self._sink = _SPOOL
+        else:
+            self._sink = _SKIP
+
+    def _write(self, data: bytes, raw_size: int):
+        part = self._current
+        if part.truncated or part.size + len(data) > self.max_attachment_bytes:
+            # Au-delà de la limite : le reste de la pièce jointe est ignoré
+            part.truncated = True
+            self.stats["skipped"] += raw_size
+            return
+        if data:
+            self._file.write(data)
+            part.size += len(data)
+        self.stats["spooled"] += raw_size
+
+    def _end_part(self):
+        if self._sink == _SPOOL and self._file:
+            self._write(self._decoder.flush(), 0)
+            self._file.close()
+            self._file = None
+            self._current = None
+            self._decoder = None
+        self._sink = _PASS
+
+
+def iter_parts(message: Message) -> Iterator[Message]:
+    """Parties du message dans l'ordre, sans descendre dans les messages transférés (message/rfc822)"""
+    yield message
+    if message.is_multipart() and message.get_content_type() != "message/rfc822":
+        for part in message.get_payload():
+            yield from iter_parts(part)
+
+
+def parse_bytes(raw: bytes, chunk_size: int = DEFAULT_CHUNK_SIZE, **kwargs) -> ParsedMessage:
+    """Analyser un message déjà en mémoire par blocs (mêmes limites que le flux IMAP)"""
+    parser = StreamingParser(**kwargs)
+    for offset in range(0, len(raw), chunk_size):
+        parser.feed(raw[offset:offset + chunk_size])
+    return parser.close()
+
+
+def iter_imap_chunks(mail, uid: bytes, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[bytes]:
+    """Message IMAP par FETCH partiels BODY[]<début.taille> : jamais plus d'un bloc en mémoire"""
+    offset = 0
+    while True:
+        status, data = mail.uid("fetch", uid, f"(BODY[]<{offset}.{chunk_size}>)")
+        if status != "OK":
+            raise RuntimeError(f"FETCH {uid.decode()} : {status}")
+        chunk = next((item[1] for item in data if isinstance(item, tuple)), None)
+        if chunk is None:
+            if offset == 0:
+                raise RuntimeError(f"FETCH {uid.decode()} : message introuvable")
+            return
+        if chunk:
+            yield chunk
+        if len(chunk) < chunk_size:
+            return
+        offset += len(chunk)
+
+
+def fetch_message(mail, uid: bytes, chunk_size: int = DEFAULT_CHUNK_SIZE, **kwargs) -> ParsedMessage:
+    """Relever et analyser un message en flux (voir StreamingParser pour les limites)"""
+    parser = StreamingParser(**kwargs)
+    try:
+        for chunk in iter_imap_chunks(mail, uid, chunk_size):
+            parser.feed(chunk)
+    except BaseException:
+        parsed = parser.close()
+        parsed.close()
+        raise
+    return parser.close()
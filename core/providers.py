@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Registre des fournisseurs IA de l'Agent IA Nocturne
+Le SDK d'un fournisseur n'est importé qu'au premier appel réel (démarrage rapide des exécutions --once)
+"""
+
+import time
+import importlib
+import importlib.util
+import threading
+from typing import Any, Callable, Dict, Optional
+
+
+class RateLimiter:
+    """Limite de débit globale d'un fournisseur, partagée par tous les comptes et workers"""
+
+    def __init__(self, requests_per_minute: float):
+        self.interval = 60.0 / requests_per_minute
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Attendre le prochain créneau libre ; retourne l'attente en secondes"""
+        with self._lock:
+            now = time.monotonic()
+            delay = max(0.0, self._next - now)
+            self._next = max(now, self._next) + self.interval
+        if delay:
+            time.sleep(delay)
+        return delay
+
+
+class Provider:
+    """Fournisseur IA : module du SDK et fabrique du client"""
+
+    def __init__(self, name: str, module: str, factory: Callable[[Any, str], Any]):
+        self.name = name
+        self.module = module
+        self.factory = factory
+        self.limiter: Optional[RateLimiter] = None
+
+    def available(self) -> bool:
+        """SDK installé (vérifié sans l'importer)"""
+        try:
+            return importlib.util.find_spec(self.module.split(".")[0]) is not None
+        except (ImportError, ValueError):
+            return False
+
+    def create(self, api_key: str) -> Any:
+        return self.factory(importlib.import_module(self.module), api_key)
+
+    def throttle(self) -> float:
+        return self.limiter.acquire() if self.limiter else 0.0
+
+
+class LazyClient:
+    """Client construit (et SDK importé) au premier accès à un attribut"""
+
+    def __init__(self, provider: Provider, api_key: str):
+        self.provider = provider
+        self._api_key = api_key
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._client is not None
+
+    def _get(self) -> Any:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self.provider.create(self._api_key)
+        return self._client
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._get(), name)
+
+
+PROVIDERS: Dict[str, Provider] = {}
+
+
+def register(name: str, module: str, factory: Callable[[Any, str], Any]) -> Provider:
+    provider = Provider(name, module, factory)
+    PROVIDERS[name] = provider
+    return provider
+
+
+def configure_rate_limits(rate_limits: Dict[str, Any]):
+    """Appliquer llm.rate_limits ({fournisseur: {"requests_per_minute": n}}), None = illimité"""
+    for name, provider in PROVIDERS.items():
+        limit = (rate_limits.get(name) or {}).get("requests_per_minute")
+        if not limit:
+            provider.limiter = None
+        elif not provider.limiter or provider.limiter.interval != 60.0 / limit:
+            provider.limiter = RateLimiter(limit)
+
+
+def throttle(name: str) -> float:
+    provider = PROVIDERS.get(name)
+    return provider.throttle() if provider else 0.0
+
+
+def create_client(name: str, api_key: Optional[str]) -> Optional[LazyClient]:
+    """Client différé du fournisseur, None si la clé est absente ou le SDK non installé"""
+    provider = PROVIDERS.get(name)
+    if provider is None:
+        raise ValueError(f"Fournisseur IA inconnu : {name}")
+    if not api_key:
+        return None
+    if not provider.available():
+        raise ImportError(f"SDK {provider.module} non installé")
+    return LazyClient(provider, api_key)
+
+
+register("openai", "openai", lambda sdk, api_key: sdk.OpenAI(api_key=api_key))
+register("mistral", "mistralai.client", lambda sdk, api_key: sdk.MistralClient(api_key=api_key))
@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""
+Rejeu hors ligne d'une boîte mail enregistrée (mbox ou Maildir)
+extract_email_body → analyse → réponse sans réseau, réponses IA lues depuis une cassette
+
+    python -m core.replay boite.mbox --cassette cassette.jsonl --workers 4 --log opportunities_log.json
+"""
+
+import io
+import os
+import sys
+import json
+import copy
+import hashlib
+import mailbox
+import argparse
+import statistics
+import time
+import threading
+from contextlib import contextmanager, redirect_stdout
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Ajouter le répertoire racine au path (exécution directe du script)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.agent import AgentIANocturne
+from core.budget import BudgetGuard
+from core.attachments import open_extractor
+from core.mime import parse_bytes
+from data.storage.usage_ledger import UsageLedger
+from utils.config import ConfigStore, DEFAULT_CONFIG
+
+RETAINED = "✅ Mission retenue"
+
+# Clé de cassette : texte de l'opportunité seul (robuste aux retouches de prompt) ou prompt complet
+MATCH_BODY = "body"
+MATCH_PROMPT = "prompt"
+
+
+class CassetteMiss(Exception):
+    """Aucune réponse enregistrée pour cette requête"""
+
+
+class Cassette:
+    """Réponses IA enregistrées (JSONL), indexées par opération et contenu de la requête"""
+
+    def __init__(self, path: str, match: str = MATCH_BODY):
+        self.path = path
+        self.match = match
+        self.entries = {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries[entry["key"]] = entry
+        except FileNotFoundError:
+            pass
+
+    def key(self, operation: str, prompt: str) -> str:
+        if self.match == MATCH_BODY:
+            # Le texte de l'opportunité est encadré par des lignes « --- » dans les deux prompts
+            parts = prompt.split("\n---\n")
+            if len(parts) >= 3:
+                prompt = "\n---\n".join(parts[1:-1])
+        return hashlib.sha256(f"{operation}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.entries.get(key)
+
+    def append(self, entries: List[Dict[str, Any]]):
+        if not entries:
+            return
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for entry in entries:
+                if entry["key"] not in self.entries:
+                    self.entries[entry["key"]] = entry
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+class CassetteClient:
+    """Remplace openai_client : lit la cassette, ou appelle le vrai client et enregistre (--record)"""
+
+    def __init__(self, cassette: Cassette, upstream=None):
+        self.cassette = cassette
+        self.upstream = upstream
+        self.operation = "analysis"
+        self.recorded = []
+        self.hits = 0
+        self.misses = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model: str, messages: List[Dict[str, str]], **kwargs):
+        prompt = messages[-1]["content"]
+        key = self.cassette.key(self.operation, prompt)
+        entry = self.cassette.get(key)
+        if entry is None and self.upstream is not None:
+            response = self.upstream.chat.completions.create(model=model, messages=messages, **kwargs)
+            usage = getattr(response, "usage", None)
+            entry = {
+                "key": key,
+                "operation": self.operation,
+                "model": model,
+                "content": response.choices[0].message.content,
+                "usage": {"prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+                          "completion_tokens": getattr(usage, "completion_tokens", 0) or 0}
+            }
+            self.cassette.entries[key] = entry
+            self.recorded.append(entry)
+        if entry is None:
+            self.misses += 1
+            raise CassetteMiss(f"réponse absente de la cassette ({self.operation})")
+        self.hits += 1
+        usage = entry.get("usage", {})
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=entry["content"]))],
+            usage=SimpleNamespace(prompt_tokens=usage.get("prompt_tokens", 0),
+                                  completion_tokens=usage.get("completion_tokens", 0)))
+
+
+class ReplayAgent(AgentIANocturne):
+    """Agent réduit au pipeline d'analyse : ni IMAP, ni SMTP, ni stockage, ni Telegram"""
+
+    def __init__(self, config: Dict, client: CassetteClient):
+        self.config = config
+        self.criteria = config["criteria"]
+        self.openai_client = client
+        self.mistral_client = None
+        self.budget = BudgetGuard(UsageLedger(os.devnull, calls_path=None), config.get("llm"))
+        self._local = threading.local()
+        self.attachments = open_extractor(config)
+        self.tokens = 0
+
+    @contextmanager
+    def _llm_call(self, provider: str, operation: str, model: str):
+        self.openai_client.operation = operation
+        call = {"response": None}
+        yield call
+        usage = getattr(call["response"], "usage", None)
+        self.tokens += (getattr(usage, "prompt_tokens", 0) or 0) + (getattr(usage, "completion_tokens", 0) or 0)
+
+    def replay(self, raw: bytes) -> Dict[str, Any]:
+        """Rejouer un message : mêmes étapes que _process_email, sans envoi ni log"""
+        timings = {}
+        start = time.perf_counter()
+        mime = self.config.get("mime", {})
+        with parse_bytes(raw, max_text_bytes=mime.get("max_text_bytes", 1 << 20),
+                         spool=self.attachments.wants if self.attachments else None) as parsed:
+            email_message = parsed.message
+            email_info = {"body": self.extract_email_body(email_message)}
+            # Pièces jointes extraites comme à la relève : même prompt que _process_email
+            if self.attachments:
+                self._attach_extracts(email_info, [self.attachments.submit(part) for part in parsed.attachments])
+        subject = email_message["subject"] or "Sans objet"
+        sender = email_message["from"]
+        prompt = self._prompt_content(email_info)
+        timings["extract"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        analysis = self.analyze_opportunity(prompt)
+        timings["analysis"] = time.perf_counter() - start
+
+        action = "Rejetée"
+        if analysis["decision"] == RETAINED:
+            start = time.perf_counter()
+            self.generate_response(prompt)
+            timings["generation"] = time.perf_counter() - start
+            action = "Réponse générée"
+
+        return {
+            "message_id": email_message["message-id"],
+            "subject": subject,
+            "sender": sender,
+            "pertinence": analysis.get("pertinence", 0),
+            "decision": analysis.get("decision"),
+            "action": action,
+            "timings": timings
+        }
+
+
+def iter_mailbox(path: str) -> Iterator[bytes]:
+    """Messages bruts d'un Maildir (répertoire cur/new) ou d'un fichier mbox"""
+    if os.path.isdir(path):
+        box = mailbox.Maildir(path, factory=None, create=False)
+    else:
+        box = mailbox.mbox(path, factory=None, create=False)
+    try:
+        for key in box.iterkeys():
+            yield box.get_bytes(key)
+    finally:
+        box.close()
+
+
+def load_replay_config(path: Optional[str]) -> Dict[str, Any]:
+    """Critères, signature et modèles depuis un fichier de config (défauts sinon)"""
+    config = copy.deepcopy(DEFAULT_CONFIG)
+    if path and os.path.exists(path):
+        config.update(ConfigStore(path).load())
+    return config
+
+
+def upstream_client(config: Dict[str, Any]):
+    """Vrai client OpenAI pour enregistrer les réponses manquantes"""
+    import openai
+    key = config.get("openai_api_key")
+    if not key or key == "your_openai_api_key_here":
+        raise SystemExit("❌ --record nécessite une clé API OpenAI dans la configuration")
+    return openai.OpenAI(api_key=key)
+
+
+_worker = {}
+
+
+def _init_worker(config: Dict[str, Any], cassette_path: str, match: str, record: bool):
+    cassette = Cassette(cassette_path, match)
+    client = CassetteClient(cassette, upstream_client(config) if record else None)
+    _worker["agent"] = ReplayAgent(config, client)
+
+
+def _replay_chunk(chunk: List[Tuple[int, bytes]]) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    agent = _worker["agent"]
+    client = agent.openai_client
+    results = []
+    with redirect_stdout(io.StringIO()) as output:
+        for index, raw in chunk:
+            result = agent.replay(raw)
+            result["index"] = index
+            results.append(result)
+            output.seek(0)
+            output.truncate()
+    stats = {"recorded": client.recorded, "hits": client.hits, "misses": client.misses, "tokens": agent.tokens}
+    client.recorded, client.hits, client.misses, agent.tokens = [], 0, 0, 0
+    return results, stats
+
+
+def chunked(messages: Iterator[bytes], size: int, limit: Optional[int] = None) -> Iterator[List[Tuple[int, bytes]]]:
+    chunk = []
+    for index, raw in enumerate(messages):
+        if limit is not None and index >= limit:
+            break
+        chunk.append((index, raw))
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run_replay(mailbox_path: str, cassette_path: str, config: Dict[str, Any], workers: int = 1,
+               match: str = MATCH_BODY, record: bool = False, limit: Optional[int] = None,
+               chunk_size: int = 50) -> Dict[str, Any]:
+    """Rejouer toute la boîte ; retourne résultats par message, débit et latences par étape"""
+    results = []
+    counters = {"hits": 0, "misses": 0, "tokens": 0, "recorded": 0}
+    cassette = Cassette(cassette_path, match)
+    start = time.perf_counter()
+
+    def collect(chunk_results, stats):
+        results.extend(chunk_results)
+        cassette.append(stats["recorded"])
+        counters["recorded"] += len(stats["recorded"])
+        for name in ("hits", "misses", "tokens"):
+            counters[name] += stats[name]
+
+    chunks = chunked(iter_mailbox(mailbox_path), chunk_size, limit)
+    if workers > 1:
+        with ProcessPoolExecutor(workers, initializer=_init_worker,
+                                 initargs=(config, cassette_path, match, record)) as pool:
+            for chunk_results, stats in pool.map(_replay_chunk, chunks):
+                collect(chunk_results, stats)
+    else:
+        _init_worker(config, cassette_path, match, record)
+        try:
+            for chunk in chunks:
+                collect(*_replay_chunk(chunk))
+        finally:
+            if _worker["agent"].attachments:
+                _worker["agent"].attachments.close()
+
+    elapsed = time.perf_counter() - start
+    results.sort(key=lambda result: result["index"])
+
+    stages = {}
+    for result in results:
+        for stage, value in result["timings"].items():
+            stages.setdefault(stage, []).append(value)
+
+    return {
+        "messages": len(results),
+        "seconds": round(elapsed, 3),
+        "messages_per_second": round(len(results) / elapsed, 1) if elapsed > 0 else 0.0,
+        "workers": workers,
+        "cassette": counters,
+        "retained": sum(1 for result in results if result["decision"] == RETAINED),
+        "stages": {stage: {"p50_ms": round(statistics.median(values) * 1000, 3),
+                           "p95_ms": round(sorted(values)[int(0.95 * (len(values) - 1))] * 1000, 3),
+                           "total_s": round(sum(values), 3)}
+                   for stage, values in stages.items()},
+        "results": results
+    }
+
+
+def diff_decisions(results: List[Dict[str, Any]], log_file: str) -> Dict[str, Any]:
+    """Comparer les décisions rejouées à celles du log (jointure sujet + expéditeur bruts)"""
+    from core.stats import iter_opportunities
+
+    logged = {}
+    for entry in iter_opportunities(log_file):
+        logged[(entry.get("subject"), entry.get("sender"))] = entry
+
+    diff = {"matched": 0, "unmatched": 0, "same": 0, "changed": [], "pertinence_delta": []}
+    for result in results:
+        entry = logged.get((result["subject"], result["sender"]))
+        if entry is None:
+            diff["unmatched"] += 1
+            continue
+        diff["matched"] += 1
+        before = entry.get("decision", "") == RETAINED
+        after = result["decision"] == RETAINED
+        diff["pertinence_delta"].append(result["pertinence"] - (entry.get("pertinence") or 0))
+        if before == after:
+            diff["same"] += 1
+        else:
+            diff["changed"].append({
+                "subject": result["subject"],
+                "sender": result["sender"],
+                "before": entry.get("decision"),
+                "after": result["decision"],
+                "pertinence_before": entry.get("pertinence"),
+                "pertinence_after": result["pertinence"]
+            })
+    deltas = diff.pop("pertinence_delta")
+    diff["mean_pertinence_delta"] = round(statistics.mean(deltas), 2) if deltas else 0.0
+    return diff
+
+
+def print_report(report: Dict[str, Any], diff: Optional[Dict[str, Any]]):
+    cassette = report["cassette"]
+    print(f"📊 {report['messages']} messages rejoués en {report['seconds']}s "
+          f"({report['messages_per_second']} msg/s, {report['workers']} worker(s))")
+    print(f"🗂️ Cassette : {cassette['hits']} réponses lues, {cassette['misses']} manquantes, "
+          f"{cassette['recorded']} enregistrées, {cassette['tokens']} tokens rejoués")
+    print(f"✅ Retenues : {report['retained']}")
+    for stage, values in report["stages"].items():
+        print(f"   {stage:<11} p50 {values['p50_ms']:>8} ms   p95 {values['p95_ms']:>8} ms   total {values['total_s']}s")
+    if diff is not None:
+        print(f"🔁 Comparaison au log : {diff['matched']} retrouvés, {diff['unmatched']} absents, "
+              f"{diff['same']} décisions identiques, {len(diff['changed'])} modifiées "
+              f"(pertinence {diff['mean_pertinence_delta']:+})")
+        for change in diff["changed"][:20]:
+            print(f"   ⚠️ {change['subject'][:60]} : {change['before']} → {change['after']}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Rejeu hors ligne d'une boîte mail enregistrée")
+    parser.add_argument("mailbox", help="Fichier mbox ou répertoire Maildir")
+    parser.add_argument("--cassette", default="replay_cassette.jsonl", help="Réponses IA enregistrées (JSONL)")
+    parser.add_argument("--record", action="store_true",
+                        help="Appeler l'API pour les réponses manquantes et les ajouter à la cassette")
+    parser.add_argument("--match", choices=[MATCH_BODY, MATCH_PROMPT], default=MATCH_BODY,
+                        help="Clé de cassette : texte de l'opportunité (défaut) ou prompt complet")
+    parser.add_argument("--config", default="agent_config.json", help="Configuration (critères, modèles)")
+    parser.add_argument("--workers", type=int, default=1, help="Processus de rejeu en parallèle")
+    parser.add_argument("--limit", type=int, help="Nombre maximal de messages")
+    parser.add_argument("--log", help="opportunities_log.json à comparer aux décisions rejouées")
+    parser.add_argument("-o", "--output", help="Rapport JSON détaillé")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.mailbox):
+        print(f"❌ Boîte mail introuvable : {args.mailbox}")
+        return 1
+
+    config = load_replay_config(args.config)
+    if args.record:
+        upstream_client(config)
+    report = run_replay(args.mailbox, args.cassette, config, workers=max(1, args.workers),
+                        match=args.match, record=args.record, limit=args.limit)
+    diff = diff_decisions(report["results"], args.log) if args.log and os.path.exists(args.log) else None
+    print_report(report, diff)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(dict(report, diff=diff), f, indent=2, ensure_ascii=False)
+        print(f"✅ Rapport écrit dans {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Planificateur de l'Agent IA Nocturne
+File de priorité de minuteries (heapq), un exécuteur par job, jamais deux exécutions simultanées d'un même job
+"""
+
+import time
+import heapq
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from utils.lazy import lazy_import
+
+futures = lazy_import("concurrent.futures")
+
+
+def parse_hhmm(value: str) -> tuple:
+    hours, minutes = value.split(":")
+    return int(hours), int(minutes)
+
+
+def next_daily(at: str, now: Optional[datetime] = None) -> float:
+    """Prochaine occurrence de l'heure HH:MM (timestamp)"""
+    now = now or datetime.now()
+    hours, minutes = parse_hhmm(at)
+    target = now.replace(hour=hours, minute=minutes, second=0, microsecond=0)
+    if target <= now:
+        target += timedelta(days=1)
+    return target.timestamp()
+
+
+def in_window(start: str, end: str, now: Optional[datetime] = None) -> bool:
+    """Heure courante dans la plage [start, end[ (qui peut passer minuit, ex. 22:00 → 07:00)"""
+    now = now or datetime.now()
+    current = (now.hour, now.minute)
+    start, end = parse_hhmm(start), parse_hhmm(end)
+    if start <= end:
+        return start <= current < end
+    return current >= start or current < end
+
+
+class AdaptiveInterval:
+    """Intervalle de relève calé sur le débit d'arrivée observé (moyenne mobile exponentielle)
+
+    Vise `target` emails par cycle, borné par le profil jour ou nuit."""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None, night_notifications: bool = False):
+        self.rate = None
+        self.configure(config or {}, night_notifications)
+
+    def configure(self, config: Dict[str, Any], night_notifications: bool = False):
+        self.base = config.get("interval_minutes", 5) * 60
+        self.day = (config.get("min_interval_minutes", 1) * 60, config.get("max_interval_minutes", 15) * 60)
+        night = config.get("night", {})
+        self.night = None
+        # Sans notifications de nuit, personne ne lit les alertes : relève espacée
+        if night and not night_notifications:
+            self.night = (night.get("start", "22:00"), night.get("end", "07:00"),
+                          night.get("min_interval_minutes", 10) * 60, night.get("max_interval_minutes", 30) * 60)
+        self.target = config.get("target_emails_per_cycle", 1)
+        self.alpha = config.get("smoothing", 0.3)
+
+    def observe(self, emails: int, elapsed: float):
+        """Emails trouvés par un cycle, `elapsed` secondes après le précédent"""
+        if elapsed <= 0:
+            return
+        rate = emails / elapsed
+        self.rate = rate if self.rate is None else self.alpha * rate + (1 - self.alpha) * self.rate
+
+    def bounds(self, now: Optional[datetime] = None) -> tuple:
+        if self.night and in_window(self.night[0], self.night[1], now):
+            return self.night[2], self.night[3]
+        return self.day
+
+    def next(self, now: Optional[datetime] = None) -> float:
+        low, high = self.bounds(now)
+        if self.rate is None:
+            interval = self.base
+        elif self.rate <= 0:
+            interval = high
+        else:
+            interval = self.target / self.rate
+        return max(low, min(high, interval))
+
+
+class Job:
+    """Tâche planifiée : `when()` donne le prochain horaire (timestamp) après chaque exécution"""
+
+    def __init__(self, name: str, fn: Callable[[], Any], when: Callable[[], float]):
+        self.name = name
+        self.fn = fn
+        self.when = when
+        self.next_run = 0.0
+        self.running = False
+        self.due_while_running = False
+        self.runs = 0
+        self.last_duration = None
+        self.executor = None
+
+
+class Scheduler:
+    """Boucle d'attente jusqu'à la prochaine échéance ; les jobs s'exécutent sur leur propre thread"""
+
+    def __init__(self):
+        self.jobs: Dict[str, Job] = {}
+        self._heap: List[tuple] = []
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = False
+
+    def _push(self, job: Job):
+        self._seq += 1
+        heapq.heappush(self._heap, (job.next_run, self._seq, job.name))
+
+    def add(self, name: str, fn: Callable[[], Any], when: Callable[[], float],
+            first_run: Optional[float] = None) -> Job:
+        job = Job(name, fn, when)
+        job.next_run = first_run if first_run is not None else when()
+        with self._lock:
+            self.jobs[name] = job
+            self._push(job)
+        self._wake.set()
+        return job
+
+    def every(self, name: str, seconds: Union[float, Callable[[], float]], fn: Callable[[], Any],
+              run_now: bool = False) -> Job:
+        """Job périodique ; l'intervalle (fixe ou recalculé) court à partir de la fin de l'exécution"""
+        interval = seconds if callable(seconds) else (lambda: seconds)
+        return self.add(name, fn, lambda: time.time() + interval(), time.time() if run_now else None)
+
+    def daily(self, name: str, at: str, fn: Callable[[], Any]) -> Job:
+        return self.add(name, fn, lambda: next_daily(at))
+
+    def trigger(self, name: str):
+        """Exécuter un job dès que possible (ou juste après l'exécution en cours)"""
+        with self._lock:
+            job = self.jobs[name]
+            job.next_run = time.time()
+            self._push(job)
+        self._wake.set()
+
+    def next_run(self, name: str) -> Optional[float]:
+        job = self.jobs.get(name)
+        return job.next_run if job else None
+
+    def _dispatch(self, job: Job):
+        if job.running:
+            # Pas de chevauchement : l'échéance est reportée à la fin de l'exécution en cours
+            job.due_while_running = True
+            return
+        job.running = True
+        if job.executor is None:
+            job.executor = futures.ThreadPoolExecutor(1, thread_name_prefix=f"job-{job.name}")
+        job.executor.submit(self._execute, job)
+
+    def _execute(self, job: Job):
+        start = time.monotonic()
+        try:
+            job.fn()
+        except Exception as e:
+            print(f"❌ Erreur du job {job.name} : {e}")
+        finally:
+            job.last_duration = time.monotonic() - start
+            job.runs += 1
+            with self._lock:
+                job.running = False
+                if not self._stopping:
+                    job.next_run = time.time() if job.due_while_running else job.when()
+                    job.due_while_running = False
+                    self._push(job)
+            self._wake.set()
+
+    def run(self):
+        """Boucle principale (thread appelant) jusqu'à stop()"""
+        while not self._stopping:
+            with self._lock:
+                now = time.time()
+                while self._heap and self._heap[0][0] <= now:
+                    next_run, _, name = heapq.heappop(self._heap)
+                    job = self.jobs.get(name)
+                    # Entrée périmée : le job a été reprogrammé depuis
+                    if job and next_run == job.next_run:
+                        self._dispatch(job)
+                delay = self._heap[0][0] - now if self._heap else None
+            # Réveil à l'échéance, à l'arrêt ou à l'ajout d'un job ; au plus 60 s (changement d'heure système)
+            self._wake.wait(min(delay, 60.0) if delay is not None else 60.0)
+            self._wake.clear()
+
+    def stop(self):
+        """Ne plus lancer de job et sortir de run() (appelable depuis un gestionnaire de signal)"""
+        self._stopping = True
+        self._wake.set()
+
+    def shutdown(self, wait: bool = True):
+        """Attendre la fin des jobs en cours et libérer leurs threads"""
+        self.stop()
+        for job in self.jobs.values():
+            if job.executor is not None:
+                job.executor.shutdown(wait=wait)
+
+    def status(self) -> Dict[str, Any]:
+        return {name: {"next_run": datetime.fromtimestamp(job.next_run).isoformat(timespec="seconds"),
+                       "running": job.running, "runs": job.runs,
+                       "last_duration": round(job.last_duration, 3) if job.last_duration is not None else None}
+                for name, job in self.jobs.items()}
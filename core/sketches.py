@@ -0,0 +1,454 @@
+#!/usr/bin/env python3
+"""
+Statistiques approximatives à base de sketches fusionnables
+Pour les tableaux de bord sur de longs historiques, un sketch est persisté par jour
+
+Erreurs (garanties documentées) :
+- Expéditeurs / domaines distincts (HyperLogLog, p=12) : erreur relative type 1,04/√4096 ≈ 1,6 %
+- Quantiles de pertinence (KLL, k=200) : erreur de rang normalisée de l'ordre de 1,65 %
+- Top expéditeurs / raisons (Space-Saving, 100 compteurs) : chaque compte est surestimé
+  d'au plus N/100 (N = nombre d'éléments vus), tout élément de fréquence > N/100 est présent
+"""
+
+import os
+import json
+import math
+import base64
+import random
+import time
+import hashlib
+import heapq
+import threading
+from functools import lru_cache
+from email.utils import parseaddr
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+from core.stats import iter_opportunities
+
+# Version du remplissage initial depuis le log (à incrémenter si le contenu des sketches change)
+BACKFILL_VERSION = 1
+
+
+def _hash64(value: str) -> int:
+    """Hash 64 bits stable entre processus (contrairement à hash())"""
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+@lru_cache(maxsize=None)
+def _high_bits(size: int) -> int:
+    """Entier dont chaque octet vaut 0x80"""
+    return int.from_bytes(b"\x80" * size, 'big')
+
+
+class HyperLogLog:
+    """Estimation du nombre d'éléments distincts"""
+
+    def __init__(self, p: int = 12):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(self.m)
+
+    def add(self, value: str):
+        h = _hash64(value)
+        index = h >> (64 - self.p)
+        rest = (h << self.p) & ((1 << 64) - 1)
+        rank = min(64 - self.p, 64 - rest.bit_length()) + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog"):
+        if other.p != self.p:
+            raise ValueError("HyperLogLog de précisions différentes")
+        # Maximum octet par octet sur de grands entiers (registres < 128) : (a | 0x80) - b garde
+        # le bit de poids fort des octets où a ≥ b, sans retenue d'un octet à l'autre
+        high = _high_bits(self.m)
+        a = int.from_bytes(self.registers, 'big')
+        b = int.from_bytes(other.registers, 'big')
+        keep = ((((a | high) - b) & high) >> 7) * 0xFF
+        self.registers = bytearray(((a & keep) | (b & ~keep)).to_bytes(self.m, 'big'))
+
+    def count(self) -> int:
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        # Correction petites cardinalités (linear counting)
+        if estimate <= 2.5 * self.m and zeros:
+            estimate = self.m * math.log(self.m / zeros)
+        return int(round(estimate))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"p": self.p, "registers": base64.b64encode(bytes(self.registers)).decode('ascii')}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "HyperLogLog":
+        hll = cls(data["p"])
+        hll.registers = bytearray(base64.b64decode(data["registers"]))
+        return hll
+
+
+class KLLSketch:
+    """Quantiles approximatifs (sketch KLL)"""
+
+    def __init__(self, k: int = 200, c: float = 2 / 3, seed: Optional[int] = None):
+        self.k = k
+        self.c = c
+        self.n = 0
+        self.compactors = [[]]
+        self._rng = random.Random(seed)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.compactors) - level - 1
+        return max(2, int(math.ceil(self.k * self.c ** depth)))
+
+    def _size(self) -> int:
+        return sum(len(compactor) for compactor in self.compactors)
+
+    def _max_size(self) -> int:
+        return sum(self._capacity(level) for level in range(len(self.compactors)))
+
+    def add(self, value: float):
+        self.compactors[0].append(value)
+        self.n += 1
+        if self._size() >= self._max_size():
+            self._compress()
+
+    def _compress(self):
+        while self._size() >= self._max_size():
+            for level in range(len(self.compactors)):
+                if len(self.compactors[level]) >= self._capacity(level):
+                    if level + 1 == len(self.compactors):
+                        self.compactors.append([])
+                    items = sorted(self.compactors[level])
+                    leftover = [items.pop()] if len(items) % 2 else []
+                    offset = self._rng.random() < 0.5
+                    self.compactors[level + 1].extend(items[offset::2])
+                    self.compactors[level] = leftover
+                    break
+
+    def merge(self, other: "KLLSketch"):
+        while len(self.compactors) < len(other.compactors):
+            self.compactors.append([])
+        for level, items in enumerate(other.compactors):
+            self.compactors[level].extend(items)
+        self.n += other.n
+        self._compress()
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Valeur au quantile q (0 ≤ q ≤ 1)"""
+        weighted = sorted((value, 1 << level)
+                          for level, items in enumerate(self.compactors) for value in items)
+        if not weighted:
+            return None
+        total = sum(weight for _, weight in weighted)
+        target = q * total
+        cumulative = 0
+        for value, weight in weighted:
+            cumulative += weight
+            if cumulative >= target:
+                return value
+        return weighted[-1][0]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"k": self.k, "n": self.n, "compactors": self.compactors}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "KLLSketch":
+        sketch = cls(data["k"])
+        sketch.n = data["n"]
+        sketch.compactors = data["compactors"] or [[]]
+        return sketch
+
+
+class SpaceSaving:
+    """Éléments les plus fréquents avec un nombre fixe de compteurs"""
+
+    def __init__(self, capacity: int = 100):
+        self.capacity = capacity
+        self.n = 0
+        self.counters = {}  # élément -> [compte, erreur]
+
+    def add(self, item: str, count: int = 1):
+        self.n += count
+        counter = self.counters.get(item)
+        if counter is not None:
+            counter[0] += count
+        elif len(self.counters) < self.capacity:
+            self.counters[item] = [count, 0]
+        else:
+            # Remplacer l'élément le moins fréquent en héritant de son compte
+            victim = min(self.counters, key=lambda key: self.counters[key][0])
+            minimum = self.counters.pop(victim)[0]
+            self.counters[item] = [minimum + count, minimum]
+
+    def _floor(self) -> int:
+        if len(self.counters) < self.capacity:
+            return 0
+        return min(counter[0] for counter in self.counters.values())
+
+    def merge(self, other: "SpaceSaving"):
+        floor_self, floor_other = self._floor(), other._floor()
+        missing = (floor_other, floor_other)
+        merged = {}
+        for item, (count, error) in self.counters.items():
+            count_b, error_b = other.counters.get(item, missing)
+            merged[item] = [count + count_b, error + error_b]
+        for item, (count, error) in other.counters.items():
+            if item not in merged:
+                merged[item] = [count + floor_self, error + floor_self]
+        if len(merged) > self.capacity:
+            merged = dict(heapq.nlargest(self.capacity, merged.items(), key=lambda kv: kv[1][0]))
+        self.counters = merged
+        self.n += other.n
+
+    def top(self, limit: int = 10) -> List[Tuple[str, int]]:
+        ranked = sorted(self.counters.items(), key=lambda kv: kv[1][0], reverse=True)
+        return [(item, counter[0]) for item, counter in ranked[:limit]]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"capacity": self.capacity, "n": self.n, "counters": self.counters}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SpaceSaving":
+        summary = cls(data["capacity"])
+        summary.n = data["n"]
+        summary.counters = data["counters"]
+        return summary
+
+
+def sender_domain(sender: str) -> str:
+    """Domaine de l'adresse d'un expéditeur"""
+    address = parseaddr(sender or "")[1]
+    return address.rsplit('@', 1)[-1].lower() if '@' in address else "inconnu"
+
+
+class DaySketch:
+    """Ensemble de sketches résumant une journée d'opportunités"""
+
+    def __init__(self):
+        self.total = 0
+        self.accepted = 0
+        self.senders = HyperLogLog()
+        self.domains = HyperLogLog()
+        self.pertinence = KLLSketch()
+        self.top_senders = SpaceSaving()
+        self.top_reasons = SpaceSaving()
+
+    def add(self, entry: Dict[str, Any]):
+        sender = entry.get("sender") or "Inconnu"
+        self.total += 1
+        self.accepted += int("✅" in entry.get("decision", ""))
+        self.senders.add(sender)
+        self.domains.add(sender_domain(sender))
+        pertinence = entry.get("pertinence")
+        if isinstance(pertinence, (int, float)):
+            self.pertinence.add(pertinence)
+        self.top_senders.add(sender)
+        for reason in entry.get("raisons", []):
+            self.top_reasons.add(reason)
+
+    def merge(self, other: "DaySketch"):
+        self.total += other.total
+        self.accepted += other.accepted
+        self.senders.merge(other.senders)
+        self.domains.merge(other.domains)
+        self.pertinence.merge(other.pertinence)
+        self.top_senders.merge(other.top_senders)
+        self.top_reasons.merge(other.top_reasons)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "total": self.total,
+            "accepted": self.accepted,
+            "senders": self.senders.to_dict(),
+            "domains": self.domains.to_dict(),
+            "pertinence": self.pertinence.to_dict(),
+            "top_senders": self.top_senders.to_dict(),
+            "top_reasons": self.top_reasons.to_dict()
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "DaySketch":
+        sketch = cls()
+        sketch.total = data["total"]
+        sketch.accepted = data["accepted"]
+        sketch.senders = HyperLogLog.from_dict(data["senders"])
+        sketch.domains = HyperLogLog.from_dict(data["domains"])
+        sketch.pertinence = KLLSketch.from_dict(data["pertinence"])
+        sketch.top_senders = SpaceSaving.from_dict(data["top_senders"])
+        sketch.top_reasons = SpaceSaving.from_dict(data["top_reasons"])
+        return sketch
+
+    def summary(self) -> Dict[str, Any]:
+        """Statistiques approximatives avec leurs bornes d'erreur"""
+        quantiles = {f"p{int(q * 100)}": self.pertinence.quantile(q) for q in (0.1, 0.25, 0.5, 0.75, 0.9, 0.99)}
+        return {
+            "approximate": True,
+            "total_opportunities": self.total,
+            "accepted": self.accepted,
+            "taux_retention": round(self.accepted / self.total * 100, 1) if self.total else 0,
+            "distinct_senders": self.senders.count(),
+            "distinct_domains": self.domains.count(),
+            "pertinence_quantiles": quantiles,
+            "top_senders": dict(self.top_senders.top(10)),
+            "top_keywords": dict(self.top_reasons.top(10)),
+            "error_bounds": {
+                "distinct_relative_error": round(1.04 / math.sqrt(self.senders.m), 4),
+                "quantile_rank_error": 0.0165,
+                "top_senders_max_overcount": self.top_senders.n // self.top_senders.capacity,
+                "top_keywords_max_overcount": self.top_reasons.n // self.top_reasons.capacity
+            }
+        }
+
+
+class SketchStore:
+    """Sketches persistés par jour (sketches/AAAA-MM-JJ.json), fusionnés à la demande"""
+
+    # Écritures plus récentes que ce délai : la date du répertoire ne suffit pas à dater le cache
+    RACY_NS = 2_000_000_000
+
+    def __init__(self, directory: str = "sketches"):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._cache = {}  # jour -> (mtime_ns, DaySketch)
+        self._months = {}  # mois -> (mtimes des jours, DaySketch fusionné)
+        self._queries = {}  # (début, fin) -> résultat, pour la génération courante du répertoire
+        self._generation = None
+
+    def _path(self, day: str) -> str:
+        return os.path.join(self.directory, f"{day}.json")
+
+    def _marker(self) -> str:
+        return os.path.join(self.directory, ".backfill")
+
+    def days(self) -> List[str]:
+        try:
+            return sorted(name[:-5] for name in os.listdir(self.directory) if name.endswith(".json"))
+        except OSError:
+            return []
+
+    def load_day(self, day: str) -> Optional[DaySketch]:
+        path = self._path(day)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        cached = self._cache.get(day)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        with open(path, 'r', encoding='utf-8') as f:
+            sketch = DaySketch.from_dict(json.load(f))
+        self._cache[day] = (mtime, sketch)
+        return sketch
+
+    def save_day(self, day: str, sketch: DaySketch):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(day)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(sketch.to_dict(), f, separators=(",", ":"), ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self._cache[day] = (os.stat(path).st_mtime_ns, sketch)
+
+    def add(self, entry: Dict[str, Any]):
+        """Mettre à jour le sketch du jour de l'opportunité"""
+        day = (entry.get("timestamp") or "")[:10]
+        if len(day) != 10:
+            return
+        with self._lock:
+            sketch = self.load_day(day) or DaySketch()
+            sketch.add(entry)
+            self.save_day(day, sketch)
+
+    def rebuild(self, entries: Iterable[Dict[str, Any]]):
+        """Recalculer tous les sketches depuis l'historique"""
+        sketches = {}
+        for entry in entries:
+            day = (entry.get("timestamp") or "")[:10]
+            if len(day) == 10:
+                sketches.setdefault(day, DaySketch()).add(entry)
+        with self._lock:
+            for day, sketch in sketches.items():
+                self.save_day(day, sketch)
+
+    def backfilled(self) -> bool:
+        try:
+            with open(self._marker(), 'r', encoding='utf-8') as f:
+                return f.read().strip() == str(BACKFILL_VERSION)
+        except OSError:
+            return False
+
+    def backfill(self, log_file: str):
+        """Recalculer les sketches depuis le log puis poser le marqueur de version"""
+        self.rebuild(iter_opportunities(log_file) if os.path.exists(log_file) else [])
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self._marker() + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(str(BACKFILL_VERSION))
+        os.replace(tmp_path, self._marker())
+
+    def _month(self, month: str, days: List[str]) -> DaySketch:
+        """Sketch fusionné d'un mois, recalculé seulement si l'un de ses jours a changé"""
+        sketches = [(day, self.load_day(day)) for day in days]
+        mtimes = tuple(self._cache[day][0] for day, sketch in sketches if sketch)
+        cached = self._months.get(month)
+        if cached and cached[0] == mtimes:
+            return cached[1]
+        merged = DaySketch()
+        for _, sketch in sketches:
+            if sketch:
+                merged.merge(sketch)
+        self._months[month] = (mtimes, merged)
+        return merged
+
+    def _generation_ns(self) -> Optional[int]:
+        """Date du répertoire (chaque sauvegarde y renomme un fichier), None si trop récente pour s'y fier"""
+        try:
+            mtime = os.stat(self.directory).st_mtime_ns
+        except OSError:
+            return None
+        return mtime if time.time_ns() - mtime > self.RACY_NS else None
+
+    def query(self, start: Optional[str] = None, end: Optional[str] = None) -> Dict[str, Any]:
+        """Fusionner les sketches des jours compris dans [start, end]"""
+        start, end = (start or "")[:10], (end or "")[:10]
+        generation = self._generation_ns()
+        if generation is not None and generation == self._generation and (start, end) in self._queries:
+            return self._queries[(start, end)]
+
+        days = [day for day in self.days() if (not start or day >= start) and (not end or day <= end)]
+        months = {}
+        for day in days:
+            months.setdefault(day[:7], []).append(day)
+
+        # Mois entièrement couverts : sketch mensuel pré-fusionné, sinon jour par jour
+        merged = DaySketch()
+        for month, month_days in months.items():
+            if (not start or start <= month + "-01") and (not end or end >= month + "-31"):
+                merged.merge(self._month(month, month_days))
+                continue
+            for day in month_days:
+                sketch = self.load_day(day)
+                if sketch:
+                    merged.merge(sketch)
+        result = merged.summary()
+        result["days"] = len(days)
+
+        if generation != self._generation:
+            self._queries = {}
+            self._generation = generation
+        if generation is not None:
+            self._queries[(start, end)] = result
+        return result
+
+
+def open_sketches(directory: str = "sketches", log_file: str = "opportunities_log.json") -> SketchStore:
+    """Ouvrir les sketches, en y reportant une seule fois l'historique du log existant"""
+    store = SketchStore(directory)
+    if store.backfilled():
+        return store
+    try:
+        store.backfill(log_file)
+        print(f"📐 Sketches recalculés depuis le log ({len(store.days())} jour(s))")
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Impossible de recalculer les sketches : {e}")
+    return store
@@ -5,10 +5,16 @@ Affiche les performances et analyses des opportunités
 """
 
 import json
+import csv
 import os
+import sys
+import argparse
+import time
+import heapq
 from datetime import datetime, timedelta
 from collections import Counter, defaultdict
-from typing import Dict, List, Any
+from itertools import chain, repeat
+from typing import Dict, List, Any, Iterable, Iterator, Optional
 import statistics
 import email.header
 
@@ -55,74 +61,198 @@ def decode_email_subject(subject: str) -> str:
         # En cas d'erreur, retourner le sujet original
         return subject
 
-def calculate_stats(opportunities: List[Dict[str, Any]]) -> Dict[str, Any]:
-    """Calculer les statistiques"""
-    if not opportunities:
-        return {}
-    
-    stats = {
-        "total_opportunities": len(opportunities),
-        "period": {},
-        "decisions": {},
-        "pertinence": {},
-        "senders": {},
-        "actions": {},
-        "daily_activity": {},
-        "top_keywords": {},
-        "performance": {}
-    }
+class StatsAccumulator:
+    """Accumulateurs en une passe : mémoire bornée par le nombre de valeurs distinctes"""
     
-    # Période d'activité
-    timestamps = [parse_timestamp(opp["timestamp"]) for opp in opportunities]
-    stats["period"]["debut"] = min(timestamps).strftime("%d/%m/%Y %H:%M")
-    stats["period"]["fin"] = max(timestamps).strftime("%d/%m/%Y %H:%M")
-    stats["period"]["duree"] = (max(timestamps) - min(timestamps)).days
-    
-    # Décisions
-    decisions = [opp.get("decision", "Non défini") for opp in opportunities]
-    stats["decisions"] = dict(Counter(decisions))
-    
-    # Pertinence
-    pertinences = [opp.get("pertinence", 0) for opp in opportunities]
-    if pertinences:
-        stats["pertinence"]["moyenne"] = round(statistics.mean(pertinences), 2)
-        stats["pertinence"]["mediane"] = statistics.median(pertinences)
-        stats["pertinence"]["min"] = min(pertinences)
-        stats["pertinence"]["max"] = max(pertinences)
-        stats["pertinence"]["distribution"] = dict(Counter(pertinences))
-    
-    # Expéditeurs
-    senders = [opp.get("sender", "Inconnu") for opp in opportunities]
-    stats["senders"] = dict(Counter(senders).most_common(10))
-    
-    # Actions
-    actions = [opp.get("action", "Aucune") for opp in opportunities]
-    stats["actions"] = dict(Counter(actions))
-    
-    # Activité quotidienne
-    daily_activity = defaultdict(int)
-    for opp in opportunities:
-        date = parse_timestamp(opp["timestamp"]).strftime("%d/%m/%Y")
-        daily_activity[date] += 1
-    stats["daily_activity"] = dict(daily_activity)
+    def __init__(self, recent_limit: int = 10):
+        self.total = 0
+        self.first = None
+        self.last = None
+        self.decisions = Counter()
+        self.pertinences = Counter()
+        self.senders = Counter()
+        self.actions = Counter()
+        self.daily_activity = defaultdict(int)
+        self.reasons = Counter()
+        self.missions_retenues = 0
+        self.reponses_envoyees = 0
+        
+        # Opportunités les plus récentes (tas de taille fixe)
+        self.recent_limit = recent_limit
+        self._recent = []
     
-    # Mots-clés dans les raisons
-    all_reasons = []
-    for opp in opportunities:
-        reasons = opp.get("raisons", [])
-        all_reasons.extend(reasons)
-    stats["top_keywords"] = dict(Counter(all_reasons).most_common(10))
+    def add(self, opp: Dict[str, Any]):
+        """Ajouter une opportunité"""
+        timestamp = parse_timestamp(opp["timestamp"])
+        if self.first is None or timestamp < self.first:
+            self.first = timestamp
+        if self.last is None or timestamp > self.last:
+            self.last = timestamp
+        self.daily_activity[timestamp.strftime("%d/%m/%Y")] += 1
+        
+        self.decisions[opp.get("decision", "Non défini")] += 1
+        self.pertinences[opp.get("pertinence", 0)] += 1
+        self.senders[opp.get("sender", "Inconnu")] += 1
+        self.actions[opp.get("action", "Aucune")] += 1
+        self.reasons.update(opp.get("raisons", []))
+        
+        if "✅ Mission retenue" in opp.get("decision", ""):
+            self.missions_retenues += 1
+        if "Réponse envoyée" in opp.get("action", ""):
+            self.reponses_envoyees += 1
+        
+        if self.recent_limit:
+            # À timestamp égal, l'entrée la plus ancienne du log reste devant (tri stable)
+            item = (timestamp, -self.total, opp)
+            if len(self._recent) < self.recent_limit:
+                heapq.heappush(self._recent, item)
+            elif item[:2] > self._recent[0][:2]:
+                heapq.heapreplace(self._recent, item)
+        
+        self.total += 1
     
-    # Performance
-    missions_retennes = sum(1 for opp in opportunities if "✅ Mission retenue" in opp.get("decision", ""))
-    reponses_envoyees = sum(1 for opp in opportunities if "Réponse envoyée" in opp.get("action", ""))
+    def add_all(self, opportunities: Iterable[Dict[str, Any]]) -> "StatsAccumulator":
+        for opp in opportunities:
+            self.add(opp)
+        return self
     
-    stats["performance"]["missions_retennes"] = missions_retennes
-    stats["performance"]["reponses_envoyees"] = reponses_envoyees
-    stats["performance"]["taux_retention"] = round((missions_retennes / len(opportunities)) * 100, 1) if opportunities else 0
-    stats["performance"]["taux_reponse"] = round((reponses_envoyees / len(opportunities)) * 100, 1) if opportunities else 0
+    def recent(self) -> List[Dict[str, Any]]:
+        """Opportunités récentes, de la plus récente à la plus ancienne"""
+        return [item[2] for item in sorted(self._recent, key=lambda item: item[:2], reverse=True)]
     
-    return stats
+    def _median(self):
+        """Médiane exacte calculée depuis la distribution des pertinences"""
+        values = sorted(self.pertinences)
+        n = self.total
+        
+        def nth(index):
+            seen = 0
+            for value in values:
+                seen += self.pertinences[value]
+                if index < seen:
+                    return value
+        
+        if n % 2 == 1:
+            return nth(n // 2)
+        return (nth(n // 2 - 1) + nth(n // 2)) / 2
+    
+    def result(self) -> Dict[str, Any]:
+        """Statistiques au même format que calculate_stats"""
+        if not self.total:
+            return {}
+        
+        stats = {
+            "total_opportunities": self.total,
+            "period": {},
+            "decisions": {},
+            "pertinence": {},
+            "senders": {},
+            "actions": {},
+            "daily_activity": {},
+            "top_keywords": {},
+            "performance": {}
+        }
+        
+        # Période d'activité
+        stats["period"]["debut"] = self.first.strftime("%d/%m/%Y %H:%M")
+        stats["period"]["fin"] = self.last.strftime("%d/%m/%Y %H:%M")
+        stats["period"]["duree"] = (self.last - self.first).days
+        
+        stats["decisions"] = dict(self.decisions)
+        
+        # Pertinence (moyenne exacte sans matérialiser la liste)
+        expanded = chain.from_iterable(repeat(value, count) for value, count in self.pertinences.items())
+        stats["pertinence"]["moyenne"] = round(statistics.mean(expanded), 2)
+        stats["pertinence"]["mediane"] = self._median()
+        stats["pertinence"]["min"] = min(self.pertinences)
+        stats["pertinence"]["max"] = max(self.pertinences)
+        stats["pertinence"]["distribution"] = dict(self.pertinences)
+        
+        stats["senders"] = dict(self.senders.most_common(10))
+        stats["actions"] = dict(self.actions)
+        stats["daily_activity"] = dict(self.daily_activity)
+        stats["top_keywords"] = dict(self.reasons.most_common(10))
+        
+        # Performance
+        stats["performance"]["missions_retennes"] = self.missions_retenues
+        stats["performance"]["reponses_envoyees"] = self.reponses_envoyees
+        stats["performance"]["taux_retention"] = round((self.missions_retenues / self.total) * 100, 1)
+        stats["performance"]["taux_reponse"] = round((self.reponses_envoyees / self.total) * 100, 1)
+        
+        return stats
+
+def calculate_stats(opportunities: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Calculer les statistiques"""
+    return StatsAccumulator(recent_limit=0).add_all(opportunities).result()
+
+def iter_opportunities(log_file: str = "opportunities_log.json", chunk_size: int = 1 << 20) -> Iterator[Dict[str, Any]]:
+    """Lire les opportunités une par une depuis un tableau JSON ou un fichier JSONL"""
+    decoder = json.JSONDecoder()
+    with open(log_file, 'r', encoding='utf-8') as f:
+        buffer = f.read(chunk_size)
+        stripped = buffer.lstrip()
+        
+        # JSONL : une opportunité par ligne
+        if not stripped.startswith('['):
+            pending = buffer
+            while True:
+                lines = pending.split('\n')
+                pending = lines.pop()
+                for line in lines:
+                    if line.strip():
+                        yield json.loads(line)
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                pending += chunk
+            if pending.strip():
+                yield json.loads(pending)
+            return
+        
+        # Tableau JSON : décodage incrémental élément par élément
+        buffer = stripped[1:]
+        pos = 0
+        eof = False
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos < len(buffer) and buffer[pos] == ']':
+                return
+            try:
+                if pos >= len(buffer):
+                    raise ValueError("buffer vide")
+                item, end = decoder.raw_decode(buffer, pos)
+            except ValueError:
+                if eof:
+                    raise ValueError(f"JSON invalide ou tronqué dans {log_file}")
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+            # Un élément terminé au bord du buffer peut être un nombre incomplet
+            if end == len(buffer) and not eof:
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+            yield item
+            pos = end
+
+def stream_stats(log_file: str = "opportunities_log.json", recent_limit: int = 10):
+    """Calculer les statistiques en mémoire bornée, retourne (stats, récentes, débit)"""
+    accumulator = StatsAccumulator(recent_limit=recent_limit)
+    start = time.perf_counter()
+    for opp in iter_opportunities(log_file):
+        accumulator.add(opp)
+    elapsed = time.perf_counter() - start
+    throughput = {
+        "entries": accumulator.total,
+        "seconds": round(elapsed, 3),
+        "entries_per_second": round(accumulator.total / elapsed) if elapsed > 0 else accumulator.total
+    }
+    return accumulator.result(), accumulator.recent(), throughput
 
 def display_overview(stats: Dict[str, Any]):
     """Afficher le résumé général"""
@@ -252,23 +382,33 @@ def show_menu():
     print("0. ❌ Quitter")
     print()
 
-def main():
-    """Fonction principale"""
+def interactive_menu(log_file: Optional[str] = None):
+    """Menu interactif (log_file : calcul en streaming sur ce fichier)"""
     print("🤖 Statistiques de l'Agent IA Nocturne")
     print("=" * 50)
     print()
     
-    # Charger les données
-    opportunities = load_opportunities()
+    # Mode streaming : python3 core/stats.py --stream [fichier.json|fichier.jsonl]
+    if log_file:
+        if not os.path.exists(log_file):
+            print(f"❌ Fichier introuvable : {log_file}")
+            return
+        stats, opportunities, throughput = stream_stats(log_file)
+        print(f"⚡ {throughput['entries']} entrées lues en {throughput['seconds']}s "
+              f"({throughput['entries_per_second']} entrées/s)")
+        print()
+    else:
+        # Charger les données
+        opportunities = load_opportunities()
+        
+        # Calculer les statistiques
+        stats = calculate_stats(opportunities)
     
-    if not opportunities:
+    if not stats:
         print("❌ Aucune donnée disponible. L'agent n'a pas encore traité d'emails.")
         print("💡 Lancez l'agent avec : python3 agent-nocturne-python.py --force")
         return
     
-    # Calculer les statistiques
-    stats = calculate_stats(opportunities)
-    
     while True:
         show_menu()
         choice = input("Votre choix (0-8): ").strip()
@@ -306,5 +446,238 @@ def main():
             input("\nAppuyez sur Entrée pour continuer...")
             print("\n" + "="*60)
 
+# Sections disponibles en mode non interactif : clés de stats et fonction d'affichage
+SECTIONS = {
+    "overview": (("total_opportunities", "period", "performance"), display_overview),
+    "decisions": (("decisions",), display_decisions),
+    "pertinence": (("pertinence",), display_pertinence),
+    "senders": (("senders",), display_senders),
+    "daily": (("daily_activity",), display_daily_activity),
+    "keywords": (("top_keywords",), display_keywords),
+}
+
+EXPORT_COLUMNS = ["timestamp", "email_id", "subject", "sender", "pertinence",
+                  "decision", "action", "raisons", "llm_latency_ms"]
+
+def local_datetime(value: str) -> datetime:
+    """Date ou timestamp ISO ('T' ou espace, 'Z' ou décalage) -> datetime naïf à l'heure locale"""
+    parsed = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    return parsed.astimezone().replace(tzinfo=None) if parsed.tzinfo else parsed
+
+def period_bound(value: str, end: bool = False) -> datetime:
+    """Borne de --since/--until ; une date seule couvre toute la journée"""
+    try:
+        parsed = local_datetime(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"date invalide : {value!r} (attendu AAAA-MM-JJ ou ISO 8601)")
+    if end and len(value.strip()) == 10:
+        parsed = datetime.combine(parsed.date(), datetime.max.time())
+    return parsed
+
+def filter_period(opportunities: Iterable[Dict[str, Any]], since: Optional[datetime] = None,
+                  until: Optional[datetime] = None) -> Iterator[Dict[str, Any]]:
+    """Filtrer sur [since, until] (bornes incluses, timestamps illisibles exclus dès qu'une borne est donnée)"""
+    for opp in opportunities:
+        if since or until:
+            try:
+                timestamp = local_datetime(opp["timestamp"])
+            except (KeyError, TypeError, AttributeError, ValueError):
+                continue
+            if since and timestamp < since:
+                continue
+            if until and timestamp > until:
+                continue
+        yield opp
+
+def select_sections(stats: Dict[str, Any], sections: List[str]) -> Dict[str, Any]:
+    """Ne garder que les clés des sections demandées"""
+    selected = {}
+    for section in sections:
+        for key in SECTIONS[section][0]:
+            if key in stats:
+                selected[key] = stats[key]
+    return selected
+
+def write_report(stats: Dict[str, Any], sections: List[str], output_format: str, out):
+    """Écrire un rapport de statistiques (text, json ou csv)"""
+    if output_format == "json":
+        json.dump(select_sections(stats, sections), out, indent=2, ensure_ascii=False)
+        out.write("\n")
+    elif output_format == "csv":
+        writer = csv.writer(out)
+        writer.writerow(["section", "cle", "valeur"])
+        for section in sections:
+            for key in SECTIONS[section][0]:
+                value = stats.get(key, {})
+                if isinstance(value, dict):
+                    for sub_key, sub_value in value.items():
+                        if isinstance(sub_value, dict):
+                            sub_value = json.dumps(sub_value, ensure_ascii=False)
+                        writer.writerow([section, f"{key}.{sub_key}", sub_value])
+                else:
+                    writer.writerow([section, key, value])
+    else:
+        for section in sections:
+            SECTIONS[section][1](stats)
+
+def export_row(opp: Dict[str, Any]) -> Dict[str, Any]:
+    """Ligne d'export à colonnes fixes"""
+    row = {column: opp.get(column) for column in EXPORT_COLUMNS}
+    row["subject"] = decode_email_subject(row["subject"]) if row["subject"] else row["subject"]
+    return row
+
+def export_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """Timestamp ISO -> datetime naïf (None si absent ou illisible, jamais l'heure courante)"""
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None)
+    except (AttributeError, ValueError):
+        return None
+
+def chunked(iterable: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Découper un itérable en listes de taille fixe"""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def export_json(rows: Iterable[Dict[str, Any]], out, chunk_size: int):
+    """Tableau JSON écrit par blocs"""
+    out.write("[")
+    first = True
+    for chunk in chunked(rows, chunk_size):
+        parts = [json.dumps(row, ensure_ascii=False) for row in chunk]
+        out.write(("" if first else ",") + "\n" + ",\n".join(parts))
+        first = False
+    out.write("\n]\n")
+
+def export_csv(rows: Iterable[Dict[str, Any]], out, chunk_size: int):
+    """CSV écrit par blocs (raisons séparées par ' | ')"""
+    writer = csv.DictWriter(out, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+    for chunk in chunked(rows, chunk_size):
+        for row in chunk:
+            row["raisons"] = " | ".join(row["raisons"] or [])
+        writer.writerows(chunk)
+
+def export_parquet(rows: Iterable[Dict[str, Any]], output: str, chunk_size: int):
+    """Parquet colonnes typées, un row group par bloc (lecture vectorisée pandas/NumPy)"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit("❌ pyarrow est requis pour --format parquet (pip install pyarrow)")
+    
+    schema = pa.schema([
+        ("timestamp", pa.timestamp("us")),
+        ("email_id", pa.string()),
+        ("subject", pa.string()),
+        ("sender", pa.string()),
+        ("pertinence", pa.float64()),
+        ("decision", pa.string()),
+        ("action", pa.string()),
+        ("raisons", pa.list_(pa.string())),
+        ("llm_latency_ms", pa.float64()),
+    ])
+    
+    with pq.ParquetWriter(output, schema, compression="zstd") as writer:
+        for chunk in chunked(rows, chunk_size):
+            columns = {column: [row[column] for row in chunk] for column in EXPORT_COLUMNS}
+            columns["timestamp"] = [export_timestamp(value) for value in columns["timestamp"]]
+            columns["pertinence"] = [value if isinstance(value, (int, float)) else None
+                                     for value in columns["pertinence"]]
+            for column in ("email_id", "subject", "sender", "decision", "action"):
+                columns[column] = [None if value is None else str(value) for value in columns[column]]
+            writer.write_table(pa.table(columns, schema=schema))
+
+def build_parser() -> argparse.ArgumentParser:
+    """Arguments de la ligne de commande"""
+    parser = argparse.ArgumentParser(description="Statistiques de l'Agent IA Nocturne")
+    parser.add_argument("--stream", nargs="?", const="opportunities_log.json", metavar="FICHIER",
+                        help="Menu interactif calculé en streaming sur ce fichier")
+    subparsers = parser.add_subparsers(dest="command")
+    
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--file", default="opportunities_log.json", help="Log JSON ou JSONL à lire")
+    common.add_argument("--since", type=period_bound, help="Date de début incluse (AAAA-MM-JJ ou ISO)")
+    common.add_argument("--until", type=lambda value: period_bound(value, end=True),
+                        help="Date de fin incluse (AAAA-MM-JJ ou ISO)")
+    common.add_argument("--output", "-o", help="Fichier de sortie (défaut : sortie standard)")
+    
+    report = subparsers.add_parser("report", parents=[common], help="Rapport de statistiques")
+    report.add_argument("--format", choices=["text", "json", "csv"], default="text")
+    report.add_argument("--sections", default=",".join(SECTIONS),
+                        help=f"Sections séparées par des virgules parmi : {', '.join(SECTIONS)}")
+    
+    export = subparsers.add_parser("export", parents=[common], help="Export des opportunités")
+    export.add_argument("--format", choices=["json", "csv", "parquet"], default="json")
+    export.add_argument("--chunk-size", type=int, default=10000, help="Entrées écrites par bloc")
+    
+    return parser
+
+def run_command(args) -> int:
+    """Exécuter une sous-commande non interactive"""
+    if not os.path.exists(args.file):
+        print(f"❌ Fichier introuvable : {args.file}", file=sys.stderr)
+        return 1
+    
+    if args.since and args.until and args.since > args.until:
+        print("❌ --since est postérieur à --until", file=sys.stderr)
+        return 2
+    
+    opportunities = filter_period(iter_opportunities(args.file), args.since, args.until)
+    start = time.perf_counter()
+    
+    if args.command == "report":
+        sections = [section.strip() for section in args.sections.split(",") if section.strip()]
+        unknown = [section for section in sections if section not in SECTIONS]
+        if unknown:
+            print(f"❌ Sections inconnues : {', '.join(unknown)}", file=sys.stderr)
+            return 2
+        accumulator = StatsAccumulator(recent_limit=0).add_all(opportunities)
+        elapsed = time.perf_counter() - start
+        rate = round(accumulator.total / elapsed) if elapsed > 0 else accumulator.total
+        print(f"⚡ {accumulator.total} entrées agrégées en {elapsed:.2f}s ({rate} entrées/s)", file=sys.stderr)
+        out = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+        try:
+            write_report(accumulator.result(), sections, args.format, out)
+        finally:
+            if args.output:
+                out.close()
+        return 0
+    
+    rows = (export_row(opp) for opp in opportunities)
+    if args.format == "parquet":
+        if not args.output:
+            print("❌ --output est requis pour le format parquet", file=sys.stderr)
+            return 2
+        export_parquet(rows, args.output, args.chunk_size)
+    else:
+        out = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+        try:
+            if args.format == "csv":
+                export_csv(rows, out, args.chunk_size)
+            else:
+                export_json(rows, out, args.chunk_size)
+        finally:
+            if args.output:
+                out.close()
+    
+    if args.output:
+        print(f"✅ Export {args.format} écrit dans {args.output} en {time.perf_counter() - start:.2f}s",
+              file=sys.stderr)
+    return 0
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Fonction principale"""
+    args = build_parser().parse_args(argv)
+    if args.command:
+        return run_command(args)
+    interactive_menu(args.stream)
+    return 0
+
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    sys.exit(main())
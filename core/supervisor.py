@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""
+Superviseur de l'Agent IA Nocturne
+Lance l'agent, le relance en cas de crash et expose son état via un socket de contrôle
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import argparse
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, Callable, Optional
+
+from utils.lazy import lazy_import
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou, la vivacité repose sur le pid seul
+    fcntl = None
+
+# Importé au lancement de l'agent seulement (le serveur web importe ce module à chaque démarrage)
+subprocess = lazy_import("subprocess")
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+RUN_DIR = "run"
+PIDFILE_NAME = "agent.pid"
+LOCKFILE_NAME = "agent.lock"
+SOCKET_NAME = "agent.sock"
+SOCKET_ENV = "AGENT_CONTROL_SOCKET"
+
+
+def run_dir(workdir: str) -> Path:
+    """Répertoire contenant le pidfile et le socket de contrôle"""
+    return Path(workdir) / RUN_DIR
+
+
+def pidfile_path(workdir: str) -> Path:
+    return run_dir(workdir) / PIDFILE_NAME
+
+
+def socket_path(workdir: str) -> Path:
+    return run_dir(workdir) / SOCKET_NAME
+
+
+def lockfile_path(workdir: str) -> Path:
+    return run_dir(workdir) / LOCKFILE_NAME
+
+
+def pid_alive(pid: Optional[int]) -> bool:
+    """Vérifier en O(1) qu'un processus existe"""
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def read_pidfile(workdir: str) -> Optional[Dict[str, Any]]:
+    """Lire le pidfile du superviseur"""
+    try:
+        with open(pidfile_path(workdir), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_pidfile(workdir: str, info: Dict[str, Any]):
+    """Écrire le pidfile de manière atomique"""
+    path = pidfile_path(workdir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(info, f)
+    os.replace(tmp_path, path)
+
+
+def supervisor_running(workdir: str) -> bool:
+    """Le superviseur verrouille agent.lock tant qu'il tourne
+
+    Un pidfile laissé par un SIGKILL ou un redémarrage ne compte pas, même si son pid a été réutilisé."""
+    if fcntl is None:
+        info = read_pidfile(workdir)
+        return bool(info) and pid_alive(info.get("supervisor_pid"))
+    try:
+        lock_file = open(lockfile_path(workdir), 'rb')
+    except OSError:
+        return False
+    with lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_SH | fcntl.LOCK_NB)
+        except OSError:
+            return True
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+    return False
+
+
+def agent_status(workdir: str) -> Dict[str, Any]:
+    """Statut de l'agent à partir du verrou et du pidfile, sans parcourir la table des processus"""
+    if not supervisor_running(workdir):
+        return {"running": False}
+    info = read_pidfile(workdir) or {}
+
+    return {
+        "running": True,
+        "supervisor_pid": info.get("supervisor_pid"),
+        "agent_pid": info.get("agent_pid") if pid_alive(info.get("agent_pid")) else None,
+        "started_at": info.get("started_at"),
+        "restarts": info.get("restarts", 0)
+    }
+
+
+def send_command(workdir: str, command: str, timeout: float = 2.0, **params) -> Optional[Dict[str, Any]]:
+    """Envoyer une commande à l'agent via son socket de contrôle"""
+    path = socket_path(workdir)
+    if not hasattr(socket, "AF_UNIX") or not path.exists():
+        return None
+
+    request = dict(params, command=command)
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(str(path))
+            sock.sendall(json.dumps(request).encode('utf-8') + b"\n")
+            data = b""
+            while not data.endswith(b"\n"):
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                data += chunk
+        return json.loads(data.decode('utf-8')) if data else None
+    except (OSError, ValueError):
+        return None
+
+
+class ControlServer:
+    """Socket de contrôle Unix servi par l'agent (une requête JSON par ligne)"""
+
+    def __init__(self, path: str, handlers: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]]):
+        self.path = path
+        self.handlers = handlers
+        self._sock = None
+        self._thread = None
+
+    def start(self) -> bool:
+        """Démarrer le serveur dans un thread"""
+        if not hasattr(socket, "AF_UNIX"):
+            print("⚠️ Socket de contrôle non supporté sur cette plateforme")
+            return False
+
+        try:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._sock.bind(self.path)
+            self._sock.listen(8)
+        except OSError as e:
+            print(f"⚠️ Impossible d'ouvrir le socket de contrôle : {e}")
+            self._sock = None
+            return False
+
+        self._thread = threading.Thread(target=self._serve, name="agent-control", daemon=True)
+        self._thread.start()
+        print(f"🔌 Socket de contrôle : {self.path}")
+        return True
+
+    def _serve(self):
+        while self._sock:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                break
+            with conn:
+                conn.settimeout(2.0)
+                try:
+                    self._handle(conn)
+                except OSError:
+                    continue
+
+    def _handle(self, conn):
+        data = b""
+        while not data.endswith(b"\n"):
+            chunk = conn.recv(65536)
+            if not chunk:
+                break
+            data += chunk
+
+        try:
+            request = json.loads(data.decode('utf-8'))
+            handler = self.handlers.get(request.get("command"))
+            if handler:
+                response = handler(request)
+            else:
+                response = {"error": f"Commande inconnue : {request.get('command')}"}
+        except Exception as e:
+            response = {"error": str(e)}
+
+        conn.sendall(json.dumps(response, default=str).encode('utf-8') + b"\n")
+
+    def stop(self):
+        """Fermer le socket et supprimer le fichier"""
+        sock, self._sock = self._sock, None
+        if sock:
+            sock.close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+class AgentSupervisor:
+    """Processus parent qui lance l'agent et le relance après un crash"""
+
+    def __init__(self, workdir: str, agent_args: Optional[list] = None,
+                 backoff_initial: float = 1.0, backoff_max: float = 300.0,
+                 stable_after: float = 60.0, drain_timeout: float = 60.0):
+        self.workdir = os.path.abspath(workdir)
+        self.agent_args = agent_args or []
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.stable_after = stable_after
+        self.drain_timeout = drain_timeout
+
+        self.process = None
+        self.restarts = 0
+        self.started_at = datetime.now().isoformat()
+        self._stopping = threading.Event()
+        self._lock_file = None
+
+    def _acquire_lock(self) -> bool:
+        """Verrou exclusif gardé jusqu'à la sortie du processus (libéré par le noyau même après un SIGKILL)"""
+        if fcntl is None:
+            return True
+        path = lockfile_path(self.workdir)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock_file = open(path, 'ab')
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._lock_file.close()
+            self._lock_file = None
+            return False
+        return True
+
+    def _update_pidfile(self):
+        write_pidfile(self.workdir, {
+            "supervisor_pid": os.getpid(),
+            "agent_pid": self.process.pid if self.process else None,
+            "started_at": self.started_at,
+            "restarts": self.restarts
+        })
+
+    def _spawn(self) -> "subprocess.Popen":
+        env = dict(os.environ)
+        env[SOCKET_ENV] = str(socket_path(self.workdir))
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(PROJECT_ROOT), env.get("PYTHONPATH")]))
+        return subprocess.Popen([sys.executable, "-m", "core.agent"] + self.agent_args,
+                                cwd=self.workdir, env=env)
+
+    def run(self) -> int:
+        """Boucle de supervision : lancer, attendre, relancer avec backoff exponentiel"""
+        signal.signal(signal.SIGTERM, lambda *_: self.stop())
+        signal.signal(signal.SIGINT, lambda *_: self.stop())
+
+        if not self._acquire_lock():
+            print("⚠️ Superviseur déjà actif")
+            return 1
+        # Pidfile réécrit sous verrou : un ancien pidfile ne désigne plus un autre processus
+        self._update_pidfile()
+
+        backoff = self.backoff_initial
+        exit_code = 0
+        try:
+            while not self._stopping.is_set():
+                launched_at = time.monotonic()
+                self.process = self._spawn()
+                self._update_pidfile()
+                print(f"🚀 Agent lancé (pid {self.process.pid})")
+
+                exit_code = self.process.wait()
+                if self._stopping.is_set() or exit_code == 0:
+                    break
+
+                if time.monotonic() - launched_at >= self.stable_after:
+                    backoff = self.backoff_initial
+                self.restarts += 1
+                print(f"💥 Agent arrêté (code {exit_code}) - relance dans {backoff:.1f}s")
+                self.process = None
+                self._update_pidfile()
+                self._stopping.wait(backoff)
+                backoff = min(backoff * 2, self.backoff_max)
+        finally:
+            try:
+                pidfile_path(self.workdir).unlink()
+            except OSError:
+                pass
+            if self._lock_file:
+                self._lock_file.close()
+                self._lock_file = None
+        return exit_code
+
+    def stop(self, drain: bool = True):
+        """Arrêt gracieux : demander à l'agent de terminer son cycle, puis forcer si besoin"""
+        if self._stopping.is_set():
+            return
+        self._stopping.set()
+        threading.Thread(target=self._shutdown_agent, args=(drain,), daemon=True).start()
+
+    def _shutdown_agent(self, drain: bool):
+        process = self.process
+        if not process or process.poll() is not None:
+            return
+
+        if send_command(self.workdir, "stop", drain=drain) is None:
+            process.terminate()
+        try:
+            process.wait(timeout=self.drain_timeout)
+        except subprocess.TimeoutExpired:
+            print("⚠️ Drain trop long, arrêt forcé de l'agent")
+            process.kill()
+
+
+def start_detached(workdir: str, agent_args: Optional[list] = None) -> Dict[str, Any]:
+    """Démarrer le superviseur en arrière-plan s'il ne tourne pas déjà"""
+    status = agent_status(workdir)
+    if status["running"]:
+        return status
+
+    run_dir(workdir).mkdir(parents=True, exist_ok=True)
+    log_file = open(run_dir(workdir) / "supervisor.log", 'a', encoding='utf-8')
+    cmd = [sys.executable, "-m", "core.supervisor", "--workdir", os.path.abspath(workdir)]
+    if agent_args:
+        cmd += ["--"] + agent_args
+    process = subprocess.Popen(cmd, cwd=str(PROJECT_ROOT), stdout=log_file, stderr=subprocess.STDOUT,
+                               start_new_session=True)
+    log_file.close()
+    return {"running": True, "supervisor_pid": process.pid}
+
+
+def stop_agent(workdir: str, timeout: float = 90.0) -> bool:
+    """Arrêter le superviseur (et donc l'agent) de manière gracieuse
+
+    Attend au plus `timeout` secondes (0 : rend la main dès la demande envoyée) ; True si arrêté."""
+    if not supervisor_running(workdir):
+        return True
+    info = read_pidfile(workdir)
+    if not info:
+        return False
+
+    # Le verrou garantit que ce pid est bien celui du superviseur et non un pid réutilisé
+    os.kill(info["supervisor_pid"], signal.SIGTERM)
+    deadline = time.monotonic() + timeout
+    while supervisor_running(workdir):
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.2)
+    return True
+
+
+def main():
+    """Fonction principale"""
+    parser = argparse.ArgumentParser(description="Superviseur de l'Agent IA Nocturne")
+    parser.add_argument("--workdir", default=os.getcwd(), help="Répertoire des données de l'agent")
+    parser.add_argument("agent_args", nargs="*", help="Arguments transmis à l'agent")
+    args = parser.parse_args()
+
+    status = agent_status(args.workdir)
+    if status["running"]:
+        print(f"⚠️ Superviseur déjà actif (pid {status['supervisor_pid']})")
+        return 1
+
+    supervisor = AgentSupervisor(args.workdir, args.agent_args)
+    return supervisor.run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
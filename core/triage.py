@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Tri côté serveur des emails traités
+Libellés Gmail (X-GM-LABELS) ou mots-clés IMAP posés par lots de UID STORE : les recherches excluent
+directement sur le serveur les messages déjà traités
+"""
+
+import base64
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.metrics import REGISTRY
+
+TRIAGE_MARKS = REGISTRY.counter("agent_triage_marks_total", "Emails marqués sur le serveur IMAP", ["method"])
+
+# Méthodes de marquage selon le serveur
+LABELS, KEYWORDS = "labels", "keywords"
+
+DEFAULT_LABELS = {"traite": "🤖 Agent IA", "repondu": "✅ Répondu", "rejete": "❌ Rejeté"}
+DEFAULT_KEYWORDS = {"traite": "$AgentTraite", "repondu": "$AgentRepondu", "rejete": "$AgentRejete"}
+
+# UID par commande STORE (longueur de ligne raisonnable même sans plages contiguës)
+STORE_BATCH = 500
+
+
+def imap_utf7(text: str) -> str:
+    """Nom en UTF-7 modifié (RFC 3501 §5.1.3), forme attendue par Gmail pour les libellés"""
+    result, pending = [], []
+
+    def flush():
+        if pending:
+            encoded = base64.b64encode("".join(pending).encode("utf-16-be")).decode("ascii")
+            result.append("&" + encoded.rstrip("=").replace("/", ",") + "-")
+            pending.clear()
+
+    for char in text:
+        if 0x20 <= ord(char) <= 0x7e:
+            flush()
+            result.append("&-" if char == "&" else char)
+        else:
+            pending.append(char)
+    flush()
+    return "".join(result)
+
+
+def quote(value: str) -> str:
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def sequence_set(uids: List[int]) -> str:
+    """UID en plages IMAP, ex. [1, 2, 3, 7, 9, 10] -> 1:3,7,9:10"""
+    ranges = []
+    for uid in sorted(set(uids)):
+        if ranges and uid == ranges[-1][1] + 1:
+            ranges[-1][1] = uid
+        else:
+            ranges.append([uid, uid])
+    return ",".join(str(lo) if lo == hi else f"{lo}:{hi}" for lo, hi in ranges)
+
+
+def outcome(action: Optional[str]) -> Optional[str]:
+    """Marque complémentaire à "traite" selon l'action consignée"""
+    if action == "Réponse envoyée":
+        return "repondu"
+    if action and action.startswith("Rejetée"):
+        return "rejete"
+    return None
+
+
+class ServerTriage:
+    """Marques en attente par compte, posées en fin de cycle par quelques UID STORE groupés"""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Dict[Tuple[Optional[int], int], Optional[str]]] = {}
+        self._warned = set()
+        self.configure(config or {})
+
+    def configure(self, config: Dict[str, Any]):
+        triage = config.get("triage", {})
+        gmail = config.get("integrations", {}).get("gmail", {})
+        self.enabled = triage.get("enabled", True)
+        self.use_labels = gmail.get("actif", True)
+        self.labels = dict(DEFAULT_LABELS, **(gmail.get("labels") or {}))
+        self.keywords = dict(DEFAULT_KEYWORDS, **(triage.get("keywords") or {}))
+
+    def method(self, mail, account: str) -> Optional[str]:
+        """Libellés Gmail si disponibles, sinon mots-clés si le serveur les conserve (à appeler après SELECT)"""
+        if not self.enabled:
+            return None
+        if self.use_labels and "X-GM-EXT-1" in mail.capabilities:
+            return LABELS
+        _, data = mail.response("PERMANENTFLAGS")
+        flags = (data[0] or b"").decode("ascii", "replace") if data and data[0] else ""
+        if "\\*" in flags or all(keyword in flags for keyword in self.keywords.values()):
+            return KEYWORDS
+        if account not in self._warned:
+            self._warned.add(account)
+            print(f"⚠️ [{account}] Mots-clés IMAP non conservés par le serveur - tri côté serveur désactivé")
+        return None
+
+    def exclude(self, method: Optional[str]) -> str:
+        """Critère SEARCH excluant les emails déjà traités"""
+        if method == LABELS:
+            return f"NOT X-GM-LABELS {quote(imap_utf7(self.labels['traite']))}"
+        if method == KEYWORDS:
+            return f"NOT KEYWORD {self.keywords['traite']}"
+        return ""
+
+    def mark(self, account: Optional[str], uidvalidity: Optional[int], uid: Optional[int],
+             action: Optional[str] = None):
+        """Email consigné : marque posée au prochain flush"""
+        if not self.enabled or account is None or uid is None:
+            return
+        with self._lock:
+            self._pending.setdefault(account, {})[(uidvalidity, uid)] = outcome(action)
+
+    def pending(self, account: str) -> int:
+        return len(self._pending.get(account, {}))
+
+    def flush(self, mail, account: str, uidvalidity: Optional[int], method: Optional[str]) -> int:
+        """Poser les marques en attente du compte sur la boîte sélectionnée ; retourne le nombre d'emails"""
+        with self._lock:
+            marks = self._pending.pop(account, {})
+        # Boîte renumérotée depuis la relève : les UID ne désignent plus les mêmes messages
+        marks = {uid: extra for (validity, uid), extra in marks.items() if validity == uidvalidity}
+        if not marks or method is None:
+            return 0
+
+        groups = {"traite": list(marks)}
+        for uid, extra in marks.items():
+            if extra:
+                groups.setdefault(extra, []).append(uid)
+        try:
+            for key, uids in groups.items():
+                if method == LABELS:
+                    item, value = "+X-GM-LABELS", f"({quote(imap_utf7(self.labels[key]))})"
+                else:
+                    item, value = "+FLAGS.SILENT", f"({self.keywords[key]})"
+                uids = sorted(uids)
+                for start in range(0, len(uids), STORE_BATCH):
+                    status, data = mail.uid("store", sequence_set(uids[start:start + STORE_BATCH]), item, value)
+                    if status != "OK":
+                        raise RuntimeError(f"STORE {item} : {data}")
+        except Exception:
+            # Nouvel essai au prochain cycle (une marque posée deux fois est sans effet)
+            with self._lock:
+                pending = self._pending.setdefault(account, {})
+                for uid, extra in marks.items():
+                    pending.setdefault((uidvalidity, uid), extra)
+            raise
+        TRIAGE_MARKS.inc(len(marks), method=method)
+        return len(marks)
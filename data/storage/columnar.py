@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+"""
+Modèle de lecture en colonnes des opportunités (serveur web)
+Tableaux typés pour l'horodatage, la pertinence et les codes de décision/action, chaînes encodées en
+dictionnaire (expéditeurs, raisons) ; forme sur disque projetée en mémoire (mmap) et partagée entre workers
+"""
+
+import os
+import sys
+import json
+import mmap
+import struct
+import tempfile
+import importlib.util
+from array import array
+from collections import Counter
+from itertools import compress, islice
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Any, Iterable, List, Optional, Tuple
+
+from utils.lazy import lazy_import
+
+# NumPy est optionnel : sans lui, mêmes résultats avec array et des boucles Python
+HAS_NUMPY = importlib.util.find_spec("numpy") is not None
+numpy = lazy_import("numpy")
+
+MAGIC = b"OPPCOLS\n"
+FORMAT_VERSION = 1
+
+# Champs texte encodés en dictionnaire (code par ligne, valeurs distinctes stockées une fois) ;
+# le code 0 désigne une valeur absente ou non textuelle, conservée telle quelle avec les autres champs
+ENCODED_FIELDS = ("sender", "decision", "action")
+NOT_ENCODED = 0
+
+# Colonne -> code de type array (et dtype NumPy équivalent)
+TYPECODES = {
+    "timestamp": "d",       # secondes epoch, NaN si absent ou illisible
+    "pertinence": "f",      # NaN si absente ou non numérique
+    "sender": "I",
+    "decision": "I",
+    "action": "I",
+    "has_reasons": "B",     # 1 si raisons est une liste de chaînes (encodée), 0 sinon
+    "reason_offsets": "Q",  # raisons de la ligne i : reason_codes[offsets[i]:offsets[i + 1]]
+    "reason_codes": "I",
+    "rest_offsets": "Q",    # autres champs (JSON compact) : rest[offsets[i]:offsets[i + 1]]
+}
+
+# Tables de filtre conservées par modèle (les pages rafraîchies répètent les mêmes filtres)
+MAX_TABLES = 64
+
+PERIODS = ("all", "today", "week", "month")
+DECISION_FILTERS = {"retained": "✅", "rejected": "❌"}
+
+
+def parse_epoch(timestamp: Any) -> float:
+    try:
+        return datetime.fromisoformat(timestamp.replace('Z', '+00:00')).timestamp()
+    except (AttributeError, ValueError):
+        return float("nan")
+
+
+def period_start(period: str, now: Optional[datetime] = None) -> Optional[float]:
+    """Début (epoch) de la période : aujourd'hui, semaine en cours (lundi) ou mois en cours"""
+    now = now or datetime.now()
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if period == "today":
+        return midnight.timestamp()
+    if period == "week":
+        return (midnight - timedelta(days=midnight.weekday())).timestamp()
+    if period == "month":
+        return midnight.replace(day=1).timestamp()
+    return None
+
+
+_REST_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+# Lignes reconstruites par json.loads lors d'un parcours complet
+ITER_BATCH = 1000
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def _number(value: float):
+    return int(value) if float(value).is_integer() else round(float(value), 2)
+
+
+class OpportunityColumns:
+    """Opportunités en colonnes : filtres et agrégats sur des tableaux, lignes reconstruites à la demande"""
+
+    def __init__(self, rows: int, columns: Dict[str, Any], dictionaries: Dict[str, List[Any]],
+                 keysets: List[Tuple[str, ...]], rest, generation: Optional[tuple] = None):
+        self.rows = rows
+        self.columns = columns
+        self.dictionaries = dictionaries
+        self.keysets = keysets
+        self.rest = rest
+        self.generation = generation
+        self._arrays = {}
+        self._tables = {}
+
+    def __len__(self) -> int:
+        return self.rows
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[Dict[str, Any]],
+                     generation: Optional[tuple] = None) -> "OpportunityColumns":
+        """Encoder les opportunités en une passe (l'itérable peut être lu en streaming)"""
+        return _Encoder().extend(entries).build(generation)
+
+    def appended(self, entries: Iterable[Dict[str, Any]], generation: Optional[tuple] = None) -> "OpportunityColumns":
+        """Nouveau modèle : ces lignes-ci puis `entries` (seules les nouvelles entrées sont encodées)"""
+        return _Encoder(self).extend(entries).build(generation)
+
+    def save(self, path: str):
+        """Écrire la forme sur disque (remplacement atomique, les workers qui l'ont projetée gardent l'ancienne)"""
+        layout, offset = {}, 0
+        for name, typecode in TYPECODES.items():
+            size = len(self.columns[name]) * array(typecode).itemsize
+            layout[name] = [typecode, array(typecode).itemsize, offset, len(self.columns[name])]
+            offset = _align(offset + size)
+        header = json.dumps({
+            "version": FORMAT_VERSION,
+            "byteorder": sys.byteorder,
+            "generation": list(self.generation) if self.generation else None,
+            "rows": self.rows,
+            "columns": layout,
+            "rest": [offset, len(self.rest)],
+            "dictionaries": self.dictionaries,
+            "keysets": [list(keyset) for keyset in self.keysets],
+        }, ensure_ascii=False).encode()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".columns.", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(MAGIC + struct.pack("<Q", len(header)) + header)
+                base = _align(f.tell())
+                for name in TYPECODES:
+                    f.write(b"\0" * (base + layout[name][2] - f.tell()))
+                    f.write(memoryview(self.columns[name]).cast("B"))
+                f.write(b"\0" * (base + offset - f.tell()))
+                f.write(self.rest)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> Optional["OpportunityColumns"]:
+        """Projeter le fichier en mémoire (pages partagées entre processus) ; None s'il est absent ou illisible"""
+        try:
+            with open(path, "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        try:
+            if mapped[:len(MAGIC)] != MAGIC:
+                return None
+            length = struct.unpack_from("<Q", mapped, len(MAGIC))[0]
+            start = len(MAGIC) + 8
+            header = json.loads(mapped[start:start + length])
+            if header.get("version") != FORMAT_VERSION or header.get("byteorder") != sys.byteorder:
+                return None
+            base = _align(start + length)
+            view = memoryview(mapped)
+            columns = {}
+            for name, (typecode, itemsize, offset, count) in header["columns"].items():
+                if array(typecode).itemsize != itemsize:
+                    return None
+                columns[name] = view[base + offset:base + offset + count * itemsize].cast(typecode)
+            offset, size = header["rest"]
+            generation = tuple(header["generation"]) if header["generation"] else None
+            return cls(header["rows"], columns, header["dictionaries"],
+                       [tuple(keyset) for keyset in header["keysets"]], view[base + offset:base + offset + size],
+                       generation)
+        except (ValueError, KeyError, TypeError, struct.error) as e:
+            print(f"⚠️ Modèle en colonnes illisible ({path}) : {e}")
+            return None
+
+    def _array(self, name: str):
+        """Vue NumPy sans copie d'une colonne"""
+        if name not in self._arrays:
+            self._arrays[name] = numpy.frombuffer(self.columns[name], dtype=TYPECODES[name])
+        return self._arrays[name]
+
+    def _values(self, name: str, selection=None):
+        if HAS_NUMPY:
+            column = self._array(name)
+            return column if selection is None else column[selection]
+        column = self.columns[name]
+        return column if selection is None else list(map(column.__getitem__, selection))
+
+    def _table(self, name: str, key: tuple, predicate):
+        """Prédicat évalué une fois par valeur distincte, indexé ensuite par code"""
+        table = self._tables.get((name, key))
+        if table is None:
+            table = [False] + [bool(predicate(value)) for value in self.dictionaries[name][1:]]
+            table = numpy.array(table, dtype=bool) if HAS_NUMPY else table
+            if len(self._tables) >= MAX_TABLES:
+                self._tables.clear()
+            self._tables[(name, key)] = table
+        return table
+
+    def select(self, since: Optional[float] = None, decision: Optional[str] = None,
+               sender: Optional[str] = None):
+        """Lignes retenues par les filtres : masque NumPy, liste d'indices sans NumPy, None sans filtre"""
+        tables = []
+        if decision:
+            prefix = DECISION_FILTERS[decision]
+            tables.append(("decision", self._table(
+                "decision", (decision,), lambda value: isinstance(value, str) and value.startswith(prefix))))
+        if sender:
+            needle = sender.lower()
+            tables.append(("sender", self._table(
+                "sender", (needle,), lambda value: isinstance(value, str) and needle in value.lower())))
+        if since is None and not tables:
+            return None
+
+        if HAS_NUMPY:
+            mask = numpy.ones(self.rows, dtype=bool)
+            if since is not None:
+                mask &= self._array("timestamp") >= since
+            for name, table in tables:
+                mask &= table[self._array(name)]
+            return mask
+
+        # Sans NumPy : itérations en C (map, compress) sur les colonnes, indices restants affinés à chaque filtre
+        tests = [("timestamp", float(since).__le__)] if since is not None else []
+        tests += [(name, table.__getitem__) for name, table in tables]
+        selection = None
+        for name, test in tests:
+            rows = range(self.rows) if selection is None else selection
+            selection = list(compress(rows, map(test, self._values(name, selection))))
+        return selection
+
+    def count(self, selection=None) -> int:
+        if selection is None:
+            return self.rows
+        return int(numpy.count_nonzero(selection)) if HAS_NUMPY else len(selection)
+
+    def value_counts(self, name: str, selection=None) -> Counter:
+        """Occurrences de chaque valeur textuelle d'un champ encodé"""
+        dictionary = self.dictionaries[name]
+        if HAS_NUMPY:
+            counts = numpy.bincount(self._values(name, selection), minlength=len(dictionary))
+            codes = {code: int(n) for code, n in enumerate(counts) if n}
+        else:
+            codes = Counter(self._values(name, selection))
+        return Counter({dictionary[code]: n for code, n in codes.items()
+                        if code != NOT_ENCODED and dictionary[code] is not None})
+
+    def pertinence(self, selection=None) -> Tuple[float, Counter]:
+        """(moyenne des pertinences non nulles, distribution avec 0 pour les absentes)"""
+        values = self._values("pertinence", selection)
+        if HAS_NUMPY:
+            known = numpy.nan_to_num(values)
+            truthy = known[known != 0]
+            average = float(truthy.mean()) if truthy.size else 0
+            levels, counts = numpy.unique(known, return_counts=True)
+            return average, Counter({_number(level): int(n) for level, n in zip(levels, counts)})
+        known = [0.0 if value != value else value for value in values]
+        truthy = [value for value in known if value]
+        average = sum(truthy) / len(truthy) if truthy else 0
+        return average, Counter({_number(level): n for level, n in Counter(known).items()})
+
+    def count_between(self, start: float, end: float, selection=None) -> int:
+        """Lignes horodatées dans [start, end["""
+        values = self._values("timestamp", selection)
+        if HAS_NUMPY:
+            return int(numpy.count_nonzero((values >= start) & (values < end)))
+        return sum(1 for value in values if start <= value < end)
+
+    def indices(self, selection=None, limit: Optional[int] = None) -> List[int]:
+        """Indices des lignes sélectionnées (les `limit` dernières)"""
+        if HAS_NUMPY and selection is not None:
+            selection = numpy.flatnonzero(selection).tolist()
+        rows = range(self.rows) if selection is None else selection
+        return list(rows[-limit:] if limit else rows)
+
+    def rows_at(self, indices: List[int]) -> List[Dict[str, Any]]:
+        """Opportunités d'origine reconstruites (un seul json.loads, colonnes lues par lot)"""
+        if not indices:
+            return []
+        offsets = self.columns["rest_offsets"]
+        # Chaque ligne se termine par une virgule : une plage contiguë est déjà un tableau JSON sans crochets
+        if indices[-1] - indices[0] + 1 == len(indices):
+            chunk = bytes(self.rest[offsets[indices[0]]:offsets[indices[-1] + 1] - 1])
+        else:
+            chunk = b",".join(bytes(self.rest[offsets[i]:offsets[i + 1] - 1]) for i in indices)
+        keysets = self.keysets
+        entries = [dict(zip(keysets[record[0]], record[1:])) for record in json.loads(b"[" + chunk + b"]")]
+
+        for name in ENCODED_FIELDS:
+            dictionary = self.dictionaries[name]
+            for entry, code in zip(entries, map(self.columns[name].__getitem__, indices)):
+                if code != NOT_ENCODED:
+                    entry[name] = dictionary[code]
+        offsets, codes, reasons = self.columns["reason_offsets"], self.columns["reason_codes"], self.dictionaries["raisons"]
+        for entry, i, has_reasons in zip(entries, indices, map(self.columns["has_reasons"].__getitem__, indices)):
+            if has_reasons:
+                entry["raisons"] = [reasons[code] for code in codes[offsets[i]:offsets[i + 1]]]
+        return entries
+
+    def tail(self, limit: Optional[int] = None, selection=None) -> List[Dict[str, Any]]:
+        return self.rows_at(self.indices(selection, limit))
+
+    def __iter__(self):
+        for start in range(0, self.rows, ITER_BATCH):
+            yield from self.rows_at(list(range(start, min(start + ITER_BATCH, self.rows))))
+
+
+class _Encoder:
+    """Colonnes en construction, vides ou copiées d'un modèle existant pour y ajouter des lignes"""
+
+    def __init__(self, base: Optional[OpportunityColumns] = None):
+        self.absent = object()
+        self.columns = {name: array(typecode) for name, typecode in TYPECODES.items()}
+        self.indexes = {name: {self.absent: NOT_ENCODED} for name in ENCODED_FIELDS}
+        self.indexes["raisons"] = {}
+        self.keysets, self.rest, self.rows = {}, bytearray(), 0
+        if base is None:
+            self.columns["reason_offsets"].append(0)
+            self.columns["rest_offsets"].append(0)
+            return
+
+        for name, column in self.columns.items():
+            column.frombytes(memoryview(base.columns[name]).cast("B"))
+        for name, index in self.indexes.items():
+            # Le code 0 des champs encodés reste réservé aux valeurs non encodées
+            index.update((value, code) for code, value in enumerate(base.dictionaries[name])
+                         if code != NOT_ENCODED or name == "raisons")
+        self.keysets = {keyset: code for code, keyset in enumerate(base.keysets)}
+        self.rest, self.rows = bytearray(base.rest), base.rows
+
+    def add(self, entry: Dict[str, Any]):
+        columns = self.columns
+        columns["timestamp"].append(parse_epoch(entry.get("timestamp")))
+        pertinence = entry.get("pertinence")
+        numeric = isinstance(pertinence, (int, float)) and not isinstance(pertinence, bool)
+        columns["pertinence"].append(pertinence if numeric else float("nan"))
+
+        others = {}
+        for key, value in entry.items():
+            if key in ENCODED_FIELDS and (value is None or isinstance(value, str)):
+                continue
+            if key == "raisons" and isinstance(value, list) and all(isinstance(r, str) for r in value):
+                continue
+            others[key] = value
+        for name in ENCODED_FIELDS:
+            index = self.indexes[name]
+            encoded = name in entry and name not in others
+            columns[name].append(index.setdefault(entry[name], len(index)) if encoded else NOT_ENCODED)
+        has_reasons = "raisons" in entry and "raisons" not in others
+        if has_reasons:
+            index = self.indexes["raisons"]
+            columns["reason_codes"].extend(index.setdefault(reason, len(index)) for reason in entry["raisons"])
+        columns["reason_offsets"].append(len(columns["reason_codes"]))
+        columns["has_reasons"].append(has_reasons)
+
+        keyset = self.keysets.setdefault(tuple(others), len(self.keysets))
+        self.rest += _REST_ENCODER.encode([keyset, *others.values()]).encode() + b","
+        columns["rest_offsets"].append(len(self.rest))
+        self.rows += 1
+
+    def extend(self, entries: Iterable[Dict[str, Any]]) -> "_Encoder":
+        for entry in entries:
+            self.add(entry)
+        return self
+
+    def build(self, generation: Optional[tuple]) -> OpportunityColumns:
+        dictionaries = {}
+        for name, index in self.indexes.items():
+            values = [None] * len(index)
+            for value, code in index.items():
+                values[code] = None if value is self.absent else value
+            dictionaries[name] = values
+        return OpportunityColumns(self.rows, self.columns, dictionaries, list(self.keysets), self.rest, generation)
+
+
+def refresh_columns(base: Optional[OpportunityColumns], read_entries: Callable[[], Iterable[Dict[str, Any]]],
+                    generation: Optional[tuple] = None) -> OpportunityColumns:
+    """Modèle du log complet lu en flux : si son début est inchangé, seules les entrées ajoutées depuis `base` sont encodées
+
+    `read_entries()` rouvre le log ; les entrées déjà encodées sont lues sans être conservées."""
+    known = len(base) if base is not None else 0
+    if known:
+        entries = iter(read_entries())
+        first, last = base.rows_at([0, known - 1])
+        head = next(entries, None)
+        tail = head if known == 1 else next(islice(entries, known - 2, None), None)
+        if head == first and tail == last:
+            return base.appended(entries, generation)
+    return OpportunityColumns.from_entries(read_entries(), generation)
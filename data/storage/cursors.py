@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Curseurs de synchronisation des boîtes mail
+Dernier UID traité par compte (et UIDVALIDITY) : seuls les nouveaux messages sont relus
+"""
+
+import os
+import json
+import tempfile
+import threading
+from typing import Dict, Any, Optional
+
+
+class SyncCursors:
+    """{compte: {"uidvalidity": int, "last_uid": int}} persisté de manière atomique"""
+
+    def __init__(self, path: str = "mailbox_cursors.json"):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self.cursors = json.load(f)
+        except (OSError, ValueError):
+            self.cursors = {}
+
+    def get(self, account: str, uidvalidity: Optional[int]) -> Optional[int]:
+        """Dernier UID traité, None si inconnu ou si la boîte a été renumérotée (UIDVALIDITY)"""
+        cursor = self.cursors.get(account)
+        if not cursor or cursor.get("uidvalidity") != uidvalidity:
+            return None
+        return cursor.get("last_uid")
+
+    def advance(self, account: str, uidvalidity: Optional[int], last_uid: int):
+        with self._lock:
+            cursor = self.cursors.get(account)
+            if cursor and cursor.get("uidvalidity") == uidvalidity and cursor.get("last_uid", 0) >= last_uid:
+                return
+            self.cursors[account] = {"uidvalidity": uidvalidity, "last_uid": last_uid}
+            self._save()
+
+    def _save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".cursors.", suffix=".tmp", dir=directory)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(self.cursors, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def status(self) -> Dict[str, Any]:
+        return dict(self.cursors)
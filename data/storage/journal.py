@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Journal des étapes de traitement de chaque email
+fetched → analyzed → drafted → sending → sent → logged : une reprise après arrêt repart de la dernière étape,
+sans refaire d'appel IA ni renvoyer de réponse
+"""
+
+import json
+import time
+import sqlite3
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+
+FETCHED, ANALYZED, DRAFTED, SENDING, SENT, LOGGED = "fetched", "analyzed", "drafted", "sending", "sent", "logged"
+STAGES = (FETCHED, ANALYZED, DRAFTED, SENDING, SENT, LOGGED)
+_RANK = {stage: rank for rank, stage in enumerate(STAGES)}
+
+
+class PipelineJournal:
+    """Étape atteinte et résultats intermédiaires (analyse, brouillon, action) par email"""
+
+    def __init__(self, path: str = "pipeline_journal.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # Une étape enregistrée doit survivre à une coupure : c'est elle qui empêche un second envoi
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoints ("
+            "email_id TEXT PRIMARY KEY, uidvalidity INTEGER, stage TEXT NOT NULL, data TEXT NOT NULL, "
+            "updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS checkpoints_stage ON checkpoints(stage, updated_at)")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _transaction(self, fn):
+        """Exécuter fn(conn) sous verrou d'écriture SQLite (exclusif entre processus)"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def start(self, email_id: str, uidvalidity: Optional[int] = None) -> Dict[str, Any]:
+        """Point de reprise de l'email ({"stage", "data"}), créé à l'étape fetched s'il est inconnu
+
+        Une boîte renumérotée (UIDVALIDITY différent) réutilise les identifiants : l'ancien point est oublié."""
+        def begin(conn):
+            row = conn.execute("SELECT uidvalidity, stage, data FROM checkpoints WHERE email_id = ?",
+                               (email_id,)).fetchone()
+            if row and row[0] == uidvalidity:
+                return {"stage": row[1], "data": json.loads(row[2])}
+            conn.execute("INSERT OR REPLACE INTO checkpoints (email_id, uidvalidity, stage, data, updated_at) "
+                         "VALUES (?, ?, ?, '{}', ?)", (email_id, uidvalidity, FETCHED, time.time()))
+            return {"stage": FETCHED, "data": {}}
+
+        return self._transaction(begin)
+
+    def advance(self, email_id: str, stage: str, data: Optional[Dict[str, Any]] = None) -> bool:
+        """Passer à `stage` en fusionnant `data` ; False si l'email y est déjà (ou au-delà)
+
+        Le passage à sending est exclusif : seul l'appelant qui obtient True envoie la réponse."""
+        def move(conn):
+            row = conn.execute("SELECT stage, data FROM checkpoints WHERE email_id = ?", (email_id,)).fetchone()
+            if row is None or _RANK[row[0]] >= _RANK[stage]:
+                return False
+            merged = dict(json.loads(row[1]), **(data or {}))
+            conn.execute("UPDATE checkpoints SET stage = ?, data = ?, updated_at = ? WHERE email_id = ?",
+                         (stage, json.dumps(merged, ensure_ascii=False), time.time(), email_id))
+            return True
+
+        return self._transaction(move)
+
+    def get(self, email_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT stage, data FROM checkpoints WHERE email_id = ?",
+                                     (email_id,)).fetchone()
+        return {"stage": row[0], "data": json.loads(row[1])} if row else None
+
+    def unfinished(self, within_days: float = 7) -> List[Tuple[str, Optional[int]]]:
+        """Emails commencés mais pas consignés (arrêt en cours de traitement) : (email_id, uidvalidity)"""
+        cutoff = time.time() - within_days * 86400
+        with self._lock:
+            return self._conn.execute("SELECT email_id, uidvalidity FROM checkpoints WHERE stage != ? "
+                                      "AND updated_at >= ? ORDER BY updated_at", (LOGGED, cutoff)).fetchall()
+
+    def purge(self, older_than_days: float = 30) -> int:
+        """Oublier les emails consignés depuis plus de `older_than_days` jours"""
+        cutoff = time.time() - older_than_days * 86400
+        return self._transaction(lambda conn: conn.execute(
+            "DELETE FROM checkpoints WHERE stage = ? AND updated_at < ?", (LOGGED, cutoff)).rowcount)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT stage, count(*) FROM checkpoints GROUP BY stage").fetchall()
+        counts = dict.fromkeys(STAGES, 0)
+        counts.update(dict(rows))
+        return counts
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Index de recherche plein texte sur les opportunités
+SQLite FTS5 avec repli des accents et gestion des élisions françaises
+"""
+
+import re
+import html
+import json
+import os
+import sqlite3
+import threading
+import unicodedata
+from typing import Dict, Any, Iterable, List, Optional
+
+from core.stats import decode_email_subject
+
+# Élisions françaises : l'offre -> offre, qu'il -> il
+ELISION_RE = re.compile(r"\b(?:l|d|j|m|n|s|t|c|qu|jusqu|lorsqu|puisqu)['’]", re.IGNORECASE)
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Marqueurs de surlignage, remplacés par <mark> après échappement HTML
+MARK_OPEN, MARK_CLOSE = "\x02", "\x03"
+
+# Poids BM25 par colonne : sujet, expéditeur, raisons, corps
+COLUMN_WEIGHTS = (10.0, 5.0, 3.0, 1.0)
+
+
+def fold(text: str) -> str:
+    """Minuscules, sans accents et sans élisions"""
+    text = ELISION_RE.sub(" ", text or "")
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def build_match_query(query: str) -> Optional[str]:
+    """Transformer une saisie libre en requête FTS5 sûre (préfixes, ET implicite)"""
+    tokens = TOKEN_RE.findall(fold(query))
+    if not tokens:
+        return None
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+def highlight(snippet: str) -> str:
+    """Échapper un extrait FTS5 puis poser les balises <mark>"""
+    escaped = html.escape(snippet or "")
+    return escaped.replace(MARK_OPEN, "<mark>").replace(MARK_CLOSE, "</mark>")
+
+
+class SearchIndex:
+    """Index inversé incrémental des opportunités loggées"""
+
+    def __init__(self, path: str = "opportunities_index.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS opportunities_fts USING fts5("
+            "subject, sender, raisons, body, "
+            "email_id UNINDEXED, timestamp UNINDEXED, decision UNINDEXED, pertinence UNINDEXED, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT count(*) FROM opportunities_fts").fetchone()[0]
+
+    def _row(self, entry: Dict[str, Any], body: str = "") -> tuple:
+        # Texte stocké tel quel : le tokenizer unicode61 replie casse et accents
+        return (
+            decode_email_subject(entry.get("subject") or ""),
+            entry.get("sender") or "",
+            " | ".join(entry.get("raisons") or []),
+            body or "",
+            entry.get("email_id"),
+            entry.get("timestamp"),
+            entry.get("decision"),
+            entry.get("pertinence")
+        )
+
+    def add(self, entry: Dict[str, Any], body: str = ""):
+        """Indexer une opportunité au moment où elle est loggée"""
+        with self._lock:
+            self._conn.execute("INSERT INTO opportunities_fts VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                               self._row(entry, body))
+            self._conn.commit()
+
+    def rebuild(self, entries: Iterable[Dict[str, Any]]):
+        """Reconstruire l'index depuis le log (sans les corps d'emails, non loggés)"""
+        with self._lock:
+            self._conn.execute("DELETE FROM opportunities_fts")
+            self._conn.executemany("INSERT INTO opportunities_fts VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                   (self._row(entry) for entry in entries))
+            self._conn.execute("INSERT INTO opportunities_fts(opportunities_fts) VALUES ('optimize')")
+            self._conn.commit()
+
+    def search(self, query: str, limit: int = 20, offset: int = 0) -> List[Dict[str, Any]]:
+        """Rechercher, trier par pertinence BM25 et renvoyer des extraits surlignés"""
+        match = build_match_query(query)
+        if not match:
+            return []
+
+        sql = (
+            "SELECT email_id, timestamp, decision, pertinence, "
+            "snippet(opportunities_fts, 0, char(2), char(3), '…', 12), "
+            "snippet(opportunities_fts, -1, char(2), char(3), '…', 16), "
+            "bm25(opportunities_fts, ?, ?, ?, ?) AS score "
+            "FROM opportunities_fts WHERE opportunities_fts MATCH ? "
+            "ORDER BY score LIMIT ? OFFSET ?"
+        )
+        with self._lock:
+            rows = self._conn.execute(sql, COLUMN_WEIGHTS + (match, limit, offset)).fetchall()
+
+        return [{
+            "email_id": email_id,
+            "timestamp": timestamp,
+            "decision": decision,
+            "pertinence": pertinence,
+            "subject": highlight(subject),
+            "snippet": highlight(snippet),
+            "score": round(-score, 3)
+        } for email_id, timestamp, decision, pertinence, subject, snippet, score in rows]
+
+
+def open_index(path: str = "opportunities_index.db",
+               log_file: str = "opportunities_log.json") -> Optional[SearchIndex]:
+    """Ouvrir l'index (construit depuis le log s'il est vide), None si FTS5 est indisponible"""
+    try:
+        index = SearchIndex(path)
+    except sqlite3.OperationalError as e:
+        print(f"⚠️ Recherche plein texte indisponible (FTS5) : {e}")
+        return None
+
+    if index.count() == 0 and os.path.exists(log_file):
+        try:
+            with open(log_file, 'r', encoding='utf-8') as f:
+                index.rebuild(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Impossible d'indexer le log existant : {e}")
+    return index
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Log des opportunités découpé en segments quotidiens
+Un fichier JSONL par jour, un manifeste avec les compteurs, segments anciens compressés
+"""
+
+import os
+import re
+import gzip
+import json
+import tempfile
+import threading
+from datetime import date, timedelta
+from typing import Dict, Any, Iterable, Iterator, List, Optional
+
+from core.stats import iter_opportunities
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+DAY_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+def segment_day(entry: Dict[str, Any]) -> str:
+    """Jour (AAAA-MM-JJ) du segment d'une opportunité"""
+    day = (entry.get("timestamp") or "")[:10]
+    return day if DAY_RE.match(day) else date.today().isoformat()
+
+
+def empty_summary() -> Dict[str, Any]:
+    return {"count": 0, "retained": 0, "replied": 0, "pertinence_sum": 0, "first": None, "last": None}
+
+
+def summarize(summary: Dict[str, Any], entry: Dict[str, Any]):
+    """Mettre à jour les compteurs d'un segment (mêmes définitions que core.stats)"""
+    summary["count"] += 1
+    if "✅ Mission retenue" in entry.get("decision", ""):
+        summary["retained"] += 1
+    if "Réponse envoyée" in entry.get("action", ""):
+        summary["replied"] += 1
+    pertinence = entry.get("pertinence", 0)
+    if isinstance(pertinence, (int, float)):
+        summary["pertinence_sum"] += pertinence
+    timestamp = entry.get("timestamp")
+    if timestamp:
+        if summary["first"] is None or timestamp < summary["first"]:
+            summary["first"] = timestamp
+        if summary["last"] is None or timestamp > summary["last"]:
+            summary["last"] = timestamp
+
+
+class SegmentStore:
+    """Segments quotidiens en ajout seul, relus uniquement sur les jours demandés"""
+
+    def __init__(self, directory: str = "opportunity_segments", compress_after_days: int = 7):
+        self.directory = directory
+        self.compress_after_days = compress_after_days
+        self.segments = {}
+        self._signature = None
+        self._lock = threading.Lock()
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.directory, MANIFEST_NAME)
+
+    def exists(self) -> bool:
+        return os.path.exists(self.manifest_path)
+
+    def _stat_signature(self) -> Optional[tuple]:
+        try:
+            st = os.stat(self.manifest_path)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    def refresh(self) -> "SegmentStore":
+        """Relire le manifeste s'il a été modifié (par exemple par l'agent)"""
+        with self._lock:
+            signature = self._stat_signature()
+            if signature != self._signature:
+                try:
+                    with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                        self.segments = json.load(f).get("segments", {})
+                except (OSError, ValueError):
+                    self.segments = {}
+                self._signature = signature
+        return self
+
+    def _save_manifest(self):
+        os.makedirs(self.directory, exist_ok=True)
+        payload = json.dumps({"version": MANIFEST_VERSION, "segments": self.segments},
+                             separators=(",", ":"), ensure_ascii=False)
+        fd, tmp_path = tempfile.mkstemp(prefix=".manifest.", suffix=".tmp", dir=self.directory)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(payload)
+        os.replace(tmp_path, self.manifest_path)
+        self._signature = self._stat_signature()
+
+    def _path(self, meta: Dict[str, Any]) -> str:
+        return os.path.join(self.directory, meta["file"])
+
+    def days(self, start: Optional[str] = None, end: Optional[str] = None) -> List[str]:
+        """Jours disponibles sur [start, end] (bornes AAAA-MM-JJ ou ISO)"""
+        start = start[:10] if start else None
+        end = end[:10] if end else None
+        return sorted(day for day in self.segments
+                      if (not start or day >= start) and (not end or day <= end))
+
+    def count(self, day: str) -> int:
+        """Nombre d'opportunités d'un jour, lu dans le manifeste"""
+        return self.segments.get(day, {}).get("count", 0)
+
+    def summary(self, start: Optional[str] = None, end: Optional[str] = None) -> Dict[str, Any]:
+        """Statistiques globales au format attendu par les rapports, sans lire les segments"""
+        total = retained = replied = 0
+        pertinence_sum = 0
+        for day in self.days(start, end):
+            meta = self.segments[day]
+            total += meta["count"]
+            retained += meta["retained"]
+            replied += meta["replied"]
+            pertinence_sum += meta["pertinence_sum"]
+        if not total:
+            return {}
+        return {
+            "total_opportunities": total,
+            "performance": {
+                "missions_retenues": retained,
+                "reponses_envoyees": replied,
+                "taux_retention": round(retained / total * 100, 1),
+                "taux_reponse": round(replied / total * 100, 1)
+            },
+            "pertinence": {
+                "moyenne": round(pertinence_sum / total, 2)
+            }
+        }
+
+    def iter_day(self, day: str) -> Iterator[Dict[str, Any]]:
+        """Opportunités d'un jour, dans l'ordre du log"""
+        meta = self.segments.get(day)
+        if not meta:
+            return
+        opener = gzip.open if meta["file"].endswith(".gz") else open
+        try:
+            with opener(self._path(meta), 'rt', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+        except FileNotFoundError:
+            return
+
+    def iter_range(self, start: Optional[str] = None, end: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Opportunités de [start, end], en ne lisant que les segments concernés"""
+        for day in self.days(start, end):
+            yield from self.iter_day(day)
+
+    def append(self, entry: Dict[str, Any]):
+        """Ajouter une opportunité au segment de son jour"""
+        day = segment_day(entry)
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            meta = self.segments.get(day)
+            if meta is None:
+                meta = self.segments[day] = dict(empty_summary(), file=f"{day}.jsonl", bytes=0)
+            elif meta["file"].endswith(".gz"):
+                # Jour rouvert après compression : on repart d'un segment non compressé
+                self._decompress(day, meta)
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self._path(meta), 'a', encoding='utf-8') as f:
+                f.write(line)
+            meta["bytes"] = os.path.getsize(self._path(meta))
+            summarize(meta, entry)
+            self._save_manifest()
+        self.compress_old()
+
+    def _decompress(self, day: str, meta: Dict[str, Any]):
+        plain = f"{day}.jsonl"
+        with gzip.open(self._path(meta), 'rb') as src, open(os.path.join(self.directory, plain), 'wb') as dst:
+            dst.write(src.read())
+        os.unlink(self._path(meta))
+        meta["file"] = plain
+        meta["bytes"] = os.path.getsize(os.path.join(self.directory, plain))
+
+    def compress_old(self, today: Optional[date] = None):
+        """Compresser en gzip les segments plus anciens que compress_after_days"""
+        if not self.compress_after_days:
+            return
+        cutoff = ((today or date.today()) - timedelta(days=self.compress_after_days)).isoformat()
+        with self._lock:
+            changed = False
+            for day, meta in self.segments.items():
+                if day >= cutoff or meta["file"].endswith(".gz"):
+                    continue
+                source = self._path(meta)
+                if not os.path.exists(source):
+                    continue
+                target = source + ".gz"
+                with open(source, 'rb') as src, gzip.open(target, 'wb') as dst:
+                    dst.write(src.read())
+                os.unlink(source)
+                meta["file"] += ".gz"
+                meta["bytes"] = os.path.getsize(target)
+                changed = True
+            if changed:
+                self._save_manifest()
+
+    def reconcile(self):
+        """Recompter les segments non compressés dont la taille ne correspond plus au manifeste"""
+        with self._lock:
+            changed = False
+            for day, meta in self.segments.items():
+                path = self._path(meta)
+                if meta["file"].endswith(".gz") or not os.path.exists(path):
+                    continue
+                size = os.path.getsize(path)
+                if size == meta.get("bytes"):
+                    continue
+                summary = empty_summary()
+                with open(path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        if line.strip():
+                            summarize(summary, json.loads(line))
+                meta.update(summary, bytes=size)
+                changed = True
+            if changed:
+                self._save_manifest()
+
+    def rebuild(self, entries: Iterable[Dict[str, Any]]):
+        """Reconstruire tous les segments depuis un historique complet"""
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            for meta in self.segments.values():
+                try:
+                    os.unlink(self._path(meta))
+                except OSError:
+                    pass
+            self.segments = {}
+            # Le log est chronologique : un seul fichier ouvert à la fois
+            current_day, handle = None, None
+            try:
+                for entry in entries:
+                    day = segment_day(entry)
+                    meta = self.segments.get(day)
+                    if day != current_day:
+                        if handle:
+                            handle.close()
+                        if meta is None:
+                            meta = self.segments[day] = dict(empty_summary(), file=f"{day}.jsonl", bytes=0)
+                            handle = open(self._path(meta), 'w', encoding='utf-8')
+                        else:
+                            handle = open(self._path(meta), 'a', encoding='utf-8')
+                        current_day = day
+                    handle.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                    summarize(meta, entry)
+            finally:
+                if handle:
+                    handle.close()
+            for meta in self.segments.values():
+                meta["bytes"] = os.path.getsize(self._path(meta))
+            self._save_manifest()
+        self.compress_old()
+
+
+def open_segments(directory: str = "opportunity_segments",
+                  log_file: str = "opportunities_log.json") -> SegmentStore:
+    """Ouvrir les segments, en migrant le log JSON existant à la première utilisation"""
+    store = SegmentStore(directory)
+    if store.exists():
+        store.refresh()
+        store.reconcile()
+        return store
+
+    entries = iter_opportunities(log_file) if os.path.exists(log_file) else []
+    try:
+        store.rebuild(entries)
+        print(f"🗂️ Log découpé en {len(store.segments)} segment(s) quotidien(s)")
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Impossible de découper le log existant : {e}")
+    return store
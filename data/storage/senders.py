@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Réputation des expéditeurs et de leurs domaines
+Profils mis à jour à chaque opportunité loggée (SQLite), lus par l'agent depuis un cache mémoire
+"""
+
+import os
+import time
+import sqlite3
+import threading
+from email.utils import parseaddr
+from typing import Dict, Any, Iterable, Optional, Tuple
+
+from core.sketches import sender_domain
+from core.stats import iter_opportunities
+
+SENDER, DOMAIN = "sender", "domain"
+KINDS = (SENDER, DOMAIN)
+
+# Rejet sans appel IA : n'alimente pas le profil (sinon un expéditeur rejeté le resterait pour toujours)
+REPUTATION_ACTION = "Rejetée (réputation)"
+
+# Tris acceptés par query() -> expression SQL
+SORTS = {
+    "count": "count",
+    "acceptance_rate": "CAST(accepted AS REAL) / NULLIF(count, 0)",
+    "avg_pertinence": "CAST(pertinence_sum AS REAL) / NULLIF(pertinence_n, 0)",
+    "replied": "replied",
+    "last_seen": "last_seen",
+    "first_seen": "first_seen",
+}
+
+# Marge (secondes) de rafraîchissement : écriture d'un autre processus horodatée juste avant la nôtre
+REFRESH_MARGIN = 5.0
+
+COUNTERS = ("count", "accepted", "replied", "send_errors", "fast_rejected", "pertinence_sum", "pertinence_n")
+COLUMNS = ("kind", "key", "display") + COUNTERS + ("first_seen", "last_seen")
+
+
+def sender_address(sender: str) -> str:
+    """Adresse normalisée (minuscules), l'en-tête brut à défaut"""
+    address = parseaddr(sender or "")[1]
+    return (address or sender or "inconnu").strip().lower()
+
+
+def describe(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Profil exposé : compteurs et taux dérivés"""
+    count = row["count"]
+    return {
+        "kind": row["kind"],
+        "key": row["key"],
+        "display": row["display"],
+        "count": count,
+        "accepted": row["accepted"],
+        "rejected": count - row["accepted"],
+        "acceptance_rate": round(row["accepted"] / count * 100, 1) if count else None,
+        "avg_pertinence": round(row["pertinence_sum"] / row["pertinence_n"], 2) if row["pertinence_n"] else None,
+        "replied": row["replied"],
+        "send_errors": row["send_errors"],
+        "fast_rejected": row["fast_rejected"],
+        "first_seen": row["first_seen"],
+        "last_seen": row["last_seen"],
+    }
+
+
+class SenderReputation:
+    """Profils par expéditeur et par domaine : volume, acceptation, pertinence, réponses envoyées"""
+
+    def __init__(self, path: str = "sender_reputation.db", cache: bool = True):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS profiles ("
+            "kind TEXT NOT NULL, key TEXT NOT NULL, display TEXT, "
+            "count INTEGER NOT NULL DEFAULT 0, accepted INTEGER NOT NULL DEFAULT 0, "
+            "replied INTEGER NOT NULL DEFAULT 0, send_errors INTEGER NOT NULL DEFAULT 0, "
+            "fast_rejected INTEGER NOT NULL DEFAULT 0, pertinence_sum REAL NOT NULL DEFAULT 0, "
+            "pertinence_n INTEGER NOT NULL DEFAULT 0, first_seen TEXT, last_seen TEXT, "
+            "updated_at REAL NOT NULL, PRIMARY KEY (kind, key)) WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS profiles_count ON profiles(kind, count)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS profiles_last_seen ON profiles(kind, last_seen)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS profiles_updated ON profiles(updated_at)")
+        self._conn.commit()
+
+        # Cache mémoire (agent) : une recherche par email, rafraîchi avec les lignes modifiées ailleurs
+        self._profiles: Optional[Dict[Tuple[str, str], Dict[str, Any]]] = None
+        self._loaded_at = 0.0
+        if cache:
+            self._profiles = {}
+            self.refresh()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT count(*) FROM profiles WHERE kind = ?", (SENDER,)).fetchone()[0]
+
+    def _deltas(self, entry: Dict[str, Any]) -> Iterable[tuple]:
+        raw_sender = entry.get("sender") or ""
+        action = entry.get("action") or ""
+        timestamp = entry.get("timestamp") or None
+        pertinence = entry.get("pertinence")
+        has_pertinence = isinstance(pertinence, (int, float)) and not isinstance(pertinence, bool)
+
+        if action == REPUTATION_ACTION:
+            counters = (0, 0, 0, 0, 1, 0, 0)
+        else:
+            counters = (1, int("✅" in (entry.get("decision") or "")), int(action == "Réponse envoyée"),
+                        int(action == "Erreur envoi"), 0, pertinence if has_pertinence else 0, int(has_pertinence))
+        domain = sender_domain(raw_sender)
+        yield (SENDER, sender_address(raw_sender), raw_sender or None) + counters + (timestamp, timestamp)
+        yield (DOMAIN, domain, domain) + counters + (timestamp, timestamp)
+
+    def _apply(self, conn, rows: Iterable[tuple]):
+        now = time.time()
+        conn.executemany(
+            f"INSERT INTO profiles ({', '.join(COLUMNS)}, updated_at) VALUES ({', '.join('?' * len(COLUMNS))}, ?) "
+            "ON CONFLICT(kind, key) DO UPDATE SET display = COALESCE(excluded.display, display), "
+            + ", ".join(f"{name} = {name} + excluded.{name}" for name in COUNTERS) + ", "
+            "first_seen = min(COALESCE(first_seen, excluded.first_seen), COALESCE(excluded.first_seen, first_seen)), "
+            "last_seen = max(COALESCE(last_seen, excluded.last_seen), COALESCE(excluded.last_seen, last_seen)), "
+            "updated_at = excluded.updated_at",
+            [row + (now,) for row in rows])
+
+    def add(self, entry: Dict[str, Any]):
+        """Prendre en compte une opportunité loggée (profil de l'expéditeur et de son domaine)"""
+        with self._lock:
+            # Incréments côté SQLite : aucun écrasement si un autre processus écrit aussi
+            self._apply(self._conn, self._deltas(entry))
+            self._conn.commit()
+        self.refresh()
+
+    def rebuild(self, entries: Iterable[Dict[str, Any]]):
+        """Reconstruire les profils depuis le log complet"""
+        with self._lock:
+            try:
+                self._conn.execute("DELETE FROM profiles")
+                for entry in entries:
+                    self._apply(self._conn, self._deltas(entry))
+            except Exception:
+                # Log illisible en cours de lecture : profils laissés tels quels
+                self._conn.rollback()
+                raise
+            self._conn.commit()
+        if self._profiles is not None:
+            self._profiles, self._loaded_at = {}, 0.0
+            self.refresh()
+
+    def refresh(self):
+        """Recharger dans le cache les profils modifiés depuis le dernier chargement"""
+        if self._profiles is None:
+            return
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(COLUMNS)}, updated_at FROM profiles WHERE updated_at >= ?",
+                (self._loaded_at - REFRESH_MARGIN,)).fetchall()
+        for row in rows:
+            profile = dict(zip(COLUMNS, row))
+            self._profiles[(profile["kind"], profile["key"])] = profile
+            self._loaded_at = max(self._loaded_at, row[-1])
+
+    def profile(self, sender: str, kind: str = SENDER) -> Optional[Dict[str, Any]]:
+        """Profil brut de l'expéditeur (ou de son domaine), en O(1) depuis le cache"""
+        key = sender_address(sender) if kind == SENDER else sender_domain(sender)
+        if self._profiles is not None:
+            return self._profiles.get((kind, key))
+        with self._lock:
+            row = self._conn.execute(f"SELECT {', '.join(COLUMNS)} FROM profiles WHERE kind = ? AND key = ?",
+                                     (kind, key)).fetchone()
+        return dict(zip(COLUMNS, row)) if row else None
+
+    def priority(self, sender: str) -> float:
+        """Probabilité estimée d'acceptation (lissage de Laplace), domaine à défaut d'historique"""
+        profile = self.profile(sender)
+        if not profile or not profile["count"]:
+            profile = self.profile(sender, DOMAIN)
+        if not profile:
+            return 0.5
+        return (profile["accepted"] + 1) / (profile["count"] + 2)
+
+    def fast_reject(self, sender: str, after: int, below: float) -> Optional[Dict[str, Any]]:
+        """Analyse de substitution si l'expéditeur, jamais retenu, a été rejeté `after` fois sous `below`
+
+        Un email sur after + 1 est tout de même analysé : l'expéditeur peut regagner sa réputation."""
+        profile = self.profile(sender)
+        if not profile or profile["count"] < after or profile["accepted"]:
+            return None
+        if profile["fast_rejected"] >= after * (profile["count"] - after + 1):
+            return None
+        average = profile["pertinence_sum"] / profile["pertinence_n"] if profile["pertinence_n"] else 0
+        if average >= below:
+            return None
+        return {
+            "pertinence": round(average),
+            "decision": "❌ Mission rejetée – expéditeur",
+            "raisons": [f"Expéditeur rejeté {profile['count']} fois (pertinence moyenne {average:.1f})"],
+            "points_attention": []
+        }
+
+    def query(self, kind: str = SENDER, sort: str = "count", descending: bool = True, limit: int = 50,
+              offset: int = 0, min_count: int = 0, search: Optional[str] = None) -> Dict[str, Any]:
+        """Page de profils triés (tri et pagination faits par SQLite sur les index)"""
+        if kind not in KINDS:
+            raise ValueError(f"kind doit être parmi {', '.join(KINDS)}")
+        if sort not in SORTS:
+            raise ValueError(f"sort doit être parmi {', '.join(SORTS)}")
+
+        where, params = "kind = ? AND count >= ?", [kind, min_count]
+        if search:
+            where += " AND (key LIKE ? ESCAPE '\\' OR display LIKE ? ESCAPE '\\')"
+            pattern = "%" + search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            params += [pattern, pattern]
+        direction = "DESC" if descending else "ASC"
+        sql = (f"SELECT {', '.join(COLUMNS)} FROM profiles WHERE {where} "
+               f"ORDER BY {SORTS[sort]} IS NULL, {SORTS[sort]} {direction}, key LIMIT ? OFFSET ?")
+        with self._lock:
+            total = self._conn.execute(f"SELECT count(*) FROM profiles WHERE {where}", params).fetchone()[0]
+            rows = self._conn.execute(sql, params + [limit, offset]).fetchall()
+        return {"total": total, "items": [describe(dict(zip(COLUMNS, row))) for row in rows]}
+
+
+def open_senders(path: str = "sender_reputation.db", log_file: str = "opportunities_log.json",
+                 cache: bool = True) -> SenderReputation:
+    """Ouvrir les profils (construits depuis le log s'ils sont vides)"""
+    store = SenderReputation(path, cache=cache)
+    if store.count() == 0 and os.path.exists(log_file):
+        try:
+            store.rebuild(iter_opportunities(log_file))
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Impossible de calculer la réputation des expéditeurs : {e}")
+    return store
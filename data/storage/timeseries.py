@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Agrégats temporels pré-calculés pour les graphiques d'activité
+Buckets horaires, quotidiens et hebdomadaires mis à jour à chaque opportunité loggée
+"""
+
+import os
+import json
+import bisect
+import tempfile
+import threading
+from datetime import date, datetime, timedelta
+from typing import Dict, Any, Iterable, List, Optional
+
+GRANULARITIES = ("hour", "day", "week")
+
+# Champs additifs d'un bucket (fusionnables par simple somme)
+FIELDS = ("count", "accepted", "pertinence_sum", "pertinence_n", "llm_latency_sum", "llm_latency_n")
+
+
+def bucket_keys(timestamp: str) -> Optional[Dict[str, str]]:
+    """Clés de bucket d'un timestamp ISO, sans re-parser la date complète"""
+    if not timestamp or len(timestamp) < 13:
+        return None
+    try:
+        day = date(int(timestamp[0:4]), int(timestamp[5:7]), int(timestamp[8:10]))
+    except ValueError:
+        return None
+    iso_year, iso_week, _ = day.isocalendar()
+    return {
+        "hour": timestamp[:13],
+        "day": timestamp[:10],
+        "week": f"{iso_year}-W{iso_week:02d}"
+    }
+
+
+def normalize_bound(value: Optional[str], granularity: str) -> Optional[str]:
+    """Convertir une borne ISO (date ou datetime) en clé de bucket comparable"""
+    if not value:
+        return None
+    if granularity == "week":
+        if "-W" in value:
+            return value
+        keys = bucket_keys(value[:10] + "T00")
+        return keys["week"] if keys else None
+    if granularity == "hour":
+        return value[:13] if len(value) >= 13 else value[:10] + "T00"
+    return value[:10]
+
+
+class TimeSeriesRollup:
+    """Agrégats incrémentaux : volume, taux d'acceptation, pertinence et latence IA"""
+
+    def __init__(self, path: str = "timeseries_rollups.json", hourly_retention_days: int = 90):
+        self.path = path
+        self.hourly_retention_days = hourly_retention_days
+        self.buckets = {granularity: {} for granularity in GRANULARITIES}
+        self._sorted_keys = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str = "timeseries_rollups.json", **kwargs) -> "TimeSeriesRollup":
+        """Charger les agrégats depuis le disque (vide si absent ou illisible)"""
+        rollup = cls(path, **kwargs)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for granularity in GRANULARITIES:
+                rollup.buckets[granularity] = data.get(granularity, {})
+        except (OSError, ValueError):
+            pass
+        return rollup
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[Dict[str, Any]], path: str = "timeseries_rollups.json",
+                     **kwargs) -> "TimeSeriesRollup":
+        """Reconstruire les agrégats à partir de l'historique complet"""
+        rollup = cls(path, **kwargs)
+        for entry in entries:
+            rollup.add(entry, prune=False)
+        rollup.prune()
+        return rollup
+
+    def add(self, entry: Dict[str, Any], prune: bool = True):
+        """Ajouter une opportunité loggée à tous les buckets concernés"""
+        keys = bucket_keys(entry.get("timestamp", ""))
+        if not keys:
+            return
+
+        accepted = "✅" in entry.get("decision", "")
+        pertinence = entry.get("pertinence")
+        latency = entry.get("llm_latency_ms")
+
+        with self._lock:
+            for granularity, key in keys.items():
+                series = self.buckets[granularity]
+                bucket = series.get(key)
+                if bucket is None:
+                    bucket = series[key] = dict.fromkeys(FIELDS, 0)
+                    self._sorted_keys.pop(granularity, None)
+                bucket["count"] += 1
+                bucket["accepted"] += int(accepted)
+                if isinstance(pertinence, (int, float)):
+                    bucket["pertinence_sum"] += pertinence
+                    bucket["pertinence_n"] += 1
+                if isinstance(latency, (int, float)):
+                    bucket["llm_latency_sum"] += latency
+                    bucket["llm_latency_n"] += 1
+
+        if prune:
+            self.prune()
+
+    def prune(self):
+        """Limiter la rétention des buckets horaires"""
+        if not self.hourly_retention_days:
+            return
+        cutoff = (datetime.now() - timedelta(days=self.hourly_retention_days)).strftime("%Y-%m-%dT%H")
+        with self._lock:
+            hourly = self.buckets["hour"]
+            expired = [key for key in hourly if key < cutoff]
+            for key in expired:
+                del hourly[key]
+            if expired:
+                self._sorted_keys.pop("hour", None)
+
+    def save(self):
+        """Écrire les agrégats de manière atomique"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        with self._lock:
+            payload = json.dumps(self.buckets, separators=(",", ":"))
+        fd, tmp_path = tempfile.mkstemp(prefix=".rollups.", suffix=".tmp", dir=directory)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(payload)
+        os.replace(tmp_path, self.path)
+
+    def _keys(self, granularity: str) -> List[str]:
+        keys = self._sorted_keys.get(granularity)
+        if keys is None:
+            with self._lock:
+                keys = sorted(self.buckets[granularity])
+            self._sorted_keys[granularity] = keys
+        return keys
+
+    def query(self, granularity: str = "day", start: Optional[str] = None, end: Optional[str] = None,
+              max_points: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Points de la série sur [start, end], regroupés pour ne pas dépasser max_points"""
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Granularité inconnue : {granularity}")
+
+        keys = self._keys(granularity)
+        lo_key = normalize_bound(start, granularity)
+        hi_key = normalize_bound(end, granularity)
+        lo = bisect.bisect_left(keys, lo_key) if lo_key else 0
+        hi = bisect.bisect_right(keys, hi_key) if hi_key else len(keys)
+        selected = keys[lo:hi]
+
+        # Sous-échantillonnage : fusion de buckets consécutifs
+        step = 1
+        if max_points and len(selected) > max_points:
+            step = -(-len(selected) // max_points)
+
+        series = self.buckets[granularity]
+        points = []
+        for i in range(0, len(selected), step):
+            group = selected[i:i + step]
+            merged = dict.fromkeys(FIELDS, 0)
+            for key in group:
+                bucket = series[key]
+                for field in FIELDS:
+                    merged[field] += bucket.get(field, 0)
+            points.append(self._point(group[0], merged))
+        return points
+
+    @staticmethod
+    def _point(key: str, bucket: Dict[str, Any]) -> Dict[str, Any]:
+        count = bucket["count"]
+        return {
+            "bucket": key,
+            "count": count,
+            "accepted": bucket["accepted"],
+            "acceptance_rate": round(bucket["accepted"] / count * 100, 1) if count else 0,
+            "avg_pertinence": round(bucket["pertinence_sum"] / bucket["pertinence_n"], 2) if bucket["pertinence_n"] else None,
+            "avg_llm_latency_ms": round(bucket["llm_latency_sum"] / bucket["llm_latency_n"], 1) if bucket["llm_latency_n"] else None
+        }
+
+
+def load_or_rebuild(path: str = "timeseries_rollups.json",
+                    log_file: str = "opportunities_log.json") -> TimeSeriesRollup:
+    """Charger les agrégats, ou les reconstruire depuis le log s'ils n'existent pas encore"""
+    if os.path.exists(path):
+        return TimeSeriesRollup.load(path)
+
+    entries = []
+    try:
+        with open(log_file, 'r', encoding='utf-8') as f:
+            entries = json.load(f)
+    except (OSError, ValueError):
+        pass
+    return TimeSeriesRollup.from_entries(entries, path)
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Registre de consommation des appels IA
+Tokens, latence et coût de chaque appel, agrégés par jour et par fournisseur
+"""
+
+import os
+import json
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Any, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou entre processus
+    fcntl = None
+
+# Prix par million de tokens (entrée, sortie), surchargés par config["llm"]["prices"]
+DEFAULT_PRICES = {
+    "gpt-3.5-turbo": (0.5, 1.5),
+    "gpt-4o-mini": (0.15, 0.6),
+    "mistral-medium": (2.7, 8.1),
+    "mistral-small": (0.2, 0.6),
+}
+
+AGGREGATE_FIELDS = ("calls", "errors", "prompt_tokens", "completion_tokens", "latency_ms", "cost")
+
+
+def call_cost(model: str, prompt_tokens: int, completion_tokens: int,
+              prices: Optional[Dict[str, Any]] = None) -> float:
+    """Coût d'un appel en dollars (0 si le modèle n'a pas de prix connu)"""
+    price = (prices or {}).get(model) or DEFAULT_PRICES.get(model)
+    if not price:
+        return 0.0
+    return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1_000_000
+
+
+class UsageLedger:
+    """Appels IA en JSONL (un par ligne) et agrégats quotidiens par fournisseur"""
+
+    def __init__(self, path: str = "llm_usage.json", calls_path: Optional[str] = "llm_calls.jsonl",
+                 prices: Optional[Dict[str, Any]] = None):
+        self.path = path
+        self.calls_path = calls_path
+        self.prices = prices or {}
+        self.days = {}
+        self._signature = None
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def _stat_signature(self) -> Optional[tuple]:
+        try:
+            st = os.stat(self.path)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    def refresh(self) -> "UsageLedger":
+        """Relire les agrégats s'ils ont été modifiés par un autre processus"""
+        with self._lock:
+            signature = self._stat_signature()
+            if signature != self._signature:
+                try:
+                    with open(self.path, 'r', encoding='utf-8') as f:
+                        self.days = json.load(f)
+                except (OSError, ValueError):
+                    self.days = {}
+                self._signature = signature
+        return self
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        """Verrou exclusif entre processus (llm_usage.json.lock) le temps d'une lecture-modification-écriture"""
+        if fcntl is None:
+            yield
+            return
+        with open(self.path + ".lock", 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        payload = json.dumps(self.days, separators=(",", ":"))
+        fd, tmp_path = tempfile.mkstemp(prefix=".llm_usage.", suffix=".tmp", dir=directory)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(payload)
+        os.replace(tmp_path, self.path)
+        self._signature = self._stat_signature()
+
+    def record(self, provider: str, model: str, operation: str, prompt_tokens: int = 0,
+               completion_tokens: int = 0, latency_ms: float = 0.0, error: bool = False,
+               email_id: Optional[str] = None) -> Dict[str, Any]:
+        """Enregistrer un appel IA et mettre à jour les agrégats du jour"""
+        now = datetime.now()
+        cost = call_cost(model, prompt_tokens, completion_tokens, self.prices)
+        call = {
+            "timestamp": now.isoformat(),
+            "provider": provider,
+            "model": model,
+            "operation": operation,
+            "email_id": email_id,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "latency_ms": round(latency_ms, 1),
+            "cost": round(cost, 6),
+            "error": error
+        }
+
+        with self._lock, self._file_lock():
+            # Agrégats relus sous le verrou : une autre instance (workers de la file partagée) a pu les modifier
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.days = json.load(f)
+            except (OSError, ValueError):
+                pass
+            if self.calls_path:
+                with open(self.calls_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(call) + "\n")
+
+            day = self.days.setdefault(now.strftime("%Y-%m-%d"), {})
+            totals = day.setdefault(provider, dict.fromkeys(AGGREGATE_FIELDS, 0))
+            totals["calls"] += 1
+            totals["errors"] += int(error)
+            totals["prompt_tokens"] += prompt_tokens
+            totals["completion_tokens"] += completion_tokens
+            totals["latency_ms"] = round(totals["latency_ms"] + latency_ms, 1)
+            totals["cost"] = round(totals["cost"] + cost, 6)
+            self._save()
+        return call
+
+    def totals(self, prefix: str) -> Dict[str, Any]:
+        """Totaux tous fournisseurs confondus pour un jour (AAAA-MM-JJ) ou un mois (AAAA-MM)"""
+        result = dict.fromkeys(AGGREGATE_FIELDS, 0)
+        with self._lock:
+            for day, providers in self.days.items():
+                if not day.startswith(prefix):
+                    continue
+                for totals in providers.values():
+                    for field in AGGREGATE_FIELDS:
+                        result[field] += totals.get(field, 0)
+        result["tokens"] = result["prompt_tokens"] + result["completion_tokens"]
+        result["cost"] = round(result["cost"], 4)
+        return result
+
+    def summary(self, days: int = 30) -> Dict[str, Any]:
+        """Consommation du jour, du mois et détail par jour et fournisseur"""
+        now = datetime.now()
+        with self._lock:
+            recent = {day: self.days[day] for day in sorted(self.days)[-days:]}
+        return {
+            "today": self.totals(now.strftime("%Y-%m-%d")),
+            "month": self.totals(now.strftime("%Y-%m")),
+            "by_day": recent
+        }
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+File de travail locale partagée entre plusieurs instances de l'agent
+SQLite (WAL) : prise en bail, délai de visibilité et acquittement idempotent
+"""
+
+import os
+import json
+import time
+import socket
+import sqlite3
+import threading
+from typing import Dict, Any, Iterable, List, Optional
+
+PENDING, LEASED, DONE, DEAD = "pending", "leased", "done", "dead"
+
+
+def worker_id() -> str:
+    """Identifiant du processus propriétaire des baux"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class WorkQueue:
+    """Emails à traiter : un seul worker les détient à la fois, repris si le bail expire"""
+
+    def __init__(self, path: str = "work_queue.db", visibility_timeout: float = 300.0,
+                 max_attempts: int = 3, owner: Optional[str] = None):
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.owner = owner or worker_id()
+        self._lock = threading.Lock()
+        # Connexion autocommit : les transactions sont ouvertes explicitement (BEGIN IMMEDIATE)
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, payload TEXT NOT NULL, state TEXT NOT NULL DEFAULT 'pending', "
+            "attempts INTEGER NOT NULL DEFAULT 0, owner TEXT, lease_until REAL, available_at REAL NOT NULL, "
+            "enqueued_at REAL NOT NULL, done_at REAL, result TEXT, collected INTEGER NOT NULL DEFAULT 0, "
+            "error TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_ready ON jobs(state, available_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_uncollected ON jobs(collected, state)")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _transaction(self, fn):
+        """Exécuter fn(conn) sous verrou d'écriture SQLite (exclusif entre processus)"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def enqueue(self, items: Iterable[Dict[str, Any]]) -> int:
+        """Ajouter des emails (clé "id") ; un email déjà connu, même terminé, est ignoré"""
+        now = time.time()
+        rows = [(item["id"], json.dumps(item, ensure_ascii=False), now, now) for item in items]
+        if not rows:
+            return 0
+        return self._transaction(lambda conn: conn.executemany(
+            "INSERT OR IGNORE INTO jobs (id, payload, available_at, enqueued_at) VALUES (?, ?, ?, ?)",
+            rows).rowcount)
+
+    def claim(self, limit: int = 1, visibility_timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Prendre à bail jusqu'à `limit` emails disponibles (nouveaux ou dont le bail a expiré)"""
+        timeout = visibility_timeout or self.visibility_timeout
+
+        def take(conn):
+            now = time.time()
+            # Baux expirés : le worker a disparu, l'email redevient disponible (ou abandonné)
+            conn.execute("UPDATE jobs SET state = CASE WHEN attempts >= ? THEN 'dead' ELSE 'pending' END, "
+                         "owner = NULL, error = COALESCE(error, 'bail expiré') "
+                         "WHERE state = 'leased' AND lease_until < ?", (self.max_attempts, now))
+            rows = conn.execute("SELECT id, payload FROM jobs WHERE state = 'pending' "
+                                "AND available_at <= ? ORDER BY enqueued_at, id LIMIT ?",
+                                (now, limit)).fetchall()
+            conn.executemany("UPDATE jobs SET state = 'leased', owner = ?, lease_until = ?, "
+                             "attempts = attempts + 1 WHERE id = ?",
+                             [(self.owner, now + timeout, row[0]) for row in rows])
+            return rows
+
+        return [json.loads(payload) for _, payload in self._transaction(take)]
+
+    def extend(self, job_id: str, visibility_timeout: Optional[float] = None) -> bool:
+        """Prolonger le bail ; False s'il a été perdu (expiré puis repris par un autre worker)"""
+        timeout = visibility_timeout or self.visibility_timeout
+        return self._transaction(lambda conn: conn.execute(
+            "UPDATE jobs SET lease_until = ? WHERE id = ? AND state = 'leased' AND owner = ?",
+            (time.time() + timeout, job_id, self.owner)).rowcount == 1)
+
+    def ack(self, job_id: str, result: Optional[Dict[str, Any]] = None) -> bool:
+        """Marquer terminé ; idempotent (un second acquittement, ou celui d'un bail perdu, est sans effet)"""
+        payload = json.dumps(result, ensure_ascii=False) if result is not None else None
+        return self._transaction(lambda conn: conn.execute(
+            "UPDATE jobs SET state = 'done', done_at = ?, result = ?, owner = NULL, lease_until = NULL "
+            "WHERE id = ? AND state = 'leased' AND owner = ?",
+            (time.time(), payload, job_id, self.owner)).rowcount == 1)
+
+    def nack(self, job_id: str, error: str = "", delay: float = 0.0) -> bool:
+        """Rendre l'email après un échec : nouvel essai après `delay`, abandonné après max_attempts"""
+        return self._transaction(lambda conn: conn.execute(
+            "UPDATE jobs SET state = CASE WHEN attempts >= ? THEN 'dead' ELSE 'pending' END, "
+            "owner = NULL, lease_until = NULL, available_at = ?, error = ? "
+            "WHERE id = ? AND state = 'leased' AND owner = ?",
+            (self.max_attempts, time.time() + delay, error[:500], job_id, self.owner)).rowcount == 1)
+
+    def release(self, job_id: str, delay: float = 0.0) -> bool:
+        """Rendre l'email sans compter d'échec (report faute de budget IA)"""
+        return self._transaction(lambda conn: conn.execute(
+            "UPDATE jobs SET state = 'pending', attempts = max(attempts - 1, 0), owner = NULL, "
+            "lease_until = NULL, available_at = ? WHERE id = ? AND state = 'leased' AND owner = ?",
+            (time.time() + delay, job_id, self.owner)).rowcount == 1)
+
+    def collect(self, limit: int = 500) -> List[Dict[str, Any]]:
+        """Résultats terminés pas encore consignés (écrivain unique du log)"""
+        with self._lock:
+            rows = self._conn.execute("SELECT id, result FROM jobs WHERE collected = 0 AND state = 'done' "
+                                      "ORDER BY done_at LIMIT ?", (limit,)).fetchall()
+        return [{"id": job_id, "result": json.loads(result) if result else None} for job_id, result in rows]
+
+    def mark_collected(self, job_ids: List[str]):
+        if job_ids:
+            self._transaction(lambda conn: conn.executemany(
+                "UPDATE jobs SET collected = 1, result = NULL WHERE id = ?", [(job_id,) for job_id in job_ids]))
+
+    def purge(self, older_than_days: float = 30) -> int:
+        """Supprimer les emails terminés et consignés depuis plus de `older_than_days` jours"""
+        cutoff = time.time() - older_than_days * 86400
+        return self._transaction(lambda conn: conn.execute(
+            "DELETE FROM jobs WHERE state = 'done' AND collected = 1 AND done_at < ?", (cutoff,)).rowcount)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT state, count(*) FROM jobs GROUP BY state").fetchall()
+        counts = dict.fromkeys((PENDING, LEASED, DONE, DEAD), 0)
+        counts.update(dict(rows))
+        return counts
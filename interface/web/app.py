@@ -3,21 +3,114 @@
 Interface Web Ultra-Simple pour l'Agent IA Nocturne
 """
 
-from flask import Flask, render_template_string, request, jsonify, make_response
-import json
+from flask import Flask, render_template, request, jsonify, make_response, g, send_from_directory
 import os
 import sys
-import subprocess
-import psutil
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
 import email.header
 
 app = Flask(__name__)
 
+# Templates compilés une seule fois depuis interface/web/templates
+app.config['TEMPLATES_AUTO_RELOAD'] = False
+
 # Ajouter le répertoire parent au path
 current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_dir)
+project_root = os.path.dirname(parent_dir)
 sys.path.insert(0, parent_dir)
+sys.path.insert(0, project_root)
+
+from core import supervisor
+from core.stats import iter_opportunities
+from utils.config import ConfigStore, ConfigError
+from data.storage.timeseries import TimeSeriesRollup, GRANULARITIES
+from data.storage.search_index import open_index
+from data.storage.senders import open_senders, KINDS as SENDER_KINDS, SORTS as SENDER_SORTS
+from data.storage.columnar import OpportunityColumns, PERIODS, DECISION_FILTERS, period_start, refresh_columns
+from core.sketches import SketchStore
+from data.storage.segments import SegmentStore
+from data.storage.usage_ledger import UsageLedger
+from utils.metrics import Registry, merge_expositions
+from utils.profiling import Profiler, list_reports, CPROFILE, MODES
+
+OPPORTUNITIES_FILE = os.path.join(parent_dir, 'opportunities_log.json')
+ROLLUPS_FILE = os.path.join(parent_dir, 'timeseries_rollups.json')
+SEARCH_INDEX_FILE = os.path.join(parent_dir, 'opportunities_index.db')
+SENDERS_FILE = os.path.join(parent_dir, 'sender_reputation.db')
+COLUMNS_FILE = os.path.join(parent_dir, 'opportunities_columns.bin')
+# Sketches en lecture seule : l'agent est seul à les écrire et à reporter l'historique du log
+sketch_store = SketchStore(os.path.join(parent_dir, 'sketches'))
+segment_store = SegmentStore(os.path.join(parent_dir, 'opportunity_segments'))
+config_store = ConfigStore(os.path.join(parent_dir, 'agent_config.json'))
+usage_ledger = UsageLedger(os.path.join(parent_dir, 'llm_usage.json'), calls_path=None)
+PROFILES_DIR = os.path.join(parent_dir, 'profiles')
+web_profiler = Profiler(PROFILES_DIR, interval=0.001)
+
+# Profilage d'une requête à la demande : en-tête X-Profile ou ?profile= (cprofile|sample),
+# X-Profile-Memory ou ?profile_memory=1 pour l'instantané tracemalloc. Désactivé par défaut
+# (rapports servis sans authentification sous /admin/profiles) : AGENT_WEB_PROFILING=1 pour l'activer
+app.config['PROFILING_ENABLED'] = os.environ.get('AGENT_WEB_PROFILING', '0') != '0'
+
+# Caches indexés sur la génération du fichier de log
+_columns_cache = {"columns": None}
+_opportunities_response = {"key": None, "body": None}
+_fragment_cache = {}
+_rollups_cache = {"signature": None, "rollup": None}
+_search_index = None
+_sender_store = None
+
+# Métriques du processus web (celles de l'agent sont récupérées via son socket de contrôle)
+web_metrics = Registry()
+REQUEST_DURATION = web_metrics.histogram("web_request_duration_seconds", "Durée des requêtes HTTP",
+                                         ["endpoint", "status"])
+CACHE_REQUESTS = web_metrics.counter("web_cache_requests_total", "Accès aux caches du serveur web",
+                                     ["cache", "result"])
+AGENT_UP = web_metrics.gauge("agent_up", "Agent joignable via le socket de contrôle")
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+@app.before_request
+def start_profiling():
+    if not app.config['PROFILING_ENABLED']:
+        return
+    mode = request.headers.get('X-Profile') or request.args.get('profile')
+    memory = (request.headers.get('X-Profile-Memory') or request.args.get('profile_memory')) == '1'
+    if not mode and not memory:
+        return
+    mode = mode if mode in MODES else CPROFILE
+    context = web_profiler.profile(f"{request.method} {request.path}", mode=mode, memory=memory)
+    g.profile_session = context.__enter__()
+    g.profile_context = context
+
+def stop_profiling(exc=None):
+    context = g.pop('profile_context', None)
+    if context is None:
+        return None
+    if exc is None:
+        context.__exit__(None, None, None)
+    else:
+        context.__exit__(type(exc), exc, exc.__traceback__)
+    return g.profile_session["report"]
+
+@app.after_request
+def record_request(response):
+    start = getattr(g, 'request_start', None)
+    if start is not None:
+        REQUEST_DURATION.observe(time.perf_counter() - start,
+                                 endpoint=request.endpoint or "unknown", status=response.status_code)
+    report = stop_profiling()
+    if report:
+        response.headers['X-Profile-Report'] = report
+    return response
+
+@app.teardown_request
+def abort_profiling(exc):
+    # Requête interrompue par une exception : le profil est tout de même écrit
+    stop_profiling(exc)
 
 def decode_email_subject(subject: str) -> str:
     """Décoder le sujet d'email encodé"""
@@ -39,32 +132,101 @@ def decode_email_subject(subject: str) -> str:
     except Exception as e:
         return subject
 
-def load_opportunities():
-    """Charger les opportunités"""
+def log_generation():
+    """Génération du fichier de log (mtime + taille), change à chaque écriture"""
     try:
-        opportunities_file = os.path.join(parent_dir, 'opportunities_log.json')
-        if os.path.exists(opportunities_file):
-            with open(opportunities_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return []
-    except Exception as e:
-        print(f"❌ Erreur chargement opportunités: {e}")
-        return []
-
-def calculate_stats(opportunities):
-    """Calculer les statistiques"""
+        st = os.stat(OPPORTUNITIES_FILE)
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+def load_opportunities() -> OpportunityColumns:
+    """Opportunités en colonnes (réencodées seulement si le log a changé, partagées entre workers via COLUMNS_FILE)"""
+    generation = log_generation()
+    cached = _columns_cache["columns"]
+    if cached is not None and cached.generation == generation:
+        CACHE_REQUESTS.inc(cache="opportunities", result="hit")
+        return cached
+    CACHE_REQUESTS.inc(cache="opportunities", result="miss")
+    
+    # Forme sur disque déjà écrite pour cette génération par un autre worker : simple projection mmap
+    columns = OpportunityColumns.load(COLUMNS_FILE) if generation is not None else None
+    if columns is None or columns.generation != generation:
+        base = cached if cached is not None else columns
+        try:
+            # Le log ne fait que s'allonger : lu en flux, seules les nouvelles entrées sont encodées
+            read_entries = (lambda: iter_opportunities(OPPORTUNITIES_FILE)) if generation is not None else tuple
+            columns = refresh_columns(base, read_entries, generation)
+        except Exception as e:
+            print(f"❌ Erreur chargement opportunités: {e}")
+            return OpportunityColumns.from_entries(())
+        if generation is not None:
+            try:
+                columns.save(COLUMNS_FILE)
+            except OSError as e:
+                print(f"⚠️ Impossible d'écrire le modèle en colonnes : {e}")
+    _columns_cache["columns"] = columns
+    return columns
+
+def request_filters():
+    """Filtres de la requête (period, decision, sender) au format de OpportunityColumns.select"""
+    period = request.args.get('period', 'all')
+    decision = request.args.get('decision', 'all')
+    sender = request.args.get('sender', 'all').strip()
+    if period not in PERIODS:
+        raise ValueError(f"period doit être parmi {', '.join(PERIODS)}")
+    if decision != 'all' and decision not in DECISION_FILTERS:
+        raise ValueError(f"decision doit être parmi all, {', '.join(DECISION_FILTERS)}")
+    return {"since": period_start(period), "decision": None if decision == 'all' else decision,
+            "sender": None if sender in ('', 'all') else sender}
+
+def load_rollups():
+    """Agrégats temporels écrits par l'agent, reconstruits depuis le log s'ils sont absents"""
     try:
-        total = len(opportunities)
-        accepted = sum(1 for opp in opportunities if opp.get('decision', '').startswith('✅'))
-        rejected = sum(1 for opp in opportunities if opp.get('decision', '').startswith('❌'))
+        st = os.stat(ROLLUPS_FILE)
+        signature = ("file", st.st_mtime_ns, st.st_size)
+    except OSError:
+        signature = ("log", log_generation())
+    
+    CACHE_REQUESTS.inc(cache="rollups", result="miss" if signature != _rollups_cache["signature"] else "hit")
+    if signature != _rollups_cache["signature"]:
+        if signature[0] == "file":
+            rollup = TimeSeriesRollup.load(ROLLUPS_FILE)
+        else:
+            rollup = TimeSeriesRollup.from_entries(load_opportunities(), ROLLUPS_FILE)
+        _rollups_cache["rollup"] = rollup
+        _rollups_cache["signature"] = signature
+    return _rollups_cache["rollup"]
+
+def render_fragment(name, generation, context_factory):
+    """Rendre un fragment HTML, mis en cache pour une génération du log donnée"""
+    cached = _fragment_cache.get(name)
+    if cached and cached[0] == generation:
+        CACHE_REQUESTS.inc(cache=f"fragment:{name}", result="hit")
+        return cached[1]
+    CACHE_REQUESTS.inc(cache=f"fragment:{name}", result="miss")
+    html = render_template(f"fragments/{name}.html", **context_factory())
+    _fragment_cache[name] = (generation, html)
+    return html
+
+def calculate_stats(columns, selection=None):
+    """Calculer les statistiques (agrégats sur les colonnes, restreints à la sélection)"""
+    try:
+        total = columns.count(selection)
+        decisions = columns.value_counts('decision', selection)
+        accepted = sum(count for decision, count in decisions.items() if decision.startswith('✅'))
+        rejected = sum(count for decision, count in decisions.items() if decision.startswith('❌'))
         
-        # Calculer la pertinence moyenne
-        pertinences = [opp.get('pertinence', 0) for opp in opportunities if opp.get('pertinence')]
-        avg_relevance = sum(pertinences) / len(pertinences) if pertinences else 0
+        # Pertinence moyenne (valeurs non nulles) et distribution
+        avg_relevance, distribution = columns.pertinence(selection)
         
-        # Compter les opportunités d'aujourd'hui
-        today = datetime.now().strftime('%Y-%m-%d')
-        today_count = sum(1 for opp in opportunities if opp.get('timestamp', '').startswith(today))
+        # Compter les opportunités d'aujourd'hui (manifeste des segments, sinon colonne des horodatages)
+        midnight = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        if selection is None and segment_store.refresh().exists():
+            today_count = segment_store.count(midnight.strftime('%Y-%m-%d'))
+        else:
+            today_count = columns.count_between(midnight.timestamp(), (midnight + timedelta(days=1)).timestamp(),
+                                                selection)
         
         return {
             "total": total,
@@ -72,6 +234,7 @@ def calculate_stats(opportunities):
             "rejected": rejected,
             "avg_relevance": round(avg_relevance, 1),
             "today_count": today_count,
+            "decisions": dict(decisions),
             "performance": {
                 "missions_retenues": accepted,
                 "reponses_envoyees": accepted,
@@ -79,7 +242,8 @@ def calculate_stats(opportunities):
                 "taux_reponse": round((accepted / total * 100) if total > 0 else 0, 1)
             },
             "pertinence": {
-                "moyenne": avg_relevance
+                "moyenne": avg_relevance,
+                "distribution": dict(sorted(distribution.items()))
             }
         }
     except Exception as e:
@@ -104,680 +268,45 @@ def calculate_stats(opportunities):
 def check_agent_status() -> bool:
     """Vérifier si l'agent est en cours d'exécution"""
     try:
-        for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
-            try:
-                cmdline = proc.info['cmdline']
-                if cmdline and any('agent-nocturne-python.py' in arg for arg in cmdline):
-                    return True
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                continue
-        return False
+        return supervisor.agent_status(parent_dir)["running"]
     except Exception as e:
         print(f"❌ Erreur vérification statut : {e}")
         return False
 
-# HTML de la page d'administration
-ADMIN_HTML = """
-<!DOCTYPE html>
-<html lang="fr">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>🤖 Agent IA Nocturne - Administration</title>
-    <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
-    <link href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0/css/all.min.css" rel="stylesheet">
-    <style>
-        :root {
-            --primary-color: #2563eb;
-            --secondary-color: #10b981;
-            --accent-color: #f59e0b;
-            --bg-color: #f8fafc;
-            --card-bg: #ffffff;
-        }
-        
-        body {
-            background-color: var(--bg-color);
-            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-        }
-        
-        .navbar-brand {
-            font-weight: bold;
-            color: var(--primary-color) !important;
-        }
-        
-        .card {
-            border: none;
-            border-radius: 12px;
-            box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
-            transition: transform 0.2s;
-        }
-        
-        .card:hover {
-            transform: translateY(-2px);
-        }
-        
-        .form-control:focus {
-            border-color: var(--primary-color);
-            box-shadow: 0 0 0 0.2rem rgba(37, 99, 235, 0.25);
-        }
-        
-        .btn-primary {
-            background-color: var(--primary-color);
-            border-color: var(--primary-color);
-        }
-        
-        .btn-primary:hover {
-            background-color: #1d4ed8;
-            border-color: #1d4ed8;
-        }
-    </style>
-</head>
-<body>
-    <!-- Navigation -->
-    <nav class="navbar navbar-expand-lg navbar-light bg-white shadow-sm">
-        <div class="container">
-            <a class="navbar-brand" href="/">
-                <i class="fas fa-robot me-2"></i>
-                Agent IA Nocturne
-            </a>
-            <div class="navbar-nav ms-auto">
-                <a class="nav-link" href="/">
-                    <i class="fas fa-chart-line me-1"></i>
-                    Dashboard
-                </a>
-                <a class="nav-link active" href="/admin">
-                    <i class="fas fa-cog me-1"></i>
-                    Administration
-                </a>
-            </div>
-        </div>
-    </nav>
-
-    <!-- Contenu Principal -->
-    <div class="container mt-4">
-        <div class="row">
-            <div class="col-12">
-                <div class="card">
-                    <div class="card-header">
-                        <h4 class="mb-0">
-                            <i class="fas fa-cog me-2"></i>
-                            Configuration de l'Agent
-                        </h4>
-                    </div>
-                    <div class="card-body">
-                        <form id="configForm">
-                            <!-- Configuration Email -->
-                            <div class="row mb-4">
-                                <div class="col-12">
-                                    <h5 class="border-bottom pb-2">
-                                        <i class="fas fa-envelope me-2"></i>
-                                        Configuration Email
-                                    </h5>
-                                </div>
-                                <div class="col-md-6 mb-3">
-                                    <label for="email" class="form-label">Adresse Email</label>
-                                    <input type="email" class="form-control" id="email" name="email" 
-                                           value="{{ config.get('email', '') }}" 
-                                           placeholder="votre-email@gmail.com">
-                                </div>
-                                <div class="col-md-6 mb-3">
-                                    <label for="app_password" class="form-label">Mot de passe d'application</label>
-                                    <input type="password" class="form-control" id="app_password" name="app_password" 
-                                           value="{{ config.get('app_password', '') }}" 
-                                           placeholder="Mot de passe d'application Gmail">
-                                </div>
-                            </div>
-
-                            <!-- Configuration API -->
-                            <div class="row mb-4">
-                                <div class="col-12">
-                                    <h5 class="border-bottom pb-2">
-                                        <i class="fas fa-key me-2"></i>
-                                        Clés API
-                                    </h5>
-                                </div>
-                                <div class="col-md-6 mb-3">
-                                    <label for="openai_api_key" class="form-label">Clé API OpenAI</label>
-                                    <input type="password" class="form-control" id="openai_api_key" name="openai_api_key" 
-                                           value="{{ config.get('openai_api_key', '') }}" 
-                                           placeholder="sk-...">
-                                </div>
-                                <div class="col-md-6 mb-3">
-                                    <label for="mistral_api_key" class="form-label">Clé API Mistral</label>
-                                    <input type="password" class="form-control" id="mistral_api_key" name="mistral_api_key" 
-                                           value="{{ config.get('mistral_api_key', '') }}" 
-                                           placeholder="Clé API Mistral">
-                                </div>
-                            </div>
-
-                            <!-- Configuration Telegram -->
-                            <div class="row mb-4">
-                                <div class="col-12">
-                                    <h5 class="border-bottom pb-2">
-                                        <i class="fas fa-paper-plane me-2"></i>
-                                        Notifications Telegram (Optionnel)
-                                    </h5>
-                                </div>
-                                <div class="col-md-6 mb-3">
-                                    <label for="telegram_bot_token" class="form-label">Token Bot Telegram</label>
-                                    <input type="text" class="form-control" id="telegram_bot_token" name="telegram_bot_token" 
-                                           value="{{ config.get('telegram_bot_token', '') }}" 
-                                           placeholder="123456789:ABCdefGHIjklMNOpqrsTUVwxyz">
-                                </div>
-                                <div class="col-md-6 mb-3">
-                                    <label for="telegram_chat_id" class="form-label">Chat ID Telegram</label>
-                                    <input type="text" class="form-control" id="telegram_chat_id" name="telegram_chat_id" 
-                                           value="{{ config.get('telegram_chat_id', '') }}" 
-                                           placeholder="123456789">
-                                </div>
-                            </div>
-
-                            <!-- Configuration Signature -->
-                            <div class="row mb-4">
-                                <div class="col-12">
-                                    <h5 class="border-bottom pb-2">
-                                        <i class="fas fa-signature me-2"></i>
-                                        Signature Email
-                                    </h5>
-                                </div>
-                                <div class="col-12 mb-3">
-                                    <label for="email_signature" class="form-label">Signature des emails</label>
-                                    <textarea class="form-control" id="email_signature" name="email_signature" rows="4" 
-                                              placeholder="Signature qui sera ajoutée aux emails envoyés">{{ config.get('email_signature', 'Agent IA Nocturne - Développeur Backend Python/IA') }}</textarea>
-                                </div>
-                            </div>
-
-                            <!-- Boutons d'action -->
-                            <div class="row">
-                                <div class="col-12">
-                                    <div class="d-flex justify-content-between">
-                                        <button type="button" class="btn btn-secondary" onclick="testEmail()">
-                                            <i class="fas fa-envelope me-1"></i>
-                                            Tester Email
-                                        </button>
-                                        <div>
-                                            <button type="button" class="btn btn-outline-primary me-2" onclick="window.location.href='/'">
-                                                <i class="fas fa-arrow-left me-1"></i>
-                                                Retour Dashboard
-                                            </button>
-                                            <button type="submit" class="btn btn-primary">
-                                                <i class="fas fa-save me-1"></i>
-                                                Sauvegarder
-                                            </button>
-                                        </div>
-                                    </div>
-                                </div>
-                            </div>
-                        </form>
-                    </div>
-                </div>
-            </div>
-        </div>
-    </div>
-
-    <!-- Bootstrap JS -->
-    <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js"></script>
-    
-    <script>
-        // Sauvegarder la configuration
-        document.getElementById('configForm').addEventListener('submit', function(e) {
-            e.preventDefault();
-            
-            const formData = new FormData(this);
-            const config = {};
-            
-            for (let [key, value] of formData.entries()) {
-                config[key] = value;
-            }
-            
-            fetch('/api/config', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json'
-                },
-                body: JSON.stringify(config)
-            })
-            .then(response => response.json())
-            .then(data => {
-                if (data.success) {
-                    alert('Configuration saved successfully');
-                } else {
-                    alert('Erreur: ' + data.message);
-                }
-            })
-            .catch(error => {
-                alert('Erreur lors de la sauvegarde');
-            });
-        });
-
-        // Tester la configuration email
-        function testEmail() {
-            const email = document.getElementById('email').value;
-            const appPassword = document.getElementById('app_password').value;
-            
-            if (!email || !appPassword) {
-                alert('Veuillez remplir l\'email et le mot de passe d\'application');
-                return;
-            }
-            
-            fetch('/api/email/test', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json'
-                },
-                body: JSON.stringify({
-                    email: email,
-                    app_password: appPassword
-                })
-            })
-            .then(response => response.json())
-            .then(data => {
-                if (data.success) {
-                    alert('Email test successful!');
-                } else {
-                    alert('Erreur test email: ' + data.message);
-                }
-            })
-            .catch(error => {
-                alert('Erreur lors du test email');
-            });
-        }
-
-        // Demarrer l'agent
-        function startAgent() {
-            fetch('/api/agent/start', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json'
-                }
-            })
-            .then(response => response.json())
-            .then(data => {
-                if (data.success) {
-                    alert('Agent started successfully');
-                    location.reload();
-                } else {
-                    alert('Error: ' + data.message);
-                }
-            })
-            .catch(error => {
-                alert('Error starting agent');
-            });
-        }
-
-        // Arreter l'agent
-        function stopAgent() {
-            fetch('/api/agent/stop', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json'
-                }
-            })
-            .then(response => response.json())
-            .then(data => {
-                if (data.success) {
-                    alert('Agent stopped successfully');
-                    location.reload();
-                } else {
-                    alert('Error: ' + data.message);
-                }
-            })
-            .catch(error => {
-                alert('Error stopping agent');
-            });
-        }
-    </script>
-</body>
-</html>
-"""
-
-# HTML du dashboard
-DASHBOARD_HTML = """
-<!DOCTYPE html>
-<html lang="fr">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>🤖 Agent IA Nocturne - Dashboard</title>
-    <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
-    <link href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0/css/all.min.css" rel="stylesheet">
-    <style>
-        :root {
-            --primary-color: #2563eb;
-            --secondary-color: #10b981;
-            --accent-color: #f59e0b;
-            --bg-color: #f8fafc;
-            --card-bg: #ffffff;
-        }
-        
-        body {
-            background-color: var(--bg-color);
-            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-        }
-        
-        .navbar-brand {
-            font-weight: bold;
-            color: var(--primary-color) !important;
-        }
-        
-        .card {
-            border: none;
-            border-radius: 12px;
-            box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
-            transition: transform 0.2s;
-        }
-        
-        .card:hover {
-            transform: translateY(-2px);
-        }
-        
-        .stat-card {
-            background: linear-gradient(135deg, var(--primary-color), #1d4ed8);
-            color: white;
-        }
-        
-        .stat-card.success {
-            background: linear-gradient(135deg, var(--secondary-color), #059669);
-        }
-        
-        .stat-card.warning {
-            background: linear-gradient(135deg, var(--accent-color), #d97706);
-        }
-        
-        .status-indicator {
-            width: 12px;
-            height: 12px;
-            border-radius: 50%;
-            display: inline-block;
-            margin-right: 8px;
-        }
-        
-        .status-running {
-            background-color: var(--secondary-color);
-            animation: pulse 2s infinite;
-        }
-        
-        .status-stopped {
-            background-color: #ef4444;
-        }
-        
-        @keyframes pulse {
-            0% { opacity: 1; }
-            50% { opacity: 0.5; }
-            100% { opacity: 1; }
-        }
-        
-        .opportunity-item {
-            border-left: 4px solid var(--primary-color);
-            padding: 12px;
-            margin-bottom: 8px;
-            background-color: var(--card-bg);
-            border-radius: 0 8px 8px 0;
-        }
-        
-        .opportunity-item.success {
-            border-left-color: var(--secondary-color);
-        }
-        
-        .opportunity-item.warning {
-            border-left-color: var(--accent-color);
-        }
-    </style>
-</head>
-<body>
-    <!-- Navigation -->
-    <nav class="navbar navbar-expand-lg navbar-light bg-white shadow-sm">
-        <div class="container">
-            <a class="navbar-brand" href="/">
-                <i class="fas fa-robot me-2"></i>
-                Agent IA Nocturne
-            </a>
-            <div class="navbar-nav ms-auto">
-                <a class="nav-link active" href="/">
-                    <i class="fas fa-chart-line me-1"></i>
-                    Dashboard
-                </a>
-                <a class="nav-link" href="/admin">
-                    <i class="fas fa-cog me-1"></i>
-                    Administration
-                </a>
-            </div>
-        </div>
-    </nav>
-
-    <!-- Contenu Principal -->
-    <div class="container mt-4">
-        <!-- En-tête avec statut de l'agent -->
-        <div class="row mb-4">
-            <div class="col-12">
-                <div class="card">
-                    <div class="card-body">
-                        <div class="d-flex justify-content-between align-items-center">
-                            <div>
-                                <h4 class="mb-1">
-                                    <span class="status-indicator {% if agent_running %}status-running{% else %}status-stopped{% endif %}"></span>
-                                    Statut de l'Agent
-                                </h4>
-                                <p class="text-muted mb-0">
-                                    {% if agent_running %}
-                                        Agent actif - Surveillance en cours
-                                    {% else %}
-                                        Agent arrêté - Aucune surveillance
-                                    {% endif %}
-                                </p>
-                            </div>
-                            <div>
-                                {% if agent_running %}
-                                    <button class="btn btn-danger" onclick="stopAgent()">
-                                        <i class="fas fa-stop me-1"></i>
-                                        Arrêter
-                                    </button>
-                                {% else %}
-                                    <button class="btn btn-success" onclick="startAgent()">
-                                        <i class="fas fa-play me-1"></i>
-                                        Démarrer
-                                    </button>
-                                {% endif %}
-                            </div>
-                        </div>
-                    </div>
-                </div>
-            </div>
-        </div>
-
-        <!-- Statistiques principales -->
-        <div class="row mb-4">
-            <div class="col-md-3 mb-3">
-                <div class="card stat-card">
-                    <div class="card-body">
-                        <div class="d-flex justify-content-between">
-                            <div>
-                                <h6 class="card-title text-white-50">Total Opportunités</h6>
-                                <h3 class="mb-0 text-white">{{ stats.total }}</h3>
-                            </div>
-                            <div class="align-self-center">
-                                <i class="fas fa-envelope fa-2x text-white-50"></i>
-                            </div>
-                        </div>
-                    </div>
-                </div>
-            </div>
-            
-            <div class="col-md-3 mb-3">
-                <div class="card stat-card success">
-                    <div class="card-body">
-                        <div class="d-flex justify-content-between">
-                            <div>
-                                <h6 class="card-title text-white-50">Missions Retenues</h6>
-                                <h3 class="mb-0 text-white">{{ stats.performance.missions_retenues }}</h3>
-                            </div>
-                            <div class="align-self-center">
-                                <i class="fas fa-check-circle fa-2x text-white-50"></i>
-                            </div>
-                        </div>
-                    </div>
-                </div>
-            </div>
-            
-            <div class="col-md-3 mb-3">
-                <div class="card stat-card warning">
-                    <div class="card-body">
-                        <div class="d-flex justify-content-between">
-                            <div>
-                                <h6 class="card-title text-white-50">Missions Rejetées</h6>
-                                <h3 class="mb-0 text-white">{{ stats.rejected }}</h3>
-                            </div>
-                            <div class="align-self-center">
-                                <i class="fas fa-times-circle fa-2x text-white-50"></i>
-                            </div>
-                        </div>
-                    </div>
-                </div>
-            </div>
-            
-            <div class="col-md-3 mb-3">
-                <div class="card stat-card">
-                    <div class="card-body">
-                        <div class="d-flex justify-content-between">
-                            <div>
-                                <h6 class="card-title text-white-50">Pertinence Moyenne</h6>
-                                <h3 class="mb-0 text-white">{{ "%.1f"|format(stats.pertinence.moyenne) }}/10</h3>
-                            </div>
-                            <div class="align-self-center">
-                                <i class="fas fa-chart-line fa-2x text-white-50"></i>
-                            </div>
-                        </div>
-                    </div>
-                </div>
-            </div>
-        </div>
-
-        <!-- Opportunités récentes -->
-        <div class="row">
-            <div class="col-12">
-                <div class="card">
-                    <div class="card-header">
-                        <h5 class="mb-0">
-                            <i class="fas fa-clock me-2"></i>
-                            Opportunités Récentes
-                        </h5>
-                    </div>
-                    <div class="card-body">
-                        {% if opportunities %}
-                            {% for opp in opportunities[-5:] %}
-                                <div class="opportunity-item {% if '✅' in opp.decision %}success{% else %}warning{% endif %}">
-                                    <div class="d-flex justify-content-between align-items-start">
-                                        <div class="flex-grow-1">
-                                            <div class="fw-bold">{{ decode_subject(opp.subject) }}</div>
-                                            <small class="text-muted">{{ opp.timestamp }}</small>
-                                        </div>
-                                        <span class="badge {% if '✅' in opp.decision %}bg-success{% else %}bg-warning{% endif %}">
-                                            {{ opp.pertinence }}/10
-                                        </span>
-                                    </div>
-                                </div>
-                            {% endfor %}
-                        {% else %}
-                            <div class="text-center text-muted">
-                                <i class="fas fa-inbox fa-3x mb-3"></i>
-                                <p>Aucune opportunité pour le moment</p>
-                            </div>
-                        {% endif %}
-                    </div>
-                </div>
-            </div>
-        </div>
-    </div>
-
-    <!-- Bootstrap JS -->
-    <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js"></script>
-    
-    <script>
-        // Démarrer l'agent
-        function startAgent() {
-            fetch('/api/agent/start', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json'
-                }
-            })
-            .then(response => response.json())
-            .then(data => {
-                if (data.success) {
-                    alert('Agent started successfully');
-                    location.reload();
-                } else {
-                    alert('Erreur: ' + data.message);
-                }
-            })
-            .catch(error => {
-                                    alert('Error starting agent');
-            });
-        }
-
-        // Arrêter l'agent
-        function stopAgent() {
-            fetch('/api/agent/stop', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json'
-                }
-            })
-            .then(response => response.json())
-            .then(data => {
-                if (data.success) {
-                    alert('Agent stopped successfully');
-                    location.reload();
-                } else {
-                    alert('Erreur: ' + data.message);
-                }
-            })
-            .catch(error => {
-                                    alert('Error stopping agent');
-            });
-        }
-
-        // Actualiser les statistiques
-        function refreshStats() {
-            fetch('/api/stats')
-            .then(response => response.json())
-            .then(data => {
-                console.log('Stats actualisées:', data);
-            })
-            .catch(error => {
-                console.error('Erreur actualisation stats:', error);
-            });
-        }
-
-        // Actualiser automatiquement toutes les 30 secondes
-        setInterval(refreshStats, 30000);
-    </script>
-</body>
-</html>
-"""
-
 @app.route('/admin')
 def admin_page():
     """Page d'administration"""
     config = load_agent_config()
-    response = make_response(render_template_string(ADMIN_HTML, config=config))
+    response = make_response(render_template('admin.html', config=config,
+                                             profiles=list_reports(PROFILES_DIR, limit=15)))
     response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
     response.headers['Pragma'] = 'no-cache'
     response.headers['Expires'] = '0'
     return response
 
+@app.route('/admin/profiles/<path:filename>')
+def download_profile(filename):
+    """Rapport de profilage (.txt, .prof pour pstats/snakeviz, .folded pour flamegraph)"""
+    return send_from_directory(PROFILES_DIR, filename, as_attachment=not filename.endswith('.txt'))
+
 @app.route('/')
 def dashboard():
     """Page d'accueil avec dashboard"""
-    opportunities = load_opportunities()
-    stats = calculate_stats(opportunities)
+    generation = log_generation()
     agent_running = check_agent_status()
     
-    response = make_response(render_template_string(DASHBOARD_HTML, 
-                                 stats=stats,
-                                 opportunities=opportunities,
+    # Le compteur du jour change à minuit même sans nouvelle entrée
+    stat_cards_html = render_fragment(
+        "stat_cards", (generation, datetime.now().strftime('%Y-%m-%d')),
+        lambda: {"stats": calculate_stats(load_opportunities())})
+    opportunity_list_html = render_fragment(
+        "opportunity_list", generation,
+        lambda: {"opportunities": load_opportunities().tail(5), "decode_subject": decode_email_subject})
+    
+    response = make_response(render_template('dashboard_simple.html',
                                  agent_running=agent_running,
-                                 decode_subject=decode_email_subject))
+                                 stat_cards_html=stat_cards_html,
+                                 opportunity_list_html=opportunity_list_html))
     response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
     response.headers['Pragma'] = 'no-cache'
     response.headers['Expires'] = '0'
@@ -785,30 +314,127 @@ def dashboard():
 
 @app.route('/api/stats', methods=['GET'])
 def api_get_stats():
-    """API : Obtenir les statistiques"""
+    """API : Obtenir les statistiques (filtres period=all|today|week|month, decision=all|retained|rejected, sender)"""
+    try:
+        filters = request_filters()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
     try:
-        opportunities = load_opportunities()
-        stats = calculate_stats(opportunities)
+        columns = load_opportunities()
+        selection = columns.select(**filters)
+        stats = calculate_stats(columns, selection)
+        
+        # Consommation IA (tokens, coût) et budgets configurés
+        stats["llm_usage"] = usage_ledger.refresh().summary(days=request.args.get('days', 30, type=int))
+        stats["llm_usage"]["budget"] = load_agent_config().get("llm", {}).get("budget", {})
+        
+        # Top expéditeurs comptés sur la colonne, avec ou sans filtre (mêmes opportunités que "total")
+        stats["senders"] = dict(columns.value_counts('sender', selection).most_common(10))
         return jsonify(stats)
     except Exception as e:
         return jsonify({"error": str(e)})
 
+@app.route('/api/stats/approx', methods=['GET'])
+def api_get_approx_stats():
+    """API : Statistiques approximatives (sketches quotidiens fusionnés sur from/to)"""
+    try:
+        return jsonify(sketch_store.query(request.args.get('from'), request.args.get('to')))
+    except Exception as e:
+        return jsonify({"error": str(e)})
+
+@app.route('/api/timeseries', methods=['GET'])
+def api_get_timeseries():
+    """API : Série temporelle pré-agrégée (granularity=hour|day|week, from, to, points)"""
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in GRANULARITIES:
+        return jsonify({"error": f"granularity doit être parmi {', '.join(GRANULARITIES)}"}), 400
+    
+    try:
+        points = load_rollups().query(granularity,
+                                      start=request.args.get('from'),
+                                      end=request.args.get('to'),
+                                      max_points=request.args.get('points', 500, type=int))
+        return jsonify({"granularity": granularity, "points": points})
+    except Exception as e:
+        return jsonify({"error": str(e)})
+
+@app.route('/api/search', methods=['GET'])
+def api_search():
+    """API : Recherche plein texte (q, limit, offset) avec extraits surlignés"""
+    global _search_index
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "Paramètre q requis"}), 400
+    
+    try:
+        if _search_index is None:
+            _search_index = open_index(SEARCH_INDEX_FILE, OPPORTUNITIES_FILE)
+        if _search_index is None:
+            return jsonify({"error": "Recherche plein texte indisponible"}), 503
+        
+        limit = min(request.args.get('limit', 20, type=int), 100)
+        offset = request.args.get('offset', 0, type=int)
+        start = time.perf_counter()
+        results = _search_index.search(query, limit=limit, offset=offset)
+        took_ms = (time.perf_counter() - start) * 1000
+        return jsonify({"query": query, "results": results, "took_ms": round(took_ms, 2)})
+    except Exception as e:
+        return jsonify({"error": str(e)})
+
+def sender_store():
+    """Profils d'expéditeurs tenus à jour par l'agent (calculés depuis le log au premier accès)"""
+    global _sender_store
+    if _sender_store is None:
+        _sender_store = open_senders(SENDERS_FILE, OPPORTUNITIES_FILE, cache=False)
+    return _sender_store
+
+@app.route('/api/senders', methods=['GET'])
+def api_get_senders():
+    """API : Réputation des expéditeurs (kind=sender|domain, sort, order=asc|desc, limit, offset, min_count, q)"""
+    kind = request.args.get('kind', 'sender')
+    sort = request.args.get('sort', 'count')
+    order = request.args.get('order', 'desc')
+    if kind not in SENDER_KINDS:
+        return jsonify({"error": f"kind doit être parmi {', '.join(SENDER_KINDS)}"}), 400
+    if sort not in SENDER_SORTS:
+        return jsonify({"error": f"sort doit être parmi {', '.join(SENDER_SORTS)}"}), 400
+    if order not in ('asc', 'desc'):
+        return jsonify({"error": "order doit être asc ou desc"}), 400
+    
+    try:
+        limit = max(1, min(request.args.get('limit', 50, type=int), 200))
+        offset = max(0, request.args.get('offset', 0, type=int))
+        page = sender_store().query(kind, sort, descending=order == 'desc', limit=limit, offset=offset,
+                                    min_count=request.args.get('min_count', 0, type=int),
+                                    search=request.args.get('q', '').strip() or None)
+        return jsonify({"kind": kind, "sort": sort, "order": order, "limit": limit, "offset": offset, **page})
+    except Exception as e:
+        return jsonify({"error": str(e)})
+
 @app.route('/api/opportunities', methods=['GET'])
 def api_get_opportunities():
-    """API : Obtenir les opportunités récentes"""
+    """API : Obtenir les opportunités récentes (limit, mêmes filtres que /api/stats)"""
     try:
-        opportunities = load_opportunities()
-        limit = request.args.get('limit', type=int)
-        
-        if limit:
-            opportunities = opportunities[-limit:]
+        filters = request_filters()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    try:
+        columns = load_opportunities()
         
-        # Décoder les sujets d'email
-        for opp in opportunities:
-            if 'subject' in opp:
-                opp['subject'] = decode_email_subject(opp['subject'])
+        # Réponse sérialisée réutilisée tant que le log et les paramètres sont les mêmes (rafraîchissement auto)
+        key = (columns.generation, request.query_string)
+        CACHE_REQUESTS.inc(cache="opportunities_api", result="hit" if key == _opportunities_response["key"] else "miss")
+        if key != _opportunities_response["key"]:
+            # Lignes reconstruites à la demande (dicts neufs : décodage des sujets sur place)
+            opportunities = columns.tail(request.args.get('limit', type=int), columns.select(**filters))
+            for opp in opportunities:
+                if 'subject' in opp:
+                    opp['subject'] = decode_email_subject(opp['subject'])
+            _opportunities_response.update(key=key, body=jsonify(opportunities).get_data())
         
-        return jsonify(opportunities)
+        return app.response_class(_opportunities_response["body"], mimetype='application/json')
     except Exception as e:
         return jsonify({"error": str(e)})
 
@@ -816,11 +442,8 @@ def api_get_opportunities():
 def api_start_agent():
     """API : Démarrer l'agent"""
     try:
-        agent_path = os.path.join(parent_dir, 'agent-nocturne-python.py')
-        subprocess.Popen([sys.executable, agent_path], 
-                        stdout=subprocess.DEVNULL, 
-                        stderr=subprocess.DEVNULL)
-        return jsonify({"success": True, "message": "Agent started successfully"})
+        status = supervisor.start_detached(parent_dir)
+        return jsonify({"success": True, "message": "Agent started successfully", "status": status})
     except Exception as e:
         return jsonify({"success": False, "message": str(e)})
 
@@ -828,24 +451,24 @@ def api_start_agent():
 def api_agent_status():
     """API : Vérifier le statut de l'agent"""
     try:
-        is_running = check_agent_status()
-        return jsonify({"running": is_running})
+        status = supervisor.agent_status(parent_dir)
+        if status["running"]:
+            live = supervisor.send_command(parent_dir, "metrics", timeout=0.5)
+            if live:
+                status["metrics"] = live.get("metrics", {})
+                status["stopping"] = live.get("stopping", False)
+        return jsonify(status)
     except Exception as e:
         return jsonify({"running": False, "error": str(e)})
 
 @app.route('/api/agent/stop', methods=['POST'])
 def api_stop_agent():
-    """API : Arrêter l'agent"""
+    """API : Arrêter l'agent (rend la main dès la demande envoyée, l'interface suit /api/agent/status)"""
     try:
-        for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
-            try:
-                cmdline = proc.info['cmdline']
-                if cmdline and any('agent-nocturne-python.py' in arg for arg in cmdline):
-                    proc.terminate()
-                    proc.wait(timeout=5)
-            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.TimeoutExpired):
-                continue
-        return jsonify({"success": True, "message": "Agent stopped successfully"})
+        if supervisor.stop_agent(parent_dir, timeout=0):
+            return jsonify({"success": True, "stopping": False, "message": "Agent stopped successfully"})
+        # Arrêt gracieux en cours : le cycle en cours se termine avant la sortie de l'agent
+        return jsonify({"success": True, "stopping": True, "message": "Arrêt demandé"})
     except Exception as e:
         return jsonify({"success": False, "message": str(e)})
 
@@ -885,37 +508,35 @@ def api_get_config():
 def api_save_config():
     """API : Sauvegarder la configuration"""
     try:
-        config = request.json
-        if save_agent_config(config):
-            return jsonify({"success": True, "message": "Configuration saved"})
-        else:
-            return jsonify({"success": False, "message": "Erreur sauvegarde"})
+        config_store.update(request.json or {})
+    except ConfigError as e:
+        return jsonify({"success": False, "message": str(e), "errors": e.errors})
     except Exception as e:
+        print(f"❌ Erreur sauvegarde config : {e}")
         return jsonify({"success": False, "message": str(e)})
+    
+    # Pousser la nouvelle configuration dans l'agent en cours d'exécution
+    reload = supervisor.send_command(parent_dir, "reload")
+    return jsonify({"success": True, "message": "Configuration saved", "agent_reloaded": bool(reload and reload.get("success"))})
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Métriques Prometheus du serveur web et de l'agent"""
+    agent = supervisor.send_command(parent_dir, "prometheus", timeout=0.5)
+    AGENT_UP.set(1 if agent and "text" in agent else 0)
+    text = merge_expositions([web_metrics.render(), agent.get("text", "") if agent else ""])
+    response = make_response(text)
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    return response
 
 def load_agent_config():
-    """Charger la configuration de l'agent"""
+    """Charger la configuration de l'agent (mise en cache sur le mtime)"""
     try:
-        config_path = os.path.join(parent_dir, 'agent_config.json')
-        if os.path.exists(config_path):
-            with open(config_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return {}
+        return config_store.load()
     except Exception as e:
         print(f"❌ Erreur chargement config : {e}")
         return {}
 
-def save_agent_config(config):
-    """Sauvegarder la configuration de l'agent"""
-    try:
-        config_path = os.path.join(parent_dir, 'agent_config.json')
-        with open(config_path, 'w', encoding='utf-8') as f:
-            json.dump(config, f, indent=2, ensure_ascii=False)
-        return True
-    except Exception as e:
-        print(f"❌ Erreur sauvegarde config : {e}")
-        return False
-
 if __name__ == '__main__':
     print("🤖 Agent IA Nocturne - Interface Web Ultra-Simple")
     print("=" * 50)
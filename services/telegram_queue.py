@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+File d'envoi Telegram en arrière-plan pour l'Agent IA Nocturne
+Connexion keep-alive, limites de débit par chat, retry_after sur 429 et regroupement des alertes
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import tempfile
+import threading
+from typing import Dict, Any, List, Optional
+
+from utils.lazy import lazy_import
+
+# Pile HTTP chargée au premier envoi, dans le thread d'envoi
+requests = lazy_import("requests")
+
+DEFAULT_API_BASE = "https://api.telegram.org"
+
+# Limites Telegram : ~1 message/s par chat, 30 messages/s au total
+PER_CHAT_INTERVAL = 1.0
+GLOBAL_INTERVAL = 1.0 / 30
+MAX_MESSAGE_LENGTH = 4096
+
+_TAG_RE = re.compile(r"<(/?)([a-zA-Z][\w-]*)[^>]*>")
+_PARTIAL_TAIL_RE = re.compile(r"(<[^>]*|&#?\w*)$")
+
+
+def truncate_html(text: str, limit: int = MAX_MESSAGE_LENGTH) -> str:
+    """Tronquer un message HTML sans couper de balise ni d'entité, en refermant les balises restées ouvertes"""
+    if len(text) <= limit:
+        return text
+    cut = limit - 1
+    while True:
+        head = _PARTIAL_TAIL_RE.sub("", text[:cut])
+        opened = []
+        for match in _TAG_RE.finditer(head):
+            name = match.group(2).lower()
+            if not match.group(1):
+                opened.append(name)
+            elif name in opened:
+                del opened[len(opened) - 1 - opened[::-1].index(name):]
+        closing = "".join(f"</{name}>" for name in reversed(opened))
+        if len(head) + 1 + len(closing) <= limit:
+            return head + "…" + closing
+        cut = limit - 1 - len(closing)
+
+
+class TelegramQueue:
+    """Messages persistés sur disque et envoyés par un thread dédié"""
+
+    def __init__(self, bot_token: str, path: str = "telegram_queue.json",
+                 api_base: str = DEFAULT_API_BASE, digest_window: float = 60.0,
+                 digest_max: int = 10, per_chat_interval: float = PER_CHAT_INTERVAL,
+                 global_interval: float = GLOBAL_INTERVAL, max_attempts: int = 8,
+                 timeout: float = 10.0):
+        self.bot_token = bot_token
+        self.path = path
+        self.api_base = api_base.rstrip("/")
+        self.digest_window = digest_window
+        self.digest_max = digest_max
+        self.per_chat_interval = per_chat_interval
+        self.global_interval = global_interval
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+
+        self.session = None
+        self.stats = {"sent": 0, "failed": 0, "digests": 0, "rate_limited": 0}
+        self._items = self._load()
+        self._next_allowed = {}
+        self._last_send = 0.0
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._flushing = False
+        self._thread = None
+
+    # Persistance
+
+    def _load(self) -> List[Dict[str, Any]]:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                items = json.load(f)
+            if items:
+                print(f"📱 {len(items)} message(s) Telegram en attente repris")
+            return items
+        except (OSError, ValueError):
+            return []
+
+    def _save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        payload = json.dumps(self._items, ensure_ascii=False)
+        fd, tmp_path = tempfile.mkstemp(prefix=".telegram_queue.", suffix=".tmp", dir=directory)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    # Producteurs
+
+    def _enqueue(self, item: Dict[str, Any]):
+        item.update(id=uuid.uuid4().hex, enqueued_at=time.time(), attempts=0, not_before=0)
+        with self._cond:
+            self._items.append(item)
+            self._save()
+            self._cond.notify()
+
+    def enqueue(self, chat_id: str, text: str):
+        """Ajouter un message à envoyer tel quel"""
+        self._enqueue({"kind": "message", "chat_id": str(chat_id), "text": text})
+
+    def enqueue_alert(self, chat_id: str, text: str, summary: str):
+        """Ajouter une alerte, regroupée avec les alertes proches dans un digest"""
+        self._enqueue({"kind": "alert", "chat_id": str(chat_id), "text": text, "summary": summary})
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._items)
+
+    # Consommateur
+
+    def start(self):
+        """Démarrer le thread d'envoi"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="telegram-queue", daemon=True)
+        self._thread.start()
+
+    def close(self, flush_timeout: float = 5.0):
+        """Arrêter le thread après avoir tenté d'envoyer ce qui est prêt (le reste est conservé)"""
+        deadline = time.monotonic() + flush_timeout
+        with self._cond:
+            # Les alertes en attente de regroupement partent sans attendre la fenêtre du digest
+            self._flushing = True
+            self._cond.notify_all()
+            while self._items and self._thread and self._thread.is_alive():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                # Rien d'envoyable tout de suite : attendre not_before ou la limite du chat si elle tombe à temps
+                now = time.time()
+                if self._next_ready(now) is None and self._wait_time(now) > remaining:
+                    break
+                self._cond.wait(min(0.1, remaining))
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout=max(0.0, deadline - time.monotonic()) + 1.0)
+        if self.session:
+            self.session.close()
+
+    def _next_ready(self, now: float) -> Optional[List[Dict[str, Any]]]:
+        """Prochain lot envoyable : un message seul, ou toutes les alertes d'un chat"""
+        for item in self._items:
+            chat_id = item["chat_id"]
+            if item["not_before"] > now or self._next_allowed.get(chat_id, 0) > now:
+                continue
+            if item["kind"] != "alert":
+                return [item]
+            alerts = [other for other in self._items
+                      if other["kind"] == "alert" and other["chat_id"] == chat_id]
+            oldest = min(alert["enqueued_at"] for alert in alerts)
+            if self._flushing or len(alerts) >= self.digest_max or now - oldest >= self.digest_window:
+                return alerts[:self.digest_max]
+        return None
+
+    def _wait_time(self, now: float) -> float:
+        """Délai avant que le prochain lot puisse devenir envoyable"""
+        if not self._items:
+            return 3600.0
+        candidates = []
+        for item in self._items:
+            ready_at = max(item["not_before"], self._next_allowed.get(item["chat_id"], 0))
+            if item["kind"] == "alert" and not self._flushing:
+                ready_at = max(ready_at, item["enqueued_at"] + self.digest_window)
+            candidates.append(ready_at - now)
+        return min(max(0.05, min(candidates)), 3600.0)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                batch = None
+                while not self._stopping:
+                    now = time.time()
+                    batch = self._next_ready(now)
+                    if batch:
+                        break
+                    self._cond.wait(self._wait_time(now))
+                if self._stopping:
+                    return
+
+            # Limite globale de débit
+            delay = self._last_send + self.global_interval - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self._deliver(batch)
+
+    @staticmethod
+    def format_digest(batch: List[Dict[str, Any]]) -> str:
+        if len(batch) == 1:
+            return batch[0]["text"]
+        message = f"🎯 <b>{len(batch)} opportunités importantes détectées</b>\n\n"
+        for i, item in enumerate(batch, 1):
+            message += f"{i}. {item['summary']}\n"
+        return message
+
+    def _deliver(self, batch: List[Dict[str, Any]]):
+        chat_id = batch[0]["chat_id"]
+        text = self.format_digest(batch) if batch[0]["kind"] == "alert" else batch[0]["text"]
+        text = truncate_html(text)
+
+        outcome, retry_after = self._post(chat_id, text)
+        self._last_send = time.monotonic()
+        ids = {item["id"] for item in batch}
+
+        with self._cond:
+            now = time.time()
+            self._next_allowed[chat_id] = now + self.per_chat_interval
+            if outcome == "sent":
+                self.stats["sent"] += 1
+                if len(batch) > 1:
+                    self.stats["digests"] += 1
+                self._items = [item for item in self._items if item["id"] not in ids]
+            elif outcome == "rate_limited":
+                # 429 : pas de tentative consommée, on attend retry_after pour ce chat
+                self.stats["rate_limited"] += 1
+                self._next_allowed[chat_id] = now + retry_after
+            elif outcome == "retry":
+                for item in self._items:
+                    if item["id"] in ids:
+                        item["attempts"] += 1
+                        item["not_before"] = now + min(2 ** item["attempts"], 300)
+                dropped = [item for item in self._items
+                           if item["id"] in ids and item["attempts"] >= self.max_attempts]
+                if dropped:
+                    print(f"❌ Telegram : {len(dropped)} message(s) abandonné(s) après {self.max_attempts} tentatives")
+                    self.stats["failed"] += len(dropped)
+                    dropped_ids = {item["id"] for item in dropped}
+                    self._items = [item for item in self._items if item["id"] not in dropped_ids]
+            else:
+                self.stats["failed"] += len(batch)
+                self._items = [item for item in self._items if item["id"] not in ids]
+            self._save()
+            self._cond.notify_all()
+
+    def _post(self, chat_id: str, text: str):
+        """Appel sendMessage : ('sent' | 'rate_limited' | 'retry' | 'failed', retry_after)"""
+        url = f"{self.api_base}/bot{self.bot_token}/sendMessage"
+        if self.session is None:
+            self.session = requests.Session()
+        try:
+            response = self.session.post(url, data={"chat_id": chat_id, "text": text, "parse_mode": "HTML"},
+                                         timeout=self.timeout)
+        except requests.RequestException as e:
+            print(f"⚠️ Telegram injoignable : {e}")
+            return "retry", 0
+
+        if response.status_code == 429:
+            try:
+                retry_after = float(response.json().get("parameters", {}).get("retry_after", 1))
+            except ValueError:
+                retry_after = float(response.headers.get("Retry-After", 1))
+            print(f"⏳ Telegram : limite atteinte, nouvel essai dans {retry_after:.0f}s")
+            return "rate_limited", retry_after
+        if response.status_code >= 500:
+            return "retry", 0
+        if response.status_code >= 400:
+            print(f"❌ Erreur Telegram {response.status_code} : {response.text[:200]}")
+            return "failed", 0
+        return "sent", 0
@@ -4,34 +4,67 @@ Module de notifications Telegram pour l'Agent IA Nocturne
 Gère l'envoi de rapports quotidiens et notifications
 """
 
-import requests
 import json
+import html
 import os
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
-import pytz
-from stats_agent import load_opportunities, calculate_stats
+from typing import Callable, Dict, List, Any, Optional, Union
+from data.storage.segments import SegmentStore
+from services.telegram_queue import TelegramQueue, DEFAULT_API_BASE
+from utils.lazy import lazy_import
+
+# Importé au premier envoi : l'agent démarre sans charger la pile HTTP
+requests = lazy_import("requests")
 
 class TelegramNotifier:
-    def __init__(self, config: Dict[str, Any]):
-        """Initialiser le notificateur Telegram"""
+    def __init__(self, config: Dict[str, Any],
+                 segments: Union[SegmentStore, Callable[[], SegmentStore], None] = None,
+                 queue_path: Optional[str] = None):
+        """Initialiser le notificateur Telegram (envoi en arrière-plan si queue_path est fourni)"""
+        self._segments = segments
         self.config = config.get("telegram", {})
         self.enabled = self.config.get("enabled", False)
         self.bot_token = self.config.get("bot_token", "")
         self.chat_id = self.config.get("chat_id", "")
         self.daily_report = self.config.get("daily_report", {})
+        self.api_base = self.config.get("api_base", DEFAULT_API_BASE).rstrip("/")
         
         if self.enabled and (not self.bot_token or not self.chat_id):
             print("⚠️ Telegram activé mais bot_token ou chat_id manquant")
             self.enabled = False
+        
+        self.queue = None
+        if self.enabled and queue_path:
+            self.queue = TelegramQueue(self.bot_token, queue_path, api_base=self.api_base,
+                                       digest_window=self.config.get("digest_window", 60))
+            self.queue.start()
+    
+    @property
+    def segments(self) -> SegmentStore:
+        """Segments du log, ouverts au premier rapport quand l'agent en fournit la fabrique"""
+        if callable(self._segments):
+            self._segments = self._segments()
+        elif self._segments is None:
+            self._segments = SegmentStore()
+        return self._segments
+    
+    def close(self, flush_timeout: float = 5.0):
+        """Arrêter l'envoi en arrière-plan (les messages restants sont conservés sur disque)"""
+        if self.queue:
+            self.queue.close(flush_timeout)
+            self.queue = None
     
     def send_message(self, message: str) -> bool:
-        """Envoyer un message Telegram"""
+        """Envoyer un message Telegram (mis en file si l'envoi en arrière-plan est actif)"""
         if not self.enabled:
             return False
         
+        if self.queue:
+            self.queue.enqueue(self.chat_id, message)
+            return True
+        
         try:
-            url = f"https://api.telegram.org/bot{self.bot_token}/sendMessage"
+            url = f"{self.api_base}/bot{self.bot_token}/sendMessage"
             data = {
                 "chat_id": self.chat_id,
                 "text": message,
@@ -46,23 +79,17 @@ class TelegramNotifier:
             print(f"❌ Erreur Telegram : {e}")
             return False
     
-    def format_daily_report(self, stats: Dict[str, Any]) -> str:
+    def format_daily_report(self, stats: Dict[str, Any],
+                            today_opportunities: Optional[List[Dict[str, Any]]] = None) -> str:
         """Formater le rapport quotidien"""
         if not stats:
             return "📊 <b>Rapport Quotidien - Agent IA Nocturne</b>\n\n❌ Aucune donnée disponible"
         
-        # Calculer les stats de la journée
-        today = datetime.now().strftime("%d/%m/%Y")
-        today_opportunities = []
-        
-        opportunities = load_opportunities()
-        for opp in opportunities:
-            opp_date = datetime.fromisoformat(opp["timestamp"].replace('Z', '+00:00')).strftime("%d/%m/%Y")
-            if opp_date == today:
-                today_opportunities.append(opp)
-        
-        # Stats de la journée
-        today_stats = calculate_stats(today_opportunities)
+        # Opportunités de la journée : seul le segment du jour est lu
+        now = datetime.now()
+        today = now.strftime("%d/%m/%Y")
+        if today_opportunities is None:
+            today_opportunities = list(self.segments.refresh().iter_day(now.strftime("%Y-%m-%d")))
         
         # Message principal
         message = f"📊 <b>Rapport Quotidien - Agent IA Nocturne</b>\n"
@@ -125,13 +152,13 @@ class TelegramNotifier:
         if not self.enabled or not self.daily_report.get("enabled", False):
             return False
         
-        # Charger les statistiques
-        opportunities = load_opportunities()
-        if not opportunities:
+        # Statistiques globales lues dans le manifeste des segments
+        stats = self.segments.refresh().summary()
+        if not stats:
             return self.send_message("📊 <b>Rapport Quotidien</b>\n\n❌ Aucune donnée disponible")
         
-        stats = calculate_stats(opportunities)
-        message = self.format_daily_report(stats)
+        today = datetime.now().strftime("%Y-%m-%d")
+        message = self.format_daily_report(stats, list(self.segments.iter_day(today)))
         
         return self.send_message(message)
     
@@ -170,6 +197,12 @@ class TelegramNotifier:
             for raison in raisons[:3]:  # Max 3 raisons
                 message += f"• {raison}\n"
         
+        # Les alertes rapprochées sont regroupées en un seul digest
+        if self.queue:
+            short_subject = subject[:60] + "..." if len(subject) > 60 else subject
+            self.queue.enqueue_alert(self.chat_id, message, f"{html.escape(short_subject)} ({pertinence}/10)")
+            return True
+        
         return self.send_message(message)
 
 def test_telegram_config(config: Dict[str, Any]) -> bool:
@@ -0,0 +1 @@
+"""Benchmarks de l'Agent IA Nocturne"""
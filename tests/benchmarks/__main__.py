@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Suite de benchmarks de bout en bout de l'Agent IA Nocturne
+
+    python -m tests.benchmarks run --scenario all --output bench.json
+    python -m tests.benchmarks compare baseline.json bench.json --threshold 0.15
+    python -m tests.benchmarks.importtime    # temps de démarrage des points d'entrée
+
+Chaque scénario s'exécute dans un sous-processus (RSS maximal isolé, état des modules neuf)
+"""
+
+import os
+import sys
+import json
+import argparse
+import platform
+import subprocess
+import tempfile
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_EMAILS = [10, 100, 1000, 10000]
+DEFAULT_ENTRIES = [1000, 10000, 100000, 1000000]
+
+# Métriques comparées : (chemin dans le résultat, True si plus grand = meilleur)
+COMPARED_METRICS = {
+    "agent": [("emails_per_sec", True), ("peak_rss_mb", False)],
+    "web": [("peak_rss_mb", False)],
+    "stats": [("entries_per_sec", True), ("peak_rss_mb", False)],
+    "readmodel": [("columns_mb", False)],
+}
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_worker(args) -> int:
+    """Exécuter un seul scénario (dans le sous-processus) et écrire son résultat JSON"""
+    sys.path.insert(0, PROJECT_ROOT)
+    from tests.benchmarks.scenarios import SCENARIOS, ScenarioSkipped
+
+    kwargs = json.loads(args.kwargs)
+    with tempfile.TemporaryDirectory(prefix="bench_") as workdir:
+        try:
+            result = SCENARIOS[args.scenario](workdir, **kwargs)
+        except ScenarioSkipped as e:
+            result = {"skipped": str(e)}
+    with open(args.result, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False)
+    return 0
+
+
+def run_scenario(name: str, kwargs: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+    fd, result_path = tempfile.mkstemp(prefix="bench_result.", suffix=".json")
+    os.close(fd)
+    try:
+        proc = subprocess.run([sys.executable, "-m", "tests.benchmarks", "worker", name,
+                               json.dumps(kwargs), result_path],
+                              cwd=PROJECT_ROOT, capture_output=True, text=True, timeout=timeout)
+        if proc.returncode != 0:
+            return {"error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"code {proc.returncode}"}
+        with open(result_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except subprocess.TimeoutExpired:
+        return {"error": f"timeout après {timeout}s"}
+    finally:
+        os.remove(result_path)
+
+
+def plan(args) -> List[tuple]:
+    """Liste des (scénario, taille, kwargs) à exécuter"""
+    scenarios = ["agent", "web", "stats", "readmodel"] if "all" in args.scenario else args.scenario
+    runs = []
+    for name in scenarios:
+        if name == "agent":
+            for size in args.emails:
+                runs.append((name, size, {
+                    "emails": size, "llm_latency": args.llm_latency, "imap_latency": args.imap_latency,
+                    "smtp_latency": args.smtp_latency, "telegram_latency": args.telegram_latency,
+                    "error_rate": args.error_rate, "seed": args.seed
+                }))
+        elif name == "web":
+            for size in args.entries:
+                runs.append((name, size, {"entries": size, "requests_per_endpoint": args.requests,
+                                          "seed": args.seed}))
+        elif name == "readmodel":
+            for size in args.entries:
+                runs.append((name, size, {"entries": size, "repeats": args.requests, "seed": args.seed}))
+        else:
+            for size in args.entries:
+                runs.append((name, size, {"entries": size, "seed": args.seed}))
+    return runs
+
+
+def summarize(name: str, result: Dict[str, Any]) -> str:
+    if "skipped" in result:
+        return f"⏸️ ignoré : {result['skipped']}"
+    if "error" in result:
+        return f"❌ {result['error']}"
+    if name == "agent":
+        line = f"{result['emails_per_sec']} emails/s, RSS {result['peak_rss_mb']} Mo"
+        llm = result["stages"].get("llm_analysis")
+        if llm:
+            line += f", llm_analysis p50 {llm['p50_ms']} ms / p95 {llm['p95_ms']} ms"
+        return line
+    if name == "web":
+        worst = max(result["endpoints"].items(), key=lambda item: item[1]["p95_ms"])
+        return f"pire p95 {worst[1]['p95_ms']} ms ({worst[0]}), RSS {result['peak_rss_mb']} Mo"
+    if name == "readmodel":
+        queries = result["queries"]
+        return (f"{result['dicts_mb']} → {result['columns_mb']} Mo, "
+                f"stats {queries['stats_dicts']['p50_ms']} → {queries['stats_columns']['p50_ms']} ms, "
+                f"filtre {queries['filter_dicts']['p50_ms']} → {queries['filter_columns']['p50_ms']} ms"
+                f"{'' if result['numpy'] else ' (sans NumPy)'}")
+    return f"{result['entries_per_sec']} entrées/s, RSS {result['peak_rss_mb']} Mo"
+
+
+def run(args) -> int:
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": datetime.now().isoformat(),
+        "parameters": {
+            "llm_latency": args.llm_latency, "imap_latency": args.imap_latency,
+            "smtp_latency": args.smtp_latency, "telegram_latency": args.telegram_latency,
+            "error_rate": args.error_rate, "seed": args.seed
+        },
+        "scenarios": {}
+    }
+    failed = False
+    for name, size, kwargs in plan(args):
+        print(f"📊 {name} ({size})...", end=" ", flush=True)
+        result = run_scenario(name, kwargs, args.timeout)
+        report["scenarios"].setdefault(name, {})[str(size)] = result
+        failed = failed or "error" in result
+        print(summarize(name, result))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"✅ Résultats écrits dans {args.output}")
+    return 1 if failed else 0
+
+
+def endpoint_metrics(result: Dict[str, Any]) -> Dict[str, float]:
+    """p95 par endpoint web et par étape de l'agent (plus petit = meilleur)"""
+    latencies = {}
+    for url, values in result.get("endpoints", {}).items():
+        latencies[f"{url} p95_ms"] = values["p95_ms"]
+    for stage, values in result.get("stages", {}).items():
+        latencies[f"{stage} p95_ms"] = values["p95_ms"]
+    return latencies
+
+
+def compare(args) -> int:
+    """Comparer deux rapports et signaler les régressions au-delà du seuil"""
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, "r", encoding="utf-8") as f:
+        current = json.load(f)
+
+    print(f"📊 {baseline.get('commit')} → {current.get('commit')} (seuil {args.threshold:.0%})")
+    regressions = 0
+    for name, sizes in current.get("scenarios", {}).items():
+        for size, result in sizes.items():
+            before = baseline.get("scenarios", {}).get(name, {}).get(size)
+            if not before or "skipped" in result or "error" in result or "skipped" in before or "error" in before:
+                continue
+            checks = [(metric, result.get(metric), before.get(metric), higher_is_better)
+                      for metric, higher_is_better in COMPARED_METRICS.get(name, [])]
+            old_latencies = endpoint_metrics(before)
+            checks += [(metric, value, old_latencies.get(metric), False)
+                       for metric, value in endpoint_metrics(result).items()]
+
+            for metric, new, old, higher_is_better in checks:
+                if new is None or not old:
+                    continue
+                change = (new - old) / old
+                worse = -change if higher_is_better else change
+                # Les latences sous la milliseconde sont trop bruitées pour conclure
+                if worse > args.threshold and not (metric.endswith("_ms") and max(new, old) < 1.0):
+                    regressions += 1
+                    print(f"❌ {name} ({size}) {metric} : {old} → {new} ({change:+.1%})")
+
+    if regressions:
+        print(f"⚠️ {regressions} régression(s) détectée(s)")
+        return 1
+    print("✅ Aucune régression")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m tests.benchmarks",
+                                     description="Benchmarks de bout en bout de l'Agent IA Nocturne")
+    subparsers = parser.add_subparsers(dest="command")
+
+    run_parser = subparsers.add_parser("run", help="Exécuter les scénarios")
+    run_parser.add_argument("--scenario", choices=["agent", "web", "stats", "readmodel", "all"], nargs="+", default=["all"])
+    run_parser.add_argument("--emails", type=int, nargs="+", default=DEFAULT_EMAILS,
+                            help="Tailles de boîte mail du scénario agent")
+    run_parser.add_argument("--entries", type=int, nargs="+", default=DEFAULT_ENTRIES,
+                            help="Tailles du log pour les scénarios web et stats")
+    run_parser.add_argument("--requests", type=int, default=50, help="Requêtes par endpoint (scénario web)")
+    run_parser.add_argument("--llm-latency", type=float, default=0.05, help="Latence du faux LLM (s)")
+    run_parser.add_argument("--imap-latency", type=float, default=0.0, help="Latence du faux IMAP (s)")
+    run_parser.add_argument("--smtp-latency", type=float, default=0.0, help="Latence du faux SMTP (s)")
+    run_parser.add_argument("--telegram-latency", type=float, default=0.0, help="Latence du faux Telegram (s)")
+    run_parser.add_argument("--error-rate", type=float, default=0.0, help="Taux d'erreurs injectées (0-1)")
+    run_parser.add_argument("--seed", type=int, default=42)
+    run_parser.add_argument("--timeout", type=float, default=3600, help="Durée maximale par scénario (s)")
+    run_parser.add_argument("-o", "--output", help="Fichier JSON de résultats")
+
+    compare_parser = subparsers.add_parser("compare", help="Comparer deux fichiers de résultats")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.15,
+                                help="Dégradation relative tolérée (défaut 15 %%)")
+
+    worker_parser = subparsers.add_parser("worker")
+    worker_parser.add_argument("scenario")
+    worker_parser.add_argument("kwargs")
+    worker_parser.add_argument("result")
+    return parser
+
+
+def main(argv=None) -> int:
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if not argv or argv[0] not in ("run", "compare", "worker", "-h", "--help"):
+        argv.insert(0, "run")
+    args = build_parser().parse_args(argv)
+    if args.command == "worker":
+        return run_worker(args)
+    if args.command == "compare":
+        return compare(args)
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,478 @@
+#!/usr/bin/env python3
+"""
+Serveurs locaux simulant IMAP, SMTP, OpenAI/Mistral et Telegram pour les benchmarks
+Latence et taux d'erreur configurables, aucun accès réseau extérieur
+"""
+
+import re
+import json
+import time
+import bisect
+import random
+import hashlib
+import threading
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+from typing import Dict, List, Optional
+
+
+class FaultInjector:
+    """Latence (moyenne ± gigue) et erreurs aléatoires reproductibles"""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self):
+        if self.latency or self.jitter:
+            with self._lock:
+                value = self.latency + self._rng.uniform(-self.jitter, self.jitter)
+            time.sleep(max(0.0, value))
+
+    def should_fail(self) -> bool:
+        if not self.error_rate:
+            return False
+        with self._lock:
+            return self._rng.random() < self.error_rate
+
+
+class _ThreadingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeServer:
+    """Base commune : démarrage dans un thread sur un port libre"""
+
+    def __init__(self, faults: Optional[FaultInjector] = None):
+        self.faults = faults or FaultInjector()
+        self.requests = 0
+        self.errors = 0
+        self._server = None
+        self._thread = None
+
+    def _make_server(self):
+        raise NotImplementedError
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def start(self) -> "FakeServer":
+        self._server = self._make_server()
+        self._server.fake = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+# IMAP
+
+class _IMAPHandler(socketserver.StreamRequestHandler):
+    """Sous-ensemble d'IMAP4rev1 suffisant pour imaplib (LOGIN, SELECT, SEARCH, FETCH, STORE)"""
+
+    # Réponses écrites en plusieurs morceaux : sans TCP_NODELAY, Nagle + ACK retardé ajoutent ~40 ms
+    disable_nagle_algorithm = True
+
+    def send(self, line: str):
+        self.wfile.write(line.encode("utf-8") + b"\r\n")
+
+    def handle(self):
+        fake = self.server.fake
+        self.send("* OK [CAPABILITY IMAP4rev1 UIDPLUS X-GM-EXT-1] Fake IMAP ready")
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            line = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+            if not line:
+                continue
+            tag, _, rest = line.partition(" ")
+            command, _, args = rest.partition(" ")
+            command = command.upper()
+            uid = False
+            if command == "UID":
+                uid = True
+                command, _, args = args.partition(" ")
+                command = command.upper()
+
+            fake.requests += 1
+            fake.faults.delay()
+            if command in ("FETCH", "LOGIN") and fake.faults.should_fail():
+                fake.errors += 1
+                self.send(f"{tag} NO [UNAVAILABLE] Erreur simulée")
+                continue
+
+            handler = getattr(self, f"cmd_{command.lower().replace('-', '_')}", None)
+            if handler is None:
+                self.send(f"{tag} BAD Commande non supportée : {command}")
+                continue
+            if handler(tag, args, uid) is False:
+                return
+
+    def cmd_capability(self, tag, args, uid):
+        self.send("* CAPABILITY IMAP4rev1 UIDPLUS X-GM-EXT-1 AUTH=PLAIN")
+        self.send(f"{tag} OK CAPABILITY completed")
+
+    def cmd_noop(self, tag, args, uid):
+        self.send(f"{tag} OK NOOP completed")
+
+    def cmd_login(self, tag, args, uid):
+        self.send(f"{tag} OK LOGIN completed")
+
+    def cmd_select(self, tag, args, uid):
+        mailbox = self.server.fake.mailbox
+        self.send(f"* {len(mailbox.messages)} EXISTS")
+        self.send("* 0 RECENT")
+        self.send("* FLAGS (\\Seen \\Answered \\Flagged \\Deleted \\Draft)")
+        self.send("* OK [PERMANENTFLAGS (\\Seen \\Answered \\Flagged \\Deleted \\Draft \\*)] Flags permitted")
+        self.send(f"* OK [UIDVALIDITY {mailbox.uidvalidity}] UIDs valid")
+        self.send(f"* OK [UIDNEXT {mailbox.uidnext}] Predicted next UID")
+        self.send(f"{tag} OK [READ-WRITE] SELECT completed")
+
+    cmd_examine = cmd_select
+
+    def cmd_search(self, tag, args, uid):
+        mailbox = self.server.fake.mailbox
+        matches = mailbox.search(args)
+        numbers = [str(mailbox.uids[i]) if uid else str(i + 1) for i in matches]
+        self.send("* SEARCH" + ("" if not numbers else " " + " ".join(numbers)))
+        self.send(f"{tag} OK SEARCH completed")
+
+    def cmd_fetch(self, tag, args, uid):
+        mailbox = self.server.fake.mailbox
+        sequence, _, items = args.partition(" ")
+        items_upper = items.upper()
+        for index in mailbox.resolve(sequence, uid):
+            message = mailbox.messages[index]
+            parts = []
+            if uid or "UID" in items_upper:
+                parts.append(f"UID {mailbox.uids[index]}")
+            if "FLAGS" in items_upper:
+                parts.append(f"FLAGS ({' '.join(sorted(mailbox.flags[index]))})")
+            if "HEADER" in items_upper:
+                payload = message.split(b"\r\n\r\n", 1)[0] + b"\r\n\r\n"
+                name = "RFC822.HEADER" if "RFC822.HEADER" in items_upper else "BODY[HEADER]"
+            else:
+                payload = message
+                name = "RFC822" if "RFC822" in items_upper else "BODY[]"
+                partial = re.search(r"BODY(?:\.PEEK)?\[\]<(\d+)\.(\d+)>", items_upper)
+                if partial:
+                    # FETCH partiel BODY[]<début.taille>
+                    start, size = int(partial.group(1)), int(partial.group(2))
+                    payload = message[start:start + size]
+                    name = f"BODY[]<{start}>"
+                if "PEEK" not in items_upper:
+                    mailbox.flags[index].add("\\Seen")
+            prefix = f"* {index + 1} FETCH (" + " ".join(parts + [f"{name} {{{len(payload)}}}"])
+            self.wfile.write(prefix.encode("utf-8") + b"\r\n" + payload + b")\r\n")
+        self.send(f"{tag} OK FETCH completed")
+
+    def cmd_store(self, tag, args, uid):
+        mailbox = self.server.fake.mailbox
+        sequence, _, rest = args.partition(" ")
+        action, _, values = rest.partition(" ")
+        # Drapeaux, mots-clés ou libellés Gmail entre guillemets ("+X-GM-LABELS (\"Agent IA\")")
+        flags = {token.strip('"') for token in re.findall(r'"[^"]*"|[^\s()]+', values)}
+        for index in mailbox.resolve(sequence, uid):
+            if action.upper().startswith("-"):
+                mailbox.flags[index] -= flags
+            else:
+                mailbox.flags[index] |= flags
+        self.send(f"{tag} OK STORE completed")
+
+    def cmd_close(self, tag, args, uid):
+        self.send(f"{tag} OK CLOSE completed")
+
+    cmd_expunge = cmd_close
+
+    def cmd_logout(self, tag, args, uid):
+        self.send("* BYE Fake IMAP logging out")
+        self.send(f"{tag} OK LOGOUT completed")
+        return False
+
+
+class FakeMailbox:
+    """Messages, UIDs et drapeaux d'une boîte INBOX"""
+
+    def __init__(self, messages: List[bytes], uidvalidity: int = 1):
+        # imaplib attend des fins de ligne CRLF
+        self.messages = [m.replace(b"\r\n", b"\n").replace(b"\n", b"\r\n") for m in messages]
+        self.uids = list(range(1, len(messages) + 1))
+        self.flags = [set() for _ in messages]
+        self.uidvalidity = uidvalidity
+
+    @property
+    def uidnext(self) -> int:
+        return (self.uids[-1] if self.uids else 0) + 1
+
+    def resolve(self, sequence: str, uid: bool) -> List[int]:
+        """Indices correspondant à un ensemble de séquence IMAP (1,3:5,7:*)"""
+        keys = self.uids if uid else range(1, len(self.messages) + 1)
+        top = keys[-1] if len(keys) else 0
+        selected = set()
+        for chunk in sequence.split(","):
+            lo, _, hi = chunk.partition(":")
+            lo = top if lo == "*" else int(lo)
+            hi = lo if not hi else (top if hi == "*" else int(hi))
+            lo, hi = min(lo, hi), max(lo, hi)
+            # Clés triées : recherche dichotomique plutôt qu'un parcours complet
+            selected.update(range(bisect.bisect_left(keys, lo), bisect.bisect_right(keys, hi)))
+        return sorted(selected)
+
+    def search(self, criteria: str) -> List[int]:
+        """Recherche simplifiée : ALL, UNSEEN, SEEN, UID a:b, [NOT] KEYWORD x, [NOT] X-GM-LABELS x (X-GM-RAW ignoré)"""
+        indices = range(len(self.messages))
+        tokens = re.findall(r'"[^"]*"|\S+', criteria.upper())
+        i = 0
+        result = set(indices)
+        while i < len(tokens):
+            token = tokens[i]
+            negate = token == "NOT"
+            if negate:
+                i += 1
+                token = tokens[i]
+            if token == "UNSEEN":
+                keep = {j for j in indices if "\\Seen" not in self.flags[j]}
+            elif token == "SEEN":
+                keep = {j for j in indices if "\\Seen" in self.flags[j]}
+            elif token in ("KEYWORD", "X-GM-LABELS"):
+                i += 1
+                keyword = tokens[i].strip('"')
+                keep = {j for j in indices if keyword in {f.upper() for f in self.flags[j]}}
+            elif token == "UID":
+                i += 1
+                keep = set(self.resolve(tokens[i], uid=True))
+            elif token == "X-GM-RAW":
+                i += 1
+                keep = set(indices)
+            else:
+                keep = set(indices)
+            result &= (set(indices) - keep) if negate else keep
+            i += 1
+        return sorted(result)
+
+
+class FakeIMAPServer(FakeServer):
+    """Serveur IMAP en clair (imaplib.IMAP4) servant une boîte synthétique"""
+
+    def __init__(self, messages: List[bytes], faults: Optional[FaultInjector] = None):
+        super().__init__(faults)
+        self.mailbox = FakeMailbox(messages)
+
+    def _make_server(self):
+        return _ThreadingTCPServer(("127.0.0.1", 0), _IMAPHandler)
+
+
+# SMTP
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """ESMTP minimal : EHLO, AUTH PLAIN/LOGIN, MAIL, RCPT, DATA, QUIT"""
+
+    disable_nagle_algorithm = True
+
+    def send(self, line: str):
+        self.wfile.write(line.encode("utf-8") + b"\r\n")
+
+    def handle(self):
+        fake = self.server.fake
+        self.send("220 fake.smtp ESMTP ready")
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            line = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+            verb = line.split(" ", 1)[0].upper()
+
+            if verb in ("EHLO", "HELO"):
+                self.send("250-fake.smtp")
+                self.send("250-AUTH PLAIN LOGIN")
+                self.send("250 8BITMIME")
+            elif verb == "AUTH":
+                if line.upper().startswith("AUTH LOGIN"):
+                    self.send("334 VXNlcm5hbWU6")
+                    self.rfile.readline()
+                    self.send("334 UGFzc3dvcmQ6")
+                    self.rfile.readline()
+                self.send("235 2.7.0 Authentication successful")
+            elif verb in ("MAIL", "RCPT", "RSET", "NOOP"):
+                self.send("250 OK")
+            elif verb == "DATA":
+                self.send("354 End data with <CR><LF>.<CR><LF>")
+                data = []
+                while True:
+                    chunk = self.rfile.readline()
+                    if not chunk or chunk in (b".\r\n", b".\n"):
+                        break
+                    data.append(chunk)
+                fake.requests += 1
+                fake.faults.delay()
+                if fake.faults.should_fail():
+                    fake.errors += 1
+                    self.send("451 4.3.0 Erreur simulée")
+                else:
+                    fake.messages.append(b"".join(data))
+                    self.send("250 OK queued")
+            elif verb == "QUIT":
+                self.send("221 Bye")
+                return
+            else:
+                self.send("502 Command not implemented")
+
+
+class FakeSMTPServer(FakeServer):
+    """Serveur SMTP en clair (smtplib.SMTP) qui conserve les messages reçus"""
+
+    def __init__(self, faults: Optional[FaultInjector] = None):
+        super().__init__(faults)
+        self.messages = []
+
+    def _make_server(self):
+        return _ThreadingTCPServer(("127.0.0.1", 0), _SMTPHandler)
+
+
+# HTTP (OpenAI / Mistral / Telegram)
+
+class _JSONHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status: int, payload: Dict, headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+
+class _LLMHandler(_JSONHandler):
+    """Endpoint /v1/chat/completions compatible OpenAI et Mistral"""
+
+    def do_POST(self):
+        fake = self.server.fake
+        request = json.loads(self.read_body() or b"{}")
+        fake.requests += 1
+        fake.faults.delay()
+        if fake.faults.should_fail():
+            fake.errors += 1
+            self.reply(500, {"error": {"message": "Erreur simulée", "type": "server_error"}})
+            return
+
+        prompt = request.get("messages", [{}])[-1].get("content", "")
+        content = fake.answer(prompt)
+        prompt_tokens = max(1, len(prompt) // 4)
+        completion_tokens = max(1, len(content) // 4)
+        self.reply(200, {
+            "id": f"chatcmpl-{fake.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "fake"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                         "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens}
+        })
+
+
+class FakeLLMServer(FakeServer):
+    """Réponses JSON déterministes : la pertinence dépend du hash du prompt"""
+
+    def __init__(self, faults: Optional[FaultInjector] = None, retain_rate: float = 0.3):
+        super().__init__(faults)
+        self.retain_rate = retain_rate
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    def answer(self, prompt: str) -> str:
+        if '"objet"' in prompt:
+            return json.dumps({
+                "objet": "Proposition suite à votre demande",
+                "message": "Bonjour,\n\nMerci pour votre message, je suis disponible pour en discuter.\n\nCordialement,",
+                "signature": "Freelance"
+            }, ensure_ascii=False)
+        digest = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8], 16) / 0xFFFFFFFF
+        retained = digest < self.retain_rate
+        return json.dumps({
+            "pertinence": 8 if retained else 3,
+            "decision": "✅ Mission retenue" if retained else "❌ Mission rejetée – hors cible",
+            "raisons": ["Technologies Python/API"] if retained else ["Hors cible"],
+            "points_attention": []
+        }, ensure_ascii=False)
+
+    def _make_server(self):
+        return ThreadingHTTPServer(("127.0.0.1", 0), _LLMHandler)
+
+
+class _TelegramHandler(_JSONHandler):
+    """Endpoint /bot<token>/sendMessage avec 429 retry_after simulés"""
+
+    def do_POST(self):
+        fake = self.server.fake
+        form = parse_qs(self.read_body().decode("utf-8"))
+        fake.requests += 1
+        fake.faults.delay()
+        status = fake.next_status()
+        if status == 429 or (status is None and fake.faults.should_fail()):
+            fake.errors += 1
+            self.reply(429, {"ok": False, "error_code": 429, "description": "Too Many Requests",
+                             "parameters": {"retry_after": fake.retry_after}})
+            return
+        if status and status >= 400:
+            fake.errors += 1
+            self.reply(status, {"ok": False, "error_code": status, "description": "Erreur simulée"})
+            return
+        with fake.lock:
+            fake.sent += 1
+            fake.messages.append({"chat_id": form.get("chat_id", [""])[0], "text": form.get("text", [""])[0],
+                                  "at": time.monotonic()})
+        self.reply(200, {"ok": True, "result": {"message_id": fake.sent}})
+
+
+class FakeTelegramServer(FakeServer):
+    """API Bot Telegram locale (telegram.api_base = base_url)"""
+
+    def __init__(self, faults: Optional[FaultInjector] = None, retry_after: float = 1):
+        super().__init__(faults)
+        self.retry_after = retry_after
+        self.sent = 0
+        # Messages reçus et codes HTTP imposés aux prochaines requêtes (tests)
+        self.messages: List[Dict] = []
+        self.statuses: List[int] = []
+        self.lock = threading.Lock()
+
+    def next_status(self) -> Optional[int]:
+        with self.lock:
+            return self.statuses.pop(0) if self.statuses else None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def _make_server(self):
+        return ThreadingHTTPServer(("127.0.0.1", 0), _TelegramHandler)
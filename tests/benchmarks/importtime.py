@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Benchmark du temps de démarrage (python -X importtime)
+
+    python -m tests.benchmarks.importtime            # échoue si le démarrage régresse
+    python -m tests.benchmarks.importtime --update   # réécrire la référence sur cette machine
+
+Deux contrôles : aucun module lourd chargé à l'import, et temps d'import rapporté à celui d'un
+import de référence (bibliothèque standard) mesuré dans le même run, comparé au ratio de
+importtime_baseline.json ; le ratio ne dépend ni de la vitesse de la machine ni de sa charge
+"""
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from typing import Any, Dict, List, Tuple
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "importtime_baseline.json")
+
+# Point d'entrée → instruction d'import
+TARGETS = {
+    "agent": "import core.agent",
+    "web": "import sys; sys.path.insert(0, 'interface/web'); import app",
+    "telegram": "import services.telegram_service",
+    "stats": "import core.stats",
+}
+
+# Import de référence : modules de la bibliothèque standard seulement, mesurés en alternance avec les cibles
+REFERENCE = "import argparse, decimal, email.parser, http.client, json, logging, sqlite3, xml.etree.ElementTree"
+
+# Modules qui ne doivent être chargés qu'au premier usage
+DEFERRED = {
+    "agent": ["openai", "mistralai", "requests", "schedule", "imaplib", "smtplib", "pytz", "cProfile",
+              "concurrent.futures", "multiprocessing"],
+    "web": ["openai", "mistralai", "requests", "subprocess", "cProfile", "tracemalloc"],
+    "telegram": ["requests", "pytz"],
+    "stats": ["openai", "requests"],
+}
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int, int]]:
+    """Lignes « import time: self | cumulé | module » → (module, profondeur, self µs, cumulé µs)"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    return entries
+
+
+def measure(statement: str) -> Dict[str, Any]:
+    """Un démarrage à froid : temps d'import de l'instruction (hors site) et modules chargés"""
+    probe = f"{statement}\nimport sys, json\nprint(json.dumps(sorted(sys.modules)))"
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", probe], cwd=PROJECT_ROOT,
+                          capture_output=True, text=True, env=dict(os.environ, PYTHONDONTWRITEBYTECODE="1"))
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "échec de l'import")
+
+    entries = parse_importtime(proc.stderr)
+    # Tout ce qui précède « site » relève du démarrage de l'interpréteur
+    start = max((i for i, entry in enumerate(entries) if entry[0] == "site" and entry[1] == 0), default=-1) + 1
+    own = entries[start:]
+    return {
+        "total_us": sum(cumulative for _, depth, _, cumulative in own if depth == 0),
+        "entries": own,
+        "modules": json.loads(proc.stdout.strip().splitlines()[-1])
+    }
+
+
+def profile_target(name: str, repeat: int) -> Dict[str, Any]:
+    # Cible et référence alternées : une variation de charge touche les deux mesures
+    runs, references = [], []
+    for _ in range(repeat):
+        runs.append(measure(TARGETS[name]))
+        references.append(measure(REFERENCE)["total_us"])
+    totals = [run["total_us"] for run in runs]
+    median_run = sorted(runs, key=lambda run: run["total_us"])[len(runs) // 2]
+    heaviest = sorted(median_run["entries"], key=lambda entry: entry[3], reverse=True)
+    loaded_early = [module for module in DEFERRED.get(name, [])
+                    if module in median_run["modules"]]
+    return {
+        "total_ms": round(statistics.median(totals) / 1000, 1),
+        "min_ms": round(min(totals) / 1000, 1),
+        "reference_ms": round(statistics.median(references) / 1000, 1),
+        "ratio": round(statistics.median(total / reference for total, reference in zip(totals, references)), 3),
+        "top_cumulative": [(module, round(cumulative / 1000, 1)) for module, _, _, cumulative in heaviest[:12]],
+        "loaded_early": loaded_early
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Temps d'import des points d'entrée")
+    parser.add_argument("targets", nargs="*", help=f"Cibles ({', '.join(TARGETS)}), toutes par défaut")
+    parser.add_argument("--repeat", type=int, default=7, help="Démarrages à froid par cible (médiane)")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Hausse relative du ratio tolérée")
+    parser.add_argument("--min-delta", type=float, default=15.0,
+                        help="Régression ignorée en dessous (ms, au temps de référence de ce run)")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--update", action="store_true", help="Réécrire la référence avec les mesures actuelles")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Détail des modules les plus lents")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.targets if name not in TARGETS]
+    if unknown:
+        parser.error(f"cible inconnue : {', '.join(unknown)}")
+
+    try:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    except (OSError, ValueError):
+        baseline = {}
+
+    failures = 0
+    results = {}
+    for name in args.targets or list(TARGETS):
+        result = profile_target(name, args.repeat)
+        results[name] = result
+        reference = baseline.get(name, {}).get("ratio") if baseline.get("_reference") == REFERENCE else None
+        line = (f"📊 {name:<9} {result['total_ms']:>7} ms (min {result['min_ms']} ms), "
+                f"{result['ratio']} × référence ({result['reference_ms']} ms)")
+        if reference:
+            line += f"  attendu {reference} ({(result['ratio'] - reference) / reference:+.0%})"
+        print(line)
+
+        if args.verbose:
+            for module, ms in result["top_cumulative"]:
+                print(f"      {ms:>7} ms  {module}")
+
+        if result["loaded_early"]:
+            failures += 1
+            print(f"❌ {name} : modules chargés dès l'import : {', '.join(result['loaded_early'])}")
+        if (reference and not args.update
+                and result["ratio"] > reference * (1 + args.threshold)
+                and (result["ratio"] - reference) * result["reference_ms"] > args.min_delta):
+            failures += 1
+            print(f"❌ {name} : démarrage plus lent que la référence (ratio {reference} → {result['ratio']})")
+            for module, ms in result["top_cumulative"][:5]:
+                print(f"      {ms:>7} ms  {module}")
+
+    if args.update:
+        baseline.update({name: {"ratio": result["ratio"], "total_ms": result["total_ms"]}
+                         for name, result in results.items()})
+        baseline["_python"] = sys.version.split()[0]
+        baseline["_reference"] = REFERENCE
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"✅ Référence écrite dans {args.baseline}")
+
+    if failures:
+        print(f"⚠️ {failures} régression(s) du démarrage")
+        return 1
+    print("✅ Démarrage conforme")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
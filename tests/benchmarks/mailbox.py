@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Boîte mail synthétique pour les benchmarks
+Messages MIME réalistes : multipart, pièces jointes, sujets encodés, jeux de caractères variés
+"""
+
+import random
+from datetime import datetime, timedelta
+from email.header import Header
+from email.message import EmailMessage
+from email.utils import format_datetime, make_msgid
+from typing import Dict, Iterator, List, Optional
+
+SUBJECTS = [
+    "Mission freelance Python / API REST",
+    "Développeur backend Django - 3 mois full remote",
+    "Projet IA : intégration LLM dans notre CRM",
+    "Recherche développeur FastAPI pour MVP",
+    "Urgent sans budget : refonte site vitrine",
+    "Newsletter : les nouveautés de la semaine",
+    "Exposition gratuite pour votre portfolio",
+    "Data engineer - pipeline ETL en Python",
+    "Bénévolat : association cherche développeur",
+    "Proposition de mission – microservices et API",
+]
+
+BODIES = [
+    "Bonjour,\n\nNous cherchons un développeur backend Python pour une mission de {days} jours "
+    "en full remote. Budget : {budget} €. Stack : FastAPI, PostgreSQL, Docker.\n\nCordialement,\n{name}",
+    "Bonjour,\n\nNotre startup souhaite intégrer un LLM (IA générative) à son produit. "
+    "Durée estimée {days} jours, budget {budget} €, télétravail possible.\n\n{name}",
+    "Hello,\n\nWe need an API developer for {days} days. Budget {budget} EUR. Remote.\n\nBest,\n{name}",
+    "Bonjour,\n\nMission gratuite pour gagner en visibilité, exposition garantie.\n\n{name}",
+    "Bonjour,\n\nVoici notre newsletter hebdomadaire avec les dernières actualités du secteur.\n\n{name}",
+]
+
+NAMES = ["Élodie Martin", "Jérôme Dubois", "Anaïs Lefèvre", "Marc Petit", "Zoé Garnier", "Hugo Roux"]
+DOMAINS = ["startup.io", "agence-web.fr", "malt.fr", "example.com", "société-conseil.fr", "gmail.com"]
+CHARSETS = ["utf-8", "utf-8", "iso-8859-1", "windows-1252"]
+
+# Pièces jointes : (type MIME, extension, taille en octets)
+ATTACHMENTS = [
+    ("application", "pdf", "cahier_des_charges.pdf", 48_000),
+    ("application", "vnd.openxmlformats-officedocument.wordprocessingml.document", "brief.docx", 22_000),
+    ("image", "png", "maquette.png", 120_000),
+    ("text", "plain", "notes.txt", 2_000),
+]
+
+
+def _encodable(text: str, charset: str) -> bool:
+    try:
+        text.encode(charset)
+        return True
+    except UnicodeEncodeError:
+        return False
+
+
+def build_message(index: int, rng: random.Random, base_date: Optional[datetime] = None,
+                  attachment_rate: float = 0.3, html_rate: float = 0.5) -> bytes:
+    """Construire un email MIME complet (bytes RFC 822)"""
+    base_date = base_date or datetime(2026, 1, 1, 8, 0)
+    name = rng.choice(NAMES)
+    domain = rng.choice(DOMAINS)
+    subject = rng.choice(SUBJECTS)
+    charset = rng.choice(CHARSETS)
+    body = rng.choice(BODIES).format(days=rng.randint(5, 90), budget=rng.choice([0, 300, 800, 2500, 6000]),
+                                     name=name)
+    if not _encodable(body + subject, charset):
+        charset = "utf-8"
+
+    msg = EmailMessage()
+    # Sujet encodé RFC 2047 (base64 ou quoted-printable selon le jeu de caractères)
+    msg["Subject"] = Header(f"{subject} #{index}", charset).encode(maxlinelen=0)
+    msg["From"] = str(Header(name, "utf-8")) + f" <{name.split()[0].lower()}@{domain}>"
+    msg["To"] = "freelance@example.com"
+    msg["Date"] = format_datetime(base_date + timedelta(minutes=7 * index))
+    msg["Message-ID"] = make_msgid(domain="bench.local")
+    msg.set_content(body, charset=charset)
+
+    if rng.random() < html_rate:
+        html = "<html><body>" + "".join(f"<p>{line}</p>" for line in body.split("\n") if line) + "</body></html>"
+        msg.add_alternative(html, subtype="html", charset="utf-8")
+
+    if rng.random() < attachment_rate:
+        maintype, subtype, filename, size = rng.choice(ATTACHMENTS)
+        payload = rng.randbytes(size) if maintype != "text" else ("lorem ipsum " * (size // 12)).encode()
+        msg.add_attachment(payload, maintype=maintype, subtype=subtype, filename=filename)
+
+    return msg.as_bytes()
+
+
+def generate_mailbox(count: int, seed: int = 42, **kwargs) -> List[bytes]:
+    """Générer count messages de manière déterministe"""
+    rng = random.Random(seed)
+    return [build_message(i, rng, **kwargs) for i in range(count)]
+
+
+def iter_log_entries(count: int, seed: int = 42, start: Optional[datetime] = None) -> Iterator[Dict]:
+    """Entrées d'opportunities_log.json synthétiques (pour les scénarios web et stats)"""
+    rng = random.Random(seed)
+    start = start or datetime(2025, 1, 1)
+    step = timedelta(seconds=max(1, int(365 * 86400 / max(count, 1))))
+    for i in range(count):
+        pertinence = rng.randint(0, 10)
+        retained = pertinence >= 7
+        yield {
+            "timestamp": (start + step * i).isoformat(),
+            "email_id": str(i),
+            "subject": f"{rng.choice(SUBJECTS)} #{i}",
+            "sender": f"{rng.choice(NAMES)} <contact{i % 500}@{rng.choice(DOMAINS)}>",
+            "pertinence": pertinence,
+            "decision": "✅ Mission retenue" if retained else "❌ Mission rejetée – hors cible",
+            "action": "Réponse envoyée" if retained else "Rejetée",
+            "raisons": rng.sample(["Budget suffisant", "Technologies Python/API", "Full remote",
+                                   "Budget insuffisant", "Hors cible", "Durée trop longue"], 2),
+            "llm_latency_ms": round(rng.uniform(300, 4000), 1),
+            "llm_tokens": rng.randint(400, 1600),
+            "llm_cost": 0.0
+        }
@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Scénarios de benchmark : pipeline de l'agent, API web, statistiques et modèle de lecture sur de gros logs
+Chaque scénario retourne un dictionnaire JSON (débit, p50/p95 par étape, RSS maximal)
+"""
+
+import os
+import sys
+import copy
+import json
+import time
+import imaplib
+import smtplib
+import resource
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, PROJECT_ROOT)
+
+from tests.benchmarks.mailbox import generate_mailbox, iter_log_entries
+from tests.benchmarks.fakes import (FaultInjector, FakeIMAPServer, FakeSMTPServer,
+                                    FakeLLMServer, FakeTelegramServer)
+
+
+class ScenarioSkipped(Exception):
+    """Scénario impossible dans cet environnement (dépendance absente)"""
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    """Percentile au rang le plus proche"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def describe(samples: List[float], scale: float = 1000.0) -> Dict[str, Any]:
+    """count, p50, p95 et max (en ms par défaut)"""
+    return {
+        "count": len(samples),
+        "p50_ms": round(percentile(samples, 0.50) * scale, 3),
+        "p95_ms": round(percentile(samples, 0.95) * scale, 3),
+        "max_ms": round(max(samples) * scale, 3) if samples else 0.0
+    }
+
+
+def peak_rss_mb() -> float:
+    """RSS maximal du processus (ru_maxrss est en Ko sous Linux, en octets sous macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+@contextmanager
+def working_directory(path: str):
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+@contextmanager
+def local_mail_servers(imap_port: int, smtp_port: int):
+    """Rediriger IMAP4_SSL/SMTP_SSL (serveurs Gmail codés en dur) vers les serveurs locaux"""
+    original_imap, original_smtp = imaplib.IMAP4_SSL, smtplib.SMTP_SSL
+    imaplib.IMAP4_SSL = lambda *args, **kwargs: imaplib.IMAP4("127.0.0.1", imap_port)
+    smtplib.SMTP_SSL = lambda *args, **kwargs: smtplib.SMTP("127.0.0.1", smtp_port)
+    try:
+        yield
+    finally:
+        imaplib.IMAP4_SSL, smtplib.SMTP_SSL = original_imap, original_smtp
+
+
+@contextmanager
+def recording(histogram, key: Callable[[Dict[str, Any]], str]):
+    """Conserver les valeurs brutes observées par un histogramme (percentiles exacts)"""
+    samples = {}
+    original = histogram.observe
+
+    def observe(value, **labels):
+        samples.setdefault(key(labels), []).append(value)
+        original(value, **labels)
+
+    histogram.observe = observe
+    try:
+        yield samples
+    finally:
+        histogram.observe = original
+
+
+def agent_config(llm: FakeLLMServer, telegram: FakeTelegramServer) -> Dict[str, Any]:
+    from utils.config import DEFAULT_CONFIG
+    config = copy.deepcopy(DEFAULT_CONFIG)
+    config["openai_api_key"] = "sk-benchmark"
+    config["email"] = {"username": "bench@example.com", "password": "bench"}
+    config["telegram"] = {
+        "enabled": True,
+        "bot_token": "123:bench",
+        "chat_id": "42",
+        "api_base": telegram.base_url,
+        "digest_window": 0.5,
+        "daily_report": {"enabled": False}
+    }
+    return config
+
+
+def run_agent(workdir: str, emails: int, llm_latency: float = 0.05, imap_latency: float = 0.0,
+              smtp_latency: float = 0.0, telegram_latency: float = 0.0, error_rate: float = 0.0,
+              seed: int = 42) -> Dict[str, Any]:
+    """Un cycle AgentIANocturne.run_once sur une boîte de `emails` messages non lus"""
+    try:
+        import openai
+        from core import agent as agent_module
+        from utils import metrics
+    except ImportError as e:
+        raise ScenarioSkipped(f"dépendance manquante : {e}")
+
+    messages = generate_mailbox(emails, seed=seed)
+    imap = FakeIMAPServer(messages, FaultInjector(imap_latency, imap_latency / 2, error_rate, seed))
+    smtp = FakeSMTPServer(FaultInjector(smtp_latency, smtp_latency / 2, error_rate, seed + 1))
+    llm = FakeLLMServer(FaultInjector(llm_latency, llm_latency / 2, error_rate, seed + 2))
+    telegram = FakeTelegramServer(FaultInjector(telegram_latency, telegram_latency / 2, error_rate, seed + 3))
+
+    with imap, smtp, llm, telegram, working_directory(workdir), \
+            local_mail_servers(imap.port, smtp.port), \
+            recording(metrics.STAGE_DURATION, lambda labels: labels["stage"]) as stages, \
+            recording(agent_module.LLM_LATENCY, lambda labels: f"{labels['provider']}:{labels['operation']}") as llm_calls:
+        # Pas de première exécution : recherche UNSEEN sur toute la boîte
+        open("processed_emails.txt", "a").close()
+
+        agent = agent_module.AgentIANocturne(agent_config(llm, telegram))
+        agent.openai_client = openai.OpenAI(api_key="sk-benchmark", base_url=llm.base_url, max_retries=0)
+        agent.mistral_client = None
+
+        start = time.perf_counter()
+        agent.run_once()
+        elapsed = time.perf_counter() - start
+
+        drain_start = time.perf_counter()
+        if agent.telegram_notifier:
+            agent.telegram_notifier.close(flush_timeout=30)
+        drain = time.perf_counter() - drain_start
+
+        processed = agent.metrics["emails_processed"]
+        return {
+            "emails": emails,
+            "processed": processed,
+            "seconds": round(elapsed, 3),
+            "emails_per_sec": round(processed / elapsed, 2) if elapsed else 0.0,
+            "stages": {stage: describe(values) for stage, values in sorted(stages.items())},
+            "llm": {call: describe(values) for call, values in sorted(llm_calls.items())},
+            "telegram_drain_seconds": round(drain, 3),
+            "servers": {
+                "imap": {"requests": imap.requests, "errors": imap.errors},
+                "smtp": {"requests": smtp.requests, "errors": smtp.errors, "delivered": len(smtp.messages)},
+                "llm": {"requests": llm.requests, "errors": llm.errors},
+                "telegram": {"requests": telegram.requests, "errors": telegram.errors, "sent": telegram.sent}
+            },
+            "peak_rss_mb": peak_rss_mb()
+        }
+
+
+def write_log(workdir: str, entries: int, seed: int = 42) -> str:
+    """Écrire un opportunities_log.json de `entries` entrées (tableau JSON, comme l'agent)"""
+    path = os.path.join(workdir, "opportunities_log.json")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[")
+        for i, entry in enumerate(iter_log_entries(entries, seed=seed)):
+            f.write(("," if i else "") + "\n" + json.dumps(entry, ensure_ascii=False))
+        f.write("\n]")
+    return path
+
+
+def point_web_app_at(app_module, workdir: str):
+    """Faire lire au serveur web les fichiers d'un répertoire de données donné"""
+    from core.sketches import SketchStore
+    from data.storage.segments import SegmentStore
+    from data.storage.usage_ledger import UsageLedger
+    from utils.config import ConfigStore
+
+    app_module.parent_dir = workdir
+    app_module.OPPORTUNITIES_FILE = os.path.join(workdir, "opportunities_log.json")
+    app_module.ROLLUPS_FILE = os.path.join(workdir, "timeseries_rollups.json")
+    app_module.SEARCH_INDEX_FILE = os.path.join(workdir, "opportunities_index.db")
+    app_module.SENDERS_FILE = os.path.join(workdir, "sender_reputation.db")
+    app_module.COLUMNS_FILE = os.path.join(workdir, "opportunities_columns.bin")
+    app_module.sketch_store = SketchStore(os.path.join(workdir, "sketches"))
+    app_module.segment_store = SegmentStore(os.path.join(workdir, "opportunity_segments"))
+    app_module.config_store = ConfigStore(os.path.join(workdir, "agent_config.json"))
+    app_module.usage_ledger = UsageLedger(os.path.join(workdir, "llm_usage.json"), calls_path=None)
+
+
+WEB_ENDPOINTS = [
+    "/",
+    "/api/stats",
+    "/api/stats?period=month&decision=retained&sender=gmail",
+    "/api/opportunities",
+    "/api/opportunities?decision=retained&limit=50",
+    "/api/timeseries?granularity=day",
+    "/api/search?q=python",
+    "/api/stats/approx",
+    "/metrics",
+]
+
+
+def run_web(workdir: str, entries: int, requests_per_endpoint: int = 50, seed: int = 42) -> Dict[str, Any]:
+    """Latence des pages et API web sur un log de `entries` entrées (premier appel à froid mesuré à part)"""
+    try:
+        sys.path.insert(0, os.path.join(PROJECT_ROOT, "interface", "web"))
+        import app as app_module
+    except ImportError as e:
+        raise ScenarioSkipped(f"dépendance manquante : {e}")
+    from core.sketches import open_sketches
+
+    write_start = time.perf_counter()
+    path = write_log(workdir, entries, seed)
+    write_seconds = time.perf_counter() - write_start
+    # Sketches reportés depuis le log par l'agent (le serveur web ne fait que les lire)
+    open_sketches(os.path.join(workdir, "sketches"), path)
+    point_web_app_at(app_module, workdir)
+    client = app_module.app.test_client()
+
+    endpoints = {}
+    for url in WEB_ENDPOINTS:
+        start = time.perf_counter()
+        response = client.get(url)
+        cold = time.perf_counter() - start
+        samples = []
+        for _ in range(requests_per_endpoint):
+            start = time.perf_counter()
+            client.get(url)
+            samples.append(time.perf_counter() - start)
+        endpoints[url] = dict(describe(samples), cold_ms=round(cold * 1000, 3), status=response.status_code)
+
+    return {
+        "entries": entries,
+        "log_write_seconds": round(write_seconds, 3),
+        "log_size_mb": round(os.path.getsize(os.path.join(workdir, "opportunities_log.json")) / 1e6, 2),
+        "endpoints": endpoints,
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+
+def run_stats(workdir: str, entries: int, seed: int = 42) -> Dict[str, Any]:
+    """Statistiques en streaming (core/stats.py) sur un log de `entries` entrées"""
+    from core.stats import stream_stats
+
+    path = write_log(workdir, entries, seed)
+    stats, _, throughput = stream_stats(path)
+    return {
+        "entries": entries,
+        "seconds": throughput["seconds"],
+        "entries_per_sec": throughput["entries_per_second"],
+        "total_opportunities": stats.get("total_opportunities", 0),
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+
+def traced_mb(build: Callable[[], Any]):
+    """(objet construit, mémoire Python qu'il retient en Mo)"""
+    tracemalloc.start()
+    try:
+        result = build()
+        return result, round(tracemalloc.get_traced_memory()[0] / 1e6, 2)
+    finally:
+        tracemalloc.stop()
+
+
+def timed(fn: Callable[[], Any], repeats: int) -> Dict[str, Any]:
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return describe(samples)
+
+
+def dict_stats(opportunities: List[Dict[str, Any]]) -> tuple:
+    """Agrégats de /api/stats sur la liste de dicts (implémentation d'avant le modèle en colonnes)"""
+    accepted = sum(1 for opp in opportunities if opp.get('decision', '').startswith('✅'))
+    rejected = sum(1 for opp in opportunities if opp.get('decision', '').startswith('❌'))
+    pertinences = [opp.get('pertinence', 0) for opp in opportunities if opp.get('pertinence')]
+    return len(opportunities), accepted, rejected, sum(pertinences) / len(pertinences) if pertinences else 0
+
+
+def run_readmodel(workdir: str, entries: int, repeats: int = 20, seed: int = 42) -> Dict[str, Any]:
+    """Modèle en colonnes du serveur web face à la liste de dicts : mémoire, chargement, agrégats et filtres"""
+    from core.stats import iter_opportunities
+    from data.storage.columnar import OpportunityColumns, HAS_NUMPY
+
+    path = write_log(workdir, entries, seed)
+    columns_path = os.path.join(workdir, "opportunities_columns.bin")
+
+    def load_dicts():
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    start = time.perf_counter()
+    columns = OpportunityColumns.from_entries(iter_opportunities(path))
+    encode_seconds = time.perf_counter() - start
+    columns.save(columns_path)
+    opportunities, dicts_mb = traced_mb(load_dicts)
+    _, columns_mb = traced_mb(lambda: OpportunityColumns.from_entries(iter_opportunities(path)))
+    mapped, mapped_mb = traced_mb(lambda: OpportunityColumns.load(columns_path))
+
+    def column_stats(store):
+        decisions = store.value_counts("decision")
+        return (store.count(), sum(n for d, n in decisions.items() if d.startswith("✅")),
+                sum(n for d, n in decisions.items() if d.startswith("❌")), store.pertinence()[0])
+
+    def dict_filter():
+        return [opp for opp in opportunities
+                if opp.get("decision", "").startswith("✅") and "gmail" in opp.get("sender", "").lower()]
+
+    def column_filter(store):
+        return store.count(store.select(decision="retained", sender="gmail"))
+
+    expected = dict_stats(opportunities)
+    for store in (columns, mapped):
+        got = column_stats(store)
+        if got[:3] != expected[:3] or abs(got[3] - expected[3]) > 1e-3 or column_filter(store) != len(dict_filter()):
+            raise RuntimeError(f"résultats divergents : {got} au lieu de {expected}")
+
+    return {
+        "entries": entries,
+        "numpy": HAS_NUMPY,
+        "dicts_mb": dicts_mb,
+        "columns_mb": columns_mb,
+        "columns_mmap_heap_mb": mapped_mb,
+        "columns_file_mb": round(os.path.getsize(columns_path) / 1e6, 2),
+        "load_seconds": {
+            "dicts": timed(load_dicts, 1)["p50_ms"] / 1000,
+            "columns_encode": round(encode_seconds, 3),
+            "columns_mmap": timed(lambda: OpportunityColumns.load(columns_path), 1)["p50_ms"] / 1000
+        },
+        "queries": {
+            "stats_dicts": timed(lambda: dict_stats(opportunities), repeats),
+            "stats_columns": timed(lambda: column_stats(mapped), repeats),
+            "filter_dicts": timed(dict_filter, repeats),
+            "filter_columns": timed(lambda: column_filter(mapped), repeats)
+        },
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+
+SCENARIOS = {
+    "agent": run_agent,
+    "web": run_web,
+    "stats": run_stats,
+    "readmodel": run_readmodel,
+}
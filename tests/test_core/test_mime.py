@@ -0,0 +1,107 @@
+"""Tests de l'analyse MIME en flux : frontières et base64 coupés entre deux blocs"""
+
+import os
+import random
+from email.message import EmailMessage
+
+import pytest
+
+from core.mime import StreamingParser, parse_bytes, iter_parts
+
+CHUNK_SIZES = [1, 2, 3, 7, 64, 76, 77, 1 << 20]
+
+
+def _attachment() -> bytes:
+    return random.Random(42).randbytes(5000)
+
+
+def _raw_message(linesep: str = "\r\n") -> bytes:
+    msg = EmailMessage()
+    msg["From"] = "client@example.com"
+    msg["To"] = "moi@example.com"
+    msg["Subject"] = "Mission Python"
+    msg.set_content("Bonjour,\nMission de 3 mois en Python.\n")
+    msg.add_attachment(_attachment(), maintype="application", subtype="pdf", filename="cahier.pdf")
+    return msg.as_bytes(policy=msg.policy.clone(linesep=linesep))
+
+
+def _text(parsed) -> str:
+    parts = [part for part in iter_parts(parsed.message) if part.get_content_type() == "text/plain"]
+    return parts[0].get_payload(decode=True).decode()
+
+
+@pytest.mark.parametrize("linesep", ["\r\n", "\n"])
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_piece_jointe_identique_quel_que_soit_le_decoupage(tmp_path, chunk_size, linesep):
+    raw = _raw_message(linesep)
+    with parse_bytes(raw, chunk_size=chunk_size, spool=lambda content_type, filename: True,
+                     spool_dir=str(tmp_path)) as parsed:
+        assert _text(parsed).replace("\r\n", "\n") == "Bonjour,\nMission de 3 mois en Python.\n"
+        assert len(parsed.attachments) == 1
+        part = parsed.attachments[0]
+        assert (part.content_type, part.filename, part.truncated) == ("application/pdf", "cahier.pdf", False)
+        assert part.size == len(_attachment())
+        with part.map() as view:
+            assert bytes(view) == _attachment()
+        spool_dir = parsed.spool_dir
+    assert not os.path.exists(spool_dir)
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_piece_jointe_ignoree_sans_spool(chunk_size):
+    raw = _raw_message()
+    with parse_bytes(raw, chunk_size=chunk_size) as parsed:
+        assert parsed.attachments == []
+        assert parsed.stats["spooled"] == 0
+        assert parsed.stats["skipped"] > 0
+        assert "Mission de 3 mois" in _text(parsed)
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_piece_jointe_tronquee(tmp_path, chunk_size):
+    with parse_bytes(_raw_message(), chunk_size=chunk_size, max_attachment_bytes=1000,
+                     spool=lambda content_type, filename: True, spool_dir=str(tmp_path)) as parsed:
+        part = parsed.attachments[0]
+        assert part.truncated
+        with part.map() as view:
+            assert bytes(view) == _attachment()[:part.size]
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_message_transfere(chunk_size):
+    inner = EmailMessage()
+    inner["From"] = "recruteur@example.com"
+    inner["Subject"] = "Offre initiale"
+    inner.set_content("Mission Django à Lyon")
+    outer = EmailMessage()
+    outer["From"] = "collegue@example.com"
+    outer["Subject"] = "Fwd: Offre initiale"
+    outer.set_content("Ça pourrait t'intéresser")
+    outer.add_attachment(inner)
+    raw = outer.as_bytes()
+
+    with parse_bytes(raw, chunk_size=chunk_size) as parsed:
+        forwarded = [part for part in iter_parts(parsed.message) if part.get_content_type() == "message/rfc822"]
+        assert len(forwarded) == 1
+        inner_parsed = forwarded[0].get_payload()[0]
+        assert inner_parsed["Subject"] == "Offre initiale"
+        body = inner_parsed.get_payload(decode=True).decode()
+        assert body.strip() == "Mission Django à Lyon"
+        assert _text(parsed).strip() == "Ça pourrait t'intéresser"
+
+
+def test_frontiere_coupee_entre_deux_blocs(tmp_path):
+    raw = _raw_message()
+    boundary = b"--" + raw.split(b'boundary="')[1].split(b'"')[0]
+    # Chaque ligne de frontière (y compris \r\n) coupée à chaque position
+    starts = [i for i in range(len(raw)) if raw.startswith(boundary, i)]
+    assert len(starts) == 3
+    for start in starts:
+        for cut in range(start, start + len(boundary) + 5):
+            parser = StreamingParser(spool=lambda content_type, filename: True, spool_dir=str(tmp_path))
+            parser.feed(raw[:cut])
+            parser.feed(raw[cut:])
+            with parser.close() as parsed:
+                assert "Mission de 3 mois" in _text(parsed)
+                with parsed.attachments[0].map() as view:
+                    assert bytes(view) == _attachment()
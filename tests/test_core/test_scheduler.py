@@ -0,0 +1,164 @@
+"""Tests du planificateur : pas de chevauchement, entrées périmées, arrêt rapide, intervalle adaptatif"""
+
+import time
+import threading
+from datetime import datetime
+
+import pytest
+
+from core.scheduler import AdaptiveInterval, Scheduler
+
+CONFIG = {
+    "interval_minutes": 5,
+    "min_interval_minutes": 1,
+    "max_interval_minutes": 15,
+    "target_emails_per_cycle": 2,
+    "smoothing": 1.0,
+    "night": {"start": "22:00", "end": "07:00", "min_interval_minutes": 10, "max_interval_minutes": 30},
+}
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = Scheduler()
+    thread = threading.Thread(target=scheduler.run, daemon=True)
+    thread.start()
+    yield scheduler
+    scheduler.shutdown()
+    thread.join(timeout=2)
+
+
+def wait_until(predicate, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_pas_de_chevauchement(scheduler):
+    active, peak = [0], [0]
+    lock = threading.Lock()
+    started = threading.Event()
+
+    def work():
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        started.set()
+        time.sleep(0.3)
+        with lock:
+            active[0] -= 1
+
+    job = scheduler.every("fetch", 3600, work, run_now=True)
+    assert started.wait(2)
+    # Déclenchements pendant l'exécution : une seule relance, à la fin de celle en cours
+    for _ in range(3):
+        scheduler.trigger("fetch")
+        time.sleep(0.02)
+    assert job.running
+    assert wait_until(lambda: job.runs == 2 and not job.running)
+    time.sleep(0.2)
+    assert job.runs == 2
+    assert peak[0] == 1
+    assert scheduler.next_run("fetch") > time.time() + 3000
+
+
+def test_entree_perimee_ignoree_apres_trigger(scheduler):
+    runs = []
+    job = scheduler.add("report", lambda: runs.append(time.time()), lambda: time.time() + 3600,
+                        first_run=time.time() + 0.3)
+    scheduler.trigger("report")
+    assert wait_until(lambda: job.runs == 1)
+    # L'ancienne échéance (+0.3 s) est restée dans le tas mais ne relance pas le job
+    time.sleep(0.5)
+    assert len(runs) == 1
+    assert job.next_run > time.time() + 3000
+
+
+def test_job_periodique_relance(scheduler):
+    job = scheduler.every("tick", 0.05, lambda: time.sleep(0.05), run_now=True)
+    assert wait_until(lambda: job.runs >= 3)
+    assert job.last_duration >= 0.05
+
+
+def test_run_rend_la_main_sur_stop():
+    scheduler = Scheduler()
+    scheduler.every("fetch", 3600, lambda: None)
+    thread = threading.Thread(target=scheduler.run, daemon=True)
+    thread.start()
+    time.sleep(0.1)
+    start = time.monotonic()
+    scheduler.stop()
+    thread.join(timeout=2)
+    assert not thread.is_alive()
+    assert time.monotonic() - start < 0.5
+    scheduler.shutdown()
+
+
+def test_pas_de_relance_apres_stop():
+    scheduler = Scheduler()
+    release = threading.Event()
+    job = scheduler.every("fetch", 0.01, release.wait, run_now=True)
+    thread = threading.Thread(target=scheduler.run, daemon=True)
+    thread.start()
+    assert wait_until(lambda: job.running)
+    scheduler.stop()
+    release.set()
+    thread.join(timeout=2)
+    scheduler.shutdown()
+    assert job.runs == 1
+
+
+@pytest.mark.parametrize("hour, minute, expected", [
+    (12, 0, (60, 900)),
+    (21, 59, (60, 900)),
+    (22, 0, (600, 1800)),
+    (23, 30, (600, 1800)),
+    (0, 0, (600, 1800)),
+    (6, 59, (600, 1800)),
+    (7, 0, (60, 900)),
+])
+def test_bornes_jour_nuit_passant_minuit(hour, minute, expected):
+    interval = AdaptiveInterval(CONFIG)
+    assert interval.bounds(datetime(2025, 1, 15, hour, minute)) == expected
+
+
+def test_nuit_ignoree_avec_notifications_de_nuit():
+    interval = AdaptiveInterval(CONFIG, night_notifications=True)
+    assert interval.bounds(datetime(2025, 1, 15, 2, 0)) == (60, 900)
+
+
+def test_fenetre_de_nuit_sans_passage_de_minuit():
+    config = dict(CONFIG, night={"start": "01:00", "end": "05:00"})
+    interval = AdaptiveInterval(config)
+    assert interval.bounds(datetime(2025, 1, 15, 0, 59)) == (60, 900)
+    assert interval.bounds(datetime(2025, 1, 15, 3, 0)) == (600, 1800)
+    assert interval.bounds(datetime(2025, 1, 15, 5, 0)) == (60, 900)
+
+
+def test_intervalle_borne():
+    day, night = datetime(2025, 1, 15, 12, 0), datetime(2025, 1, 15, 23, 0)
+    interval = AdaptiveInterval(CONFIG)
+    # Aucun débit observé : intervalle de base, borné
+    assert interval.next(day) == 300
+    assert interval.next(night) == 600
+
+    # Débit élevé : intervalle minimal
+    interval.observe(100, 60)
+    assert interval.next(day) == 60
+    assert interval.next(night) == 600
+
+    # Aucun email : intervalle maximal
+    interval.observe(0, 60)
+    assert interval.next(day) == 900
+    assert interval.next(night) == 1800
+
+    # Débit moyen : cible atteinte dans les bornes (2 emails / (1 email / 240 s) = 480 s)
+    interval.observe(1, 240)
+    assert interval.next(day) == pytest.approx(480)
+    assert interval.next(night) == 600
+
+    interval.observe(5, 0)
+    assert interval.next(day) == pytest.approx(480)
@@ -0,0 +1,145 @@
+"""Tests des statistiques en streaming : résultat identique au calcul en mémoire d'origine"""
+
+import json
+import random
+import statistics
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+import pytest
+
+from core import stats
+from core.stats import StatsAccumulator, iter_opportunities, stream_stats
+
+
+class FrozenDatetime(datetime):
+    """Heure courante fixe : un timestamp illisible vaut datetime.now() des deux côtés"""
+
+    @classmethod
+    def now(cls, tz=None):
+        return cls(2025, 3, 1, 12, 0)
+
+
+@pytest.fixture(autouse=True)
+def frozen_now(monkeypatch):
+    monkeypatch.setattr(stats, "datetime", FrozenDatetime)
+
+
+def reference_stats(opportunities):
+    """calculate_stats d'avant le streaming (liste complète en mémoire)"""
+    if not opportunities:
+        return {}
+    result = {"total_opportunities": len(opportunities), "period": {}, "decisions": {}, "pertinence": {},
+              "senders": {}, "actions": {}, "daily_activity": {}, "top_keywords": {}, "performance": {}}
+
+    timestamps = [stats.parse_timestamp(opp["timestamp"]) for opp in opportunities]
+    result["period"]["debut"] = min(timestamps).strftime("%d/%m/%Y %H:%M")
+    result["period"]["fin"] = max(timestamps).strftime("%d/%m/%Y %H:%M")
+    result["period"]["duree"] = (max(timestamps) - min(timestamps)).days
+    result["decisions"] = dict(Counter(opp.get("decision", "Non défini") for opp in opportunities))
+
+    pertinences = [opp.get("pertinence", 0) for opp in opportunities]
+    result["pertinence"]["moyenne"] = round(statistics.mean(pertinences), 2)
+    result["pertinence"]["mediane"] = statistics.median(pertinences)
+    result["pertinence"]["min"] = min(pertinences)
+    result["pertinence"]["max"] = max(pertinences)
+    result["pertinence"]["distribution"] = dict(Counter(pertinences))
+
+    result["senders"] = dict(Counter(opp.get("sender", "Inconnu") for opp in opportunities).most_common(10))
+    result["actions"] = dict(Counter(opp.get("action", "Aucune") for opp in opportunities))
+    daily_activity = defaultdict(int)
+    for opp in opportunities:
+        daily_activity[stats.parse_timestamp(opp["timestamp"]).strftime("%d/%m/%Y")] += 1
+    result["daily_activity"] = dict(daily_activity)
+    result["top_keywords"] = dict(Counter(reason for opp in opportunities
+                                          for reason in opp.get("raisons", [])).most_common(10))
+
+    missions = sum(1 for opp in opportunities if "✅ Mission retenue" in opp.get("decision", ""))
+    reponses = sum(1 for opp in opportunities if "Réponse envoyée" in opp.get("action", ""))
+    result["performance"]["missions_retennes"] = missions
+    result["performance"]["reponses_envoyees"] = reponses
+    result["performance"]["taux_retention"] = round(missions / len(opportunities) * 100, 1)
+    result["performance"]["taux_reponse"] = round(reponses / len(opportunities) * 100, 1)
+    return result
+
+
+def make_opportunities(count, seed=7):
+    """Log varié : champs absents, pertinences entières et décimales, timestamps égaux ou illisibles"""
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1, 8, 0)
+    opportunities = []
+    for n in range(count):
+        opp = {"timestamp": (start + timedelta(minutes=rng.choice([0, 37, 600]) * n)).isoformat()}
+        if rng.random() < 0.9:
+            opp["decision"] = rng.choice(["✅ Mission retenue", "❌ Mission rejetée", "⏸️ En attente"])
+        if rng.random() < 0.9:
+            opp["pertinence"] = rng.choice([0, 3, 5, 7.5, 8, 10])
+        if rng.random() < 0.8:
+            opp["sender"] = f"client{rng.randrange(15)}@example.com"
+        if rng.random() < 0.7:
+            opp["action"] = rng.choice(["📤 Réponse envoyée", "Aucune", "📝 Brouillon"])
+        if rng.random() < 0.8:
+            opp["raisons"] = rng.sample(["python", "remote", "django", "data", "tjm", "lyon"], rng.randrange(4))
+        opp["subject"] = f"Mission {n}"
+        opportunities.append(opp)
+    opportunities.append({"timestamp": "pas une date", "pertinence": 2})
+    opportunities.append({"timestamp": "2025-02-10 09:00:00", "raisons": []})
+    return opportunities
+
+
+def write_log(path, opportunities, jsonl):
+    with open(path, 'w', encoding='utf-8') as f:
+        if jsonl:
+            for opp in opportunities:
+                f.write(json.dumps(opp, ensure_ascii=False) + "\n")
+        else:
+            json.dump(opportunities, f, ensure_ascii=False, indent=2)
+
+
+@pytest.mark.parametrize("jsonl", [False, True])
+@pytest.mark.parametrize("count", [1, 2, 250])
+def test_streaming_identique_au_calcul_en_memoire(tmp_path, jsonl, count):
+    opportunities = make_opportunities(count)[:count]
+    path = tmp_path / ("log.jsonl" if jsonl else "log.json")
+    write_log(path, opportunities, jsonl)
+
+    result, recent, throughput = stream_stats(str(path))
+    assert result == reference_stats(opportunities)
+    assert throughput["entries"] == count
+    expected_recent = sorted(opportunities, key=lambda opp: stats.parse_timestamp(opp["timestamp"]),
+                             reverse=True)[:10]
+    assert recent == expected_recent
+
+
+@pytest.mark.parametrize("jsonl", [False, True])
+def test_champs_absents_ou_invalides(tmp_path, jsonl):
+    opportunities = make_opportunities(400, seed=3)
+    path = tmp_path / ("log.jsonl" if jsonl else "log.json")
+    write_log(path, opportunities, jsonl)
+
+    assert list(iter_opportunities(str(path), chunk_size=64)) == opportunities
+    result, _, _ = stream_stats(str(path))
+    assert result == reference_stats(opportunities)
+
+
+@pytest.mark.parametrize("content", ["", "[]", "[\n]\n", "\n\n"])
+def test_log_vide(tmp_path, content):
+    path = tmp_path / "log.json"
+    path.write_text(content, encoding="utf-8")
+    result, recent, throughput = stream_stats(str(path))
+    assert result == {} == reference_stats([])
+    assert recent == []
+    assert throughput["entries"] == 0
+
+
+def test_json_tronque(tmp_path):
+    path = tmp_path / "log.json"
+    path.write_text('[{"timestamp": "2025-01-01T08:00:00"}, {"timestamp": ', encoding="utf-8")
+    with pytest.raises(ValueError):
+        list(iter_opportunities(str(path), chunk_size=8))
+
+
+def test_calculate_stats_egale_accumulateur():
+    opportunities = make_opportunities(100, seed=11)
+    assert stats.calculate_stats(opportunities) == reference_stats(opportunities)
+    assert StatsAccumulator(recent_limit=0).add_all(iter(opportunities)).result() == reference_stats(opportunities)
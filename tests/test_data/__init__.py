@@ -0,0 +1 @@
+"""Module tests/test_data"""
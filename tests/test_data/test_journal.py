@@ -0,0 +1,58 @@
+"""Tests du journal de traitement : un seul passage à sending entre deux connexions"""
+
+import threading
+
+from data.storage.journal import PipelineJournal, ANALYZED, DRAFTED, SENDING, SENT, LOGGED
+
+
+def _race(journals, email_id):
+    """Lancer advance(SENDING) simultanément depuis chaque connexion"""
+    barrier = threading.Barrier(len(journals))
+    results = [None] * len(journals)
+
+    def attempt(index, journal):
+        barrier.wait()
+        results[index] = journal.advance(email_id, SENDING, {"owner": index})
+
+    threads = [threading.Thread(target=attempt, args=(i, j)) for i, j in enumerate(journals)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_un_seul_gagnant_sending(tmp_path):
+    path = str(tmp_path / "pipeline_journal.db")
+    first, second = PipelineJournal(path), PipelineJournal(path)
+    try:
+        for n in range(20):
+            email_id = f"<{n}@example.com>"
+            first.start(email_id, uidvalidity=1)
+            assert first.advance(email_id, ANALYZED, {"analysis": {"pertinence": 8}})
+            assert second.advance(email_id, DRAFTED, {"draft": "Bonjour"})
+            results = _race([first, second], email_id)
+            assert results.count(True) == 1
+            checkpoint = second.get(email_id)
+            assert checkpoint["stage"] == SENDING
+            assert checkpoint["data"]["owner"] == results.index(True)
+            assert checkpoint["data"]["draft"] == "Bonjour"
+    finally:
+        first.close()
+        second.close()
+
+
+def test_sending_refuse_apres_envoi(tmp_path):
+    path = str(tmp_path / "pipeline_journal.db")
+    first, second = PipelineJournal(path), PipelineJournal(path)
+    try:
+        first.start("1")
+        assert first.advance("1", SENDING)
+        assert first.advance("1", SENT)
+        assert second.advance("1", SENDING) is False
+        assert second.start("1") == {"stage": SENT, "data": {}}
+        assert second.advance("1", LOGGED)
+        assert first.unfinished() == []
+    finally:
+        first.close()
+        second.close()
@@ -0,0 +1,65 @@
+"""Tests de la file de travail : expiration et reprise des baux, acquittement d'un bail perdu"""
+
+import time
+
+from data.storage.work_queue import WorkQueue
+
+
+def _queues(tmp_path, timeout=0.05, max_attempts=3):
+    path = str(tmp_path / "work_queue.db")
+    return (WorkQueue(path, visibility_timeout=timeout, max_attempts=max_attempts, owner="a"),
+            WorkQueue(path, visibility_timeout=timeout, max_attempts=max_attempts, owner="b"))
+
+
+def test_bail_actif_non_repris(tmp_path):
+    a, b = _queues(tmp_path, timeout=30)
+    a.enqueue([{"id": "1"}])
+    assert [job["id"] for job in a.claim()] == ["1"]
+    assert b.claim() == []
+    assert a.stats()["leased"] == 1
+
+
+def test_bail_expire_repris_par_un_autre_worker(tmp_path):
+    a, b = _queues(tmp_path)
+    a.enqueue([{"id": "1", "subject": "Mission"}])
+    assert a.claim() == [{"id": "1", "subject": "Mission"}]
+    time.sleep(0.1)
+    assert b.claim() == [{"id": "1", "subject": "Mission"}]
+    assert b.stats() == {"pending": 0, "leased": 1, "done": 0, "dead": 0}
+
+
+def test_acquittement_apres_bail_perdu_sans_effet(tmp_path):
+    a, b = _queues(tmp_path)
+    a.enqueue([{"id": "1"}])
+    a.claim()
+    time.sleep(0.1)
+    b.claim(visibility_timeout=30)
+    assert a.extend("1") is False
+    assert a.ack("1", {"by": "a"}) is False
+    assert a.nack("1", "erreur") is False
+    assert b.ack("1", {"by": "b"}) is True
+    assert b.ack("1", {"by": "b"}) is False
+    assert b.collect() == [{"id": "1", "result": {"by": "b"}}]
+    assert b.stats()["done"] == 1
+
+
+def test_bail_expire_abandonne_apres_max_attempts(tmp_path):
+    a, b = _queues(tmp_path, max_attempts=2)
+    a.enqueue([{"id": "1"}])
+    a.claim()
+    time.sleep(0.1)
+    assert len(b.claim()) == 1
+    time.sleep(0.1)
+    assert a.claim() == []
+    assert a.stats()["dead"] == 1
+
+
+def test_extend_prolonge_le_bail(tmp_path):
+    a, b = _queues(tmp_path, timeout=0.2)
+    a.enqueue([{"id": "1"}])
+    a.claim()
+    time.sleep(0.1)
+    assert a.extend("1", visibility_timeout=30) is True
+    time.sleep(0.15)
+    assert b.claim() == []
+    assert a.ack("1") is True
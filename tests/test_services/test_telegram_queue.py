@@ -0,0 +1,159 @@
+"""Tests de la file Telegram contre l'API Bot locale des benchmarks"""
+
+import json
+import time
+
+import pytest
+
+from services.telegram_queue import TelegramQueue
+from tests.benchmarks.fakes import FakeTelegramServer
+
+
+@pytest.fixture
+def server():
+    with FakeTelegramServer(retry_after=0.3) as fake:
+        yield fake
+
+
+@pytest.fixture
+def make_queue(tmp_path, server):
+    queues = []
+
+    def make(**kwargs):
+        kwargs.setdefault("per_chat_interval", 0.0)
+        kwargs.setdefault("digest_window", 0.0)
+        queue = TelegramQueue("TEST", str(tmp_path / "telegram_queue.json"), api_base=server.base_url, **kwargs)
+        queues.append(queue)
+        return queue
+
+    yield make
+    for queue in queues:
+        queue.close(flush_timeout=0)
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_retry_after_respecte_sans_consommer_de_tentative(server, make_queue):
+    server.statuses = [429, 429]
+    queue = make_queue(max_attempts=1)
+    queue.start()
+    start = time.monotonic()
+    queue.enqueue("1", "Bonjour")
+    assert wait_until(lambda: server.sent == 1)
+    assert server.messages[0]["at"] - start >= 0.6
+    assert queue.stats["rate_limited"] == 2
+    assert queue.stats["failed"] == 0
+    assert queue.pending() == 0
+
+
+def test_espacement_par_chat(server, make_queue):
+    queue = make_queue(per_chat_interval=0.25)
+    for n in range(3):
+        queue.enqueue("a", f"a{n}")
+    queue.enqueue("b", "b0")
+    queue.start()
+    assert wait_until(lambda: server.sent == 4)
+
+    sent_at = {message["text"]: message["at"] for message in server.messages}
+    assert [message["text"] for message in server.messages if message["chat_id"] == "a"] == ["a0", "a1", "a2"]
+    assert sent_at["a1"] - sent_at["a0"] >= 0.24
+    assert sent_at["a2"] - sent_at["a1"] >= 0.24
+    # Un autre chat n'attend pas la limite du premier
+    assert sent_at["b0"] < sent_at["a1"]
+
+
+def test_alertes_regroupees_en_digest(server, make_queue):
+    queue = make_queue(digest_window=0.3)
+    queue.start()
+    for n in range(3):
+        queue.enqueue_alert("1", f"<b>Alerte {n}</b>", f"Mission {n} (9/10)")
+    assert wait_until(lambda: server.sent == 1)
+    time.sleep(0.1)
+    assert server.sent == 1
+    text = server.messages[0]["text"]
+    assert text.startswith("🎯 <b>3 opportunités importantes détectées</b>")
+    assert "3. Mission 2 (9/10)" in text
+    assert queue.stats["digests"] == 1
+
+
+def test_digest_max(server, make_queue):
+    queue = make_queue(digest_window=60, digest_max=2)
+    for n in range(5):
+        queue.enqueue_alert("1", f"Alerte {n}", f"Mission {n}")
+    queue.start()
+    # Deux digests complets partent sans attendre la fenêtre, la cinquième alerte attend
+    assert wait_until(lambda: server.sent == 2)
+    time.sleep(0.2)
+    assert server.sent == 2
+    assert queue.pending() == 1
+    assert all(message["text"].startswith("🎯 <b>2 opportunités") for message in server.messages)
+
+    queue.close(flush_timeout=2)
+    assert server.sent == 3
+    assert server.messages[-1]["text"] == "Alerte 4"
+
+
+def test_abandon_apres_max_attempts(server, make_queue):
+    server.statuses = [500, 503]
+    queue = make_queue(max_attempts=2)
+    queue.enqueue("1", "Perdu")
+    queue.start()
+    assert wait_until(lambda: queue.pending() == 0)
+    assert server.requests == 2
+    assert server.sent == 0
+    assert queue.stats["failed"] == 1
+
+
+def test_erreur_client_non_reessayee(server, make_queue):
+    server.statuses = [400]
+    queue = make_queue()
+    queue.enqueue("1", "Refusé")
+    queue.enqueue("1", "Accepté")
+    queue.start()
+    assert wait_until(lambda: queue.pending() == 0)
+    assert [message["text"] for message in server.messages] == ["Accepté"]
+    assert queue.stats["failed"] == 1
+
+
+def test_file_rechargee_apres_redemarrage(tmp_path, server, make_queue):
+    queue = make_queue()
+    queue.enqueue("1", "Premier")
+    queue.enqueue_alert("1", "Alerte", "Mission")
+    with open(tmp_path / "telegram_queue.json", encoding="utf-8") as f:
+        assert [item["kind"] for item in json.load(f)] == ["message", "alert"]
+
+    restarted = make_queue()
+    assert restarted.pending() == 2
+    restarted.start()
+    assert wait_until(lambda: server.sent == 2)
+    assert [message["text"] for message in server.messages] == ["Premier", "Alerte"]
+    with open(tmp_path / "telegram_queue.json", encoding="utf-8") as f:
+        assert json.load(f) == []
+
+
+def test_close_envoie_les_messages_prets(server, make_queue):
+    queue = make_queue(digest_window=60, per_chat_interval=0.3)
+    queue.start()
+    queue.enqueue("1", "Message")
+    queue.enqueue_alert("1", "Alerte", "Mission")
+    queue.close(flush_timeout=2)
+    # L'alerte part sans attendre la fenêtre du digest, après l'espacement du chat
+    assert [message["text"] for message in server.messages] == ["Message", "Alerte"]
+    assert queue.pending() == 0
+
+
+def test_close_conserve_les_messages_non_envoyes(tmp_path, server, make_queue):
+    server.statuses = [500] * 10
+    queue = make_queue()
+    queue.start()
+    queue.enqueue("1", "Plus tard")
+    queue.close(flush_timeout=0.3)
+    assert queue.pending() == 1
+    assert make_queue().pending() == 1
@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+"""
+Gestion de la configuration de l'Agent IA Nocturne
+Lecture mise en cache sur le mtime, validation et écriture atomique
+"""
+
+import os
+import re
+import copy
+import json
+import tempfile
+import threading
+from typing import Dict, Any, List, Optional
+
+DEFAULT_CONFIG = {
+    "openai_api_key": "your_openai_api_key_here",
+    "email": {
+        "username": "your_email@gmail.com",
+        "password": "your_app_password"
+    },
+    "criteria": {
+        "budget_min": 500,
+        "duration_max": 30,
+        "language": "français",
+        "work_mode": "full remote",
+        "keywords_to_avoid": ["gratuit", "exposition", "urgent sans budget", "bénévolat"],
+        "relevance_threshold": 7
+    },
+    "signature": "David - Développeur Backend Python/IA\nwww.davidfreelance.fr\n+33 6 XX XX XX XX",
+    "workers": {
+        "count": 4,
+        "per_account": 2
+    },
+    "mime": {
+        "chunk_size": 1048576,
+        "max_text_bytes": 1048576,
+        "max_batch_bytes": 16777216
+    },
+    "attachments": {
+        "enabled": True,
+        "max_tokens": 1500,
+        "max_file_bytes": 10485760,
+        "timeout": 20,
+        "workers": 2,
+        "max_pages": 30
+    },
+    "scheduler": {
+        "interval_minutes": 5,
+        "min_interval_minutes": 1,
+        "max_interval_minutes": 15,
+        "target_emails_per_cycle": 1,
+        "night": {
+            "start": "22:00",
+            "end": "07:00",
+            "min_interval_minutes": 10,
+            "max_interval_minutes": 30
+        }
+    },
+    "notifications": {
+        "notifications_nuit": False
+    },
+    "reputation": {
+        "enabled": True,
+        "prioritize": True,
+        "fast_reject_after": 5,
+        "fast_reject_below": 3
+    },
+    "triage": {
+        "enabled": True,
+        "keywords": {
+            "traite": "$AgentTraite",
+            "repondu": "$AgentRepondu",
+            "rejete": "$AgentRejete"
+        }
+    },
+    "integrations": {
+        "gmail": {
+            "actif": True,
+            "labels": {
+                "traite": "🤖 Agent IA",
+                "repondu": "✅ Répondu",
+                "rejete": "❌ Rejeté"
+            }
+        }
+    },
+    "queue": {
+        "enabled": False,
+        "path": "work_queue.db",
+        "visibility_timeout": 300,
+        "max_attempts": 3,
+        "poll_seconds": 10
+    },
+    "llm": {
+        "models": {
+            "openai": {"default": "gpt-3.5-turbo", "cheap": "gpt-4o-mini"},
+            "mistral": {"default": "mistral-medium", "cheap": "mistral-small"}
+        },
+        "budget": {
+            "daily_tokens": None,
+            "monthly_tokens": None,
+            "daily_cost": None,
+            "monthly_cost": None,
+            "degrade_at": 0.8,
+            "degraded_mode": "cheaper_model",
+            "defer_below": 4
+        },
+        "rate_limits": {
+            "openai": {"requests_per_minute": None},
+            "mistral": {"requests_per_minute": None}
+        }
+    }
+}
+
+# Valeurs d'un compte de "accounts" non précisées (comportement historique : Gmail)
+ACCOUNT_DEFAULTS = {
+    "host": "imap.gmail.com",
+    "port": 993,
+    "smtp_host": "smtp.gmail.com",
+    "smtp_port": 465,
+    "folder": "INBOX"
+}
+
+# Modes dégradés acceptés pour llm.budget.degraded_mode (appliqués par core/budget.py)
+DEGRADED_MODES = ("cheaper_model", "prefilter", "defer")
+
+# Heures de la plage de nuit (scheduler.night)
+HHMM_RE = re.compile(r"([01]\d|2[0-3]):[0-5]\d")
+
+# Mots-clés IMAP posés sur les emails traités (triage.keywords)
+KEYWORD_RE = re.compile(r"\$?[A-Za-z0-9_.-]+")
+
+# Champs à plat envoyés par le formulaire /admin -> chemin dans la configuration
+ADMIN_FORM_FIELDS = {
+    "app_password": ("email", "password"),
+    "telegram_bot_token": ("telegram", "bot_token"),
+    "telegram_chat_id": ("telegram", "chat_id"),
+    "email_signature": ("signature",),
+}
+
+
+def normalize_config(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Convertir les formats du formulaire web vers la structure de l'agent"""
+    config = copy.deepcopy(data)
+
+    # Formulaire /admin : "email" est l'adresse, les autres champs sont à plat
+    if isinstance(config.get("email"), str):
+        config["email"] = {"username": config["email"]}
+    for field, path in ADMIN_FORM_FIELDS.items():
+        if field in config:
+            value = config.pop(field)
+            target = config
+            for key in path[:-1]:
+                target = target.setdefault(key, {})
+            target[path[-1]] = value
+
+    # Page de configuration : budget_minimum -> budget_min
+    criteria = config.get("criteria")
+    if isinstance(criteria, dict) and "budget_minimum" in criteria:
+        criteria["budget_min"] = criteria.pop("budget_minimum")
+
+    return config
+
+
+def mailbox_accounts(config: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Comptes surveillés : la liste accounts, ou le compte unique de la section email"""
+    accounts = config.get("accounts") or [dict(config.get("email", {}), name="principal")]
+    result = []
+    for account in accounts:
+        if account.get("enabled", True) is False:
+            continue
+        merged = dict(ACCOUNT_DEFAULTS, **account)
+        merged["name"] = merged.get("name") or merged.get("username")
+        result.append(merged)
+    return result
+
+
+def deep_merge(base: Dict[str, Any], changes: Dict[str, Any]) -> Dict[str, Any]:
+    """Fusionner récursivement des modifications dans une configuration"""
+    merged = copy.deepcopy(base)
+    for key, value in changes.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = deep_merge(merged[key], value)
+        else:
+            merged[key] = copy.deepcopy(value)
+    return merged
+
+
+def validate_config(config: Dict[str, Any]) -> List[str]:
+    """Valider une configuration complète, retourne la liste des erreurs"""
+    errors = []
+
+    accounts = config.get("accounts")
+    if accounts is None:
+        email_config = config.get("email")
+        if not isinstance(email_config, dict):
+            errors.append("email : objet attendu")
+        else:
+            for key in ("username", "password"):
+                if not isinstance(email_config.get(key), str):
+                    errors.append(f"email.{key} : texte attendu")
+    elif not isinstance(accounts, list) or not accounts:
+        errors.append("accounts : liste non vide attendue")
+    else:
+        names = set()
+        for i, account in enumerate(accounts):
+            if not isinstance(account, dict):
+                errors.append(f"accounts[{i}] : objet attendu")
+                continue
+            for key in ("username", "password"):
+                if not isinstance(account.get(key), str):
+                    errors.append(f"accounts[{i}].{key} : texte attendu")
+            for key in ("port", "smtp_port"):
+                value = account.get(key, ACCOUNT_DEFAULTS[key])
+                if isinstance(value, bool) or not isinstance(value, int) or not 0 < value < 65536:
+                    errors.append(f"accounts[{i}].{key} : port invalide")
+            name = account.get("name") or account.get("username")
+            if name in names:
+                errors.append(f"accounts[{i}].name : nom en double ({name})")
+            names.add(name)
+
+    workers = config.get("workers")
+    if workers is not None:
+        if not isinstance(workers, dict):
+            errors.append("workers : objet attendu")
+        else:
+            for key in ("count", "per_account"):
+                value = workers.get(key, 1)
+                if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+                    errors.append(f"workers.{key} : entier ≥ 1 attendu")
+
+    mime = config.get("mime")
+    if mime is not None:
+        if not isinstance(mime, dict):
+            errors.append("mime : objet attendu")
+        else:
+            for key in ("chunk_size", "max_text_bytes", "max_batch_bytes"):
+                value = mime.get(key, 1)
+                if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+                    errors.append(f"mime.{key} : entier ≥ 1 attendu")
+
+    attachments = config.get("attachments")
+    if attachments is not None:
+        if not isinstance(attachments, dict):
+            errors.append("attachments : objet attendu")
+        else:
+            for key in ("max_tokens", "max_file_bytes", "workers", "max_pages"):
+                value = attachments.get(key, 1)
+                if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+                    errors.append(f"attachments.{key} : entier ≥ 1 attendu")
+            value = attachments.get("timeout", 1)
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+                errors.append("attachments.timeout : nombre positif attendu")
+
+    queue = config.get("queue")
+    if queue is not None:
+        if not isinstance(queue, dict):
+            errors.append("queue : objet attendu")
+        else:
+            for key in ("visibility_timeout", "poll_seconds"):
+                value = queue.get(key, 1)
+                if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+                    errors.append(f"queue.{key} : nombre positif attendu")
+            value = queue.get("max_attempts", 1)
+            if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+                errors.append("queue.max_attempts : entier ≥ 1 attendu")
+
+    scheduler = config.get("scheduler")
+    if scheduler is not None:
+        if not isinstance(scheduler, dict):
+            errors.append("scheduler : objet attendu")
+        else:
+            night = scheduler.get("night", {})
+            if not isinstance(night, dict):
+                errors.append("scheduler.night : objet attendu")
+                night = {}
+            checks = [("scheduler", scheduler, ("interval_minutes", "min_interval_minutes",
+                                                "max_interval_minutes", "target_emails_per_cycle")),
+                      ("scheduler.night", night, ("min_interval_minutes", "max_interval_minutes"))]
+            for prefix, section, keys in checks:
+                for key in keys:
+                    value = section.get(key, 1)
+                    if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+                        errors.append(f"{prefix}.{key} : nombre positif attendu")
+            for key in ("start", "end"):
+                value = night.get(key, "00:00")
+                if not isinstance(value, str) or not HHMM_RE.fullmatch(value):
+                    errors.append(f"scheduler.night.{key} : heure HH:MM attendue")
+
+    reputation = config.get("reputation")
+    if reputation is not None:
+        if not isinstance(reputation, dict):
+            errors.append("reputation : objet attendu")
+        else:
+            value = reputation.get("fast_reject_after", 1)
+            if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+                errors.append("reputation.fast_reject_after : entier ≥ 1 attendu")
+            value = reputation.get("fast_reject_below", 0)
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not 0 <= value <= 10:
+                errors.append("reputation.fast_reject_below : doit être entre 0 et 10")
+
+    triage = config.get("triage")
+    if triage is not None:
+        if not isinstance(triage, dict):
+            errors.append("triage : objet attendu")
+        else:
+            keywords = triage.get("keywords", {})
+            if not isinstance(keywords, dict):
+                errors.append("triage.keywords : objet attendu")
+            else:
+                for key, value in keywords.items():
+                    # Mot-clé IMAP : atome ASCII sans espace ni caractère spécial (RFC 3501)
+                    if not isinstance(value, str) or not KEYWORD_RE.fullmatch(value):
+                        errors.append(f"triage.keywords.{key} : mot-clé IMAP invalide")
+
+    integrations = config.get("integrations")
+    if integrations is not None:
+        gmail = integrations.get("gmail", {}) if isinstance(integrations, dict) else None
+        if not isinstance(gmail, dict):
+            errors.append("integrations.gmail : objet attendu")
+        else:
+            labels = gmail.get("labels", {})
+            if not isinstance(labels, dict) or not all(isinstance(label, str) and label for label in labels.values()):
+                errors.append("integrations.gmail.labels : objet de textes attendu")
+
+    notifications = config.get("notifications")
+    if notifications is not None and not isinstance(notifications, dict):
+        errors.append("notifications : objet attendu")
+
+    criteria = config.get("criteria")
+    if not isinstance(criteria, dict):
+        errors.append("criteria : objet attendu")
+    else:
+        for key in ("budget_min", "duration_max", "relevance_threshold"):
+            value = criteria.get(key)
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+                errors.append(f"criteria.{key} : nombre positif attendu")
+        threshold = criteria.get("relevance_threshold")
+        if isinstance(threshold, (int, float)) and threshold > 10:
+            errors.append("criteria.relevance_threshold : doit être entre 0 et 10")
+        for key in ("language", "work_mode"):
+            if not isinstance(criteria.get(key), str):
+                errors.append(f"criteria.{key} : texte attendu")
+        keywords = criteria.get("keywords_to_avoid")
+        if not isinstance(keywords, list) or not all(isinstance(k, str) for k in keywords):
+            errors.append("criteria.keywords_to_avoid : liste de textes attendue")
+
+    if not config.get("openai_api_key") and not config.get("mistral_api_key"):
+        errors.append("openai_api_key ou mistral_api_key requis")
+
+    llm = config.get("llm")
+    if llm is not None:
+        budget = llm.get("budget", {}) if isinstance(llm, dict) else None
+        if not isinstance(budget, dict):
+            errors.append("llm.budget : objet attendu")
+        else:
+            for key in ("daily_tokens", "monthly_tokens", "daily_cost", "monthly_cost"):
+                value = budget.get(key)
+                if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0):
+                    errors.append(f"llm.budget.{key} : nombre positif ou null attendu")
+            degrade_at = budget.get("degrade_at", 0.8)
+            if isinstance(degrade_at, bool) or not isinstance(degrade_at, (int, float)) or not 0 < degrade_at <= 1:
+                errors.append("llm.budget.degrade_at : doit être entre 0 et 1")
+            if budget.get("degraded_mode", "cheaper_model") not in DEGRADED_MODES:
+                errors.append(f"llm.budget.degraded_mode : doit être parmi {', '.join(DEGRADED_MODES)}")
+        rate_limits = llm.get("rate_limits", {}) if isinstance(llm, dict) else {}
+        if not isinstance(rate_limits, dict):
+            errors.append("llm.rate_limits : objet attendu")
+        else:
+            for provider, limits in rate_limits.items():
+                value = limits.get("requests_per_minute") if isinstance(limits, dict) else limits
+                if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0):
+                    errors.append(f"llm.rate_limits.{provider}.requests_per_minute : nombre positif ou null attendu")
+
+    telegram = config.get("telegram")
+    if telegram is not None and not isinstance(telegram, dict):
+        errors.append("telegram : objet attendu")
+
+    return errors
+
+
+class ConfigError(ValueError):
+    """Configuration invalide"""
+
+    def __init__(self, errors: List[str]):
+        super().__init__("; ".join(errors))
+        self.errors = errors
+
+
+class ConfigStore:
+    """Fichier de configuration relu uniquement quand son mtime change"""
+
+    def __init__(self, path: str = "agent_config.json"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._signature = None
+        self._config = None
+
+    def _stat_signature(self) -> Optional[tuple]:
+        try:
+            st = os.stat(self.path)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    def changed(self) -> bool:
+        """Le fichier a-t-il été modifié depuis la dernière lecture ?"""
+        return self._stat_signature() != self._signature
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def load(self) -> Dict[str, Any]:
+        """Charger la configuration (copie, le cache n'est jamais exposé)"""
+        with self._lock:
+            signature = self._stat_signature()
+            if signature is None:
+                return {}
+            if signature != self._signature:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._config = json.load(f)
+                self._signature = signature
+            return copy.deepcopy(self._config)
+
+    def save(self, config: Dict[str, Any], validate: bool = True):
+        """Écrire la configuration de manière atomique (fichier temporaire + rename)"""
+        if validate:
+            errors = validate_config(config)
+            if errors:
+                raise ConfigError(errors)
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        with self._lock:
+            fd, tmp_path = tempfile.mkstemp(prefix=".agent_config.", suffix=".tmp", dir=directory)
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(config, f, indent=2, ensure_ascii=False)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                raise
+            self._config = copy.deepcopy(config)
+            self._signature = self._stat_signature()
+
+    def update(self, changes: Dict[str, Any]) -> Dict[str, Any]:
+        """Appliquer des modifications partielles, valider puis sauvegarder"""
+        base = self.load() or DEFAULT_CONFIG
+        config = deep_merge(base, normalize_config(changes))
+        self.save(config)
+        return config
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Imports différés des modules lourds
+Le module n'est importé qu'au premier accès à l'un de ses attributs
+"""
+
+import importlib
+import sys
+import threading
+from typing import Any
+
+
+class LazyModule:
+    """Mandataire d'un module importé au premier accès (imaplib.IMAP4_SSL, requests.post...)"""
+
+    def __init__(self, name: str):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+        self.__dict__["_lock"] = threading.Lock()
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            with self.__dict__["_lock"]:
+                module = self.__dict__["_module"]
+                if module is None:
+                    module = importlib.import_module(self.__dict__["_name"])
+                    self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr: str, value: Any):
+        setattr(self._load(), attr, value)
+
+    def __repr__(self) -> str:
+        state = "chargé" if self.__dict__["_module"] is not None else "différé"
+        return f"<module {self.__dict__['_name']!r} ({state})>"
+
+
+def lazy_import(name: str) -> Any:
+    """Module déjà importé tel quel, sinon mandataire importé au premier usage"""
+    return sys.modules.get(name) or LazyModule(name)
+
+
+def is_loaded(name: str) -> bool:
+    return name in sys.modules
+
+
+class lazy_property:
+    """Attribut d'instance calculé au premier accès puis conservé (un seul calcul entre threads)"""
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.name = factory.__name__
+        self.__doc__ = factory.__doc__
+        # Réentrant : une fabrique peut lire une autre propriété différée
+        self._lock = threading.RLock()
+
+    def __set_name__(self, owner, name: str):
+        self.name = name
+
+    def __get__(self, instance, owner=None) -> Any:
+        if instance is None:
+            return self
+        value = instance.__dict__.get(self.name, self)
+        if value is self:
+            with self._lock:
+                value = instance.__dict__.get(self.name, self)
+                if value is self:
+                    value = instance.__dict__[self.name] = self.factory(instance)
+        return value
+
+
+def is_initialized(instance: Any, name: str) -> bool:
+    """Propriété différée déjà calculée (ou affectée) sur cette instance"""
+    return name in instance.__dict__
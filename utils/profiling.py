@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Profilage à la demande de l'Agent IA Nocturne
+cProfile ou échantillonnage par cycle/requête, instantané tracemalloc optionnel, rapports en rotation
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from utils.lazy import lazy_import
+
+# Chargés seulement quand un profil est demandé
+cProfile = lazy_import("cProfile")
+pstats = lazy_import("pstats")
+tracemalloc = lazy_import("tracemalloc")
+
+CPROFILE = "cprofile"
+SAMPLE = "sample"
+MODES = (CPROFILE, SAMPLE)
+
+# Un seul cProfile actif par processus : un second profil simultané bascule en échantillonnage
+_cprofile_lock = threading.Lock()
+
+# Profils mémoire simultanés : le traçage démarré ici n'est arrêté que par le dernier qui s'en sert
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_tracing_owned = False
+
+
+def _start_tracing():
+    global _tracing_users, _tracing_owned
+    with _tracing_lock:
+        if not _tracing_users and not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+            _tracing_owned = True
+        _tracing_users += 1
+
+
+def _stop_tracing():
+    global _tracing_users, _tracing_owned
+    with _tracing_lock:
+        _tracing_users -= 1
+        if not _tracing_users and _tracing_owned:
+            tracemalloc.stop()
+            _tracing_owned = False
+
+
+class SamplingProfiler:
+    """Échantillonneur de piles d'un thread (sys._current_frames), sortie au format « folded »"""
+
+    def __init__(self, thread_id: int, interval: float = 0.005, max_depth: int = 64):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def folded(self) -> str:
+        """Une ligne « pile;appelée N » par pile distincte (compatible flamegraph.pl / speedscope)"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def report(self, limit: int = 30) -> str:
+        own, inclusive = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for name in set(frames):
+                inclusive[name] += count
+        total = self.samples or 1
+        lines = [f"{self.samples} échantillons (intervalle {self.interval * 1000:.1f} ms)", "",
+                 "Temps propre :"]
+        lines += [f"  {count * 100 / total:5.1f}%  {name}" for name, count in own.most_common(limit)]
+        lines += ["", "Temps inclusif :"]
+        lines += [f"  {count * 100 / total:5.1f}%  {name}" for name, count in inclusive.most_common(limit)]
+        return "\n".join(lines)
+
+
+class Profiler:
+    """Capturer un profil par unité de travail (cycle run_once, requête HTTP) dans un répertoire en rotation"""
+
+    def __init__(self, directory: str = "profiles", mode: str = CPROFILE, memory: bool = False,
+                 keep: int = 50, interval: float = 0.005):
+        if mode not in MODES:
+            raise ValueError(f"Mode de profilage inconnu : {mode} (attendu : {', '.join(MODES)})")
+        self.directory = directory
+        self.mode = mode
+        self.memory = memory
+        self.keep = keep
+        self.interval = interval
+
+    @contextmanager
+    def profile(self, label: str, mode: Optional[str] = None, memory: Optional[bool] = None) -> Iterator[Dict]:
+        """Profiler le bloc ; le dictionnaire produit reçoit le nom du rapport écrit"""
+        mode = mode or self.mode
+        memory = self.memory if memory is None else memory
+        session = {"label": label, "report": None}
+
+        profiler = sampler = None
+        if mode == CPROFILE and _cprofile_lock.acquire(blocking=False):
+            profiler = cProfile.Profile()
+        else:
+            mode = SAMPLE
+            sampler = SamplingProfiler(threading.get_ident(), self.interval)
+
+        baseline = None
+        if memory:
+            _start_tracing()
+            baseline = tracemalloc.take_snapshot()
+
+        start = time.perf_counter()
+        try:
+            if profiler:
+                profiler.enable()
+            else:
+                sampler.start()
+            yield session
+        finally:
+            if profiler:
+                profiler.disable()
+                _cprofile_lock.release()
+            else:
+                sampler.stop()
+            duration = time.perf_counter() - start
+
+            snapshot = tracemalloc.take_snapshot() if memory else None
+            peak = tracemalloc.get_traced_memory()[1] if memory else None
+            if memory:
+                _stop_tracing()
+            try:
+                session["report"] = self._write(label, mode, duration, profiler, sampler,
+                                                baseline, snapshot, peak)
+            except OSError as e:
+                print(f"⚠️ Erreur écriture du profil : {e}")
+
+    def _write(self, label: str, mode: str, duration: float, profiler, sampler,
+               baseline, snapshot, peak: Optional[int]) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        safe_label = "".join(c if c.isalnum() or c in "-_" else "_" for c in label)[:60]
+        stem = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}_{safe_label}"
+        base = os.path.join(self.directory, stem)
+
+        sections = [f"Profil : {label}", f"Mode : {mode}", f"Durée : {duration * 1000:.1f} ms", ""]
+        files = [stem + ".txt"]
+        if profiler:
+            profiler.dump_stats(base + ".prof")
+            files.append(stem + ".prof")
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(40)
+            sections.append(out.getvalue())
+        else:
+            with open(base + ".folded", "w", encoding="utf-8") as f:
+                f.write(sampler.folded())
+            files.append(stem + ".folded")
+            sections.append(sampler.report())
+
+        memory = None
+        if snapshot is not None:
+            stats = snapshot.compare_to(baseline, "lineno")
+            growth = sum(stat.size_diff for stat in stats)
+            memory = {"growth_bytes": growth, "peak_bytes": peak}
+            sections += ["", f"Allocations : {growth / 1024:+.1f} Kio (pic {peak / 1024:.1f} Kio)", ""]
+            sections += [f"  {stat}" for stat in stats[:25]]
+
+        with open(base + ".txt", "w", encoding="utf-8") as f:
+            f.write("\n".join(sections) + "\n")
+
+        meta = {"name": stem, "label": label, "mode": mode, "created": datetime.now().isoformat(),
+                "duration_ms": round(duration * 1000, 1), "files": files, "memory": memory}
+        with open(base + ".json", "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+        self.rotate()
+        return stem
+
+    def rotate(self):
+        """Ne garder que les `keep` rapports les plus récents"""
+        reports = sorted(name[:-5] for name in os.listdir(self.directory) if name.endswith(".json"))
+        for stem in reports[:-self.keep] if self.keep else []:
+            for extension in (".json", ".txt", ".prof", ".folded"):
+                try:
+                    os.remove(os.path.join(self.directory, stem + extension))
+                except FileNotFoundError:
+                    pass
+
+
+def list_reports(directory: str = "profiles", limit: int = 20) -> List[Dict[str, Any]]:
+    """Métadonnées des rapports les plus récents (plus récent en premier)"""
+    try:
+        names = sorted((name for name in os.listdir(directory) if name.endswith(".json")), reverse=True)
+    except OSError:
+        return []
+    reports = []
+    for name in names[:limit]:
+        try:
+            with open(os.path.join(directory, name), "r", encoding="utf-8") as f:
+                reports.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return reports